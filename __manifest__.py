@@ -11,7 +11,11 @@
     # Check https://github.com/odoo/odoo/blob/15.0/odoo/addons/base/data/ir_module_category_data.xml
     # for the full list
     "category": "Technical",
-    "version": "5.0.0",
+    "version": "5.1.0",
     # any module necessary for this one to work correctly
-    "depends": ["base", "sale", "purchase", "account"],
+    "depends": ["base", "stock", "sale", "purchase", "account"],
+    "data": [
+        "security/ir.model.access.csv",
+        "data/ir_cron.xml",
+    ],
 }
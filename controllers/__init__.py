@@ -9,3 +9,20 @@ from . import transaccionProduccionController
 from . import pdaController
 from . import inventoryController
 from . import utils
+from . import app_version
+from . import pda_auth
+from . import response_cache
+from . import user_locations
+from . import stock_availability
+from . import delta_sync
+from . import response_compression
+from . import etag
+from . import ndjson_stream
+from . import barcode_index
+from . import db_indexes
+from . import settings_snapshot
+from . import validation_jobs
+from . import db_retry
+from . import idempotency
+from . import offline_journal
+from . import pda_heartbeat
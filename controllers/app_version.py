@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# app_version.py - Validación de versión de la app compartida por los controladores
+
+import copy
+import json
+import logging
+import threading
+import time
+
+from odoo.http import request
+
+_logger = logging.getLogger(__name__)
+
+# Segundos que un worker conserva la última versión antes de volver a leerla.
+# Los workers que no atendieron el create/delete se enteran del cambio al expirar.
+VERSION_CACHE_TTL = 60
+
+_lock = threading.Lock()
+# Un worker puede atender varias bases de datos
+# dbname -> {"payload", "parts", "loaded_at"}
+_states = {}
+
+
+def parse_version(version_str):
+    """
+    Convierte una versión semántica en tupla comparable
+
+    Args:
+        version_str: Versión en formato "X.Y.Z"
+
+    Returns:
+        Tupla de enteros, o None si el formato no es válido
+    """
+    try:
+        return tuple(int(part) for part in str(version_str).strip().split("."))
+    except (ValueError, TypeError):
+        return None
+
+
+def _load_last_version():
+    """Lee la última app.version y la deja lista para responder"""
+    last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
+
+    if not last_version:
+        return {"code": 404, "msg": "No se encontró ninguna versión"}, (0, 0, 0)
+
+    # Convertir el texto JSON a una lista Python
+    notes_list = []
+    if last_version.notes:
+        try:
+            notes_list = json.loads(last_version.notes)
+        except Exception:
+            notes_list = ["Error al procesar las notas"]
+
+    latest_parts = parse_version(last_version.version)
+    if latest_parts is None:
+        # Sin una versión comparable se exige actualizar, como antes
+        _logger.warning("Versión de la app con formato inválido: %r (id %s)", last_version.version, last_version.id)
+
+    payload = {
+        "code": 200,
+        "result": {
+            "id": last_version.id,
+            "version": last_version.version,
+            "release_date": str(last_version.release_date),
+            "notes": notes_list,
+            "url_download": last_version.url_download,
+        },
+    }
+    return payload, latest_parts
+
+
+def _ensure_loaded():
+    dbname = request.env.cr.dbname
+    now = time.monotonic()
+    with _lock:
+        state = _states.get(dbname)
+        if state is not None and now - state["loaded_at"] < VERSION_CACHE_TTL:
+            return state["payload"], state["parts"]
+
+    payload, parts = _load_last_version()
+    with _lock:
+        _states[dbname] = {"payload": payload, "parts": parts, "loaded_at": now}
+    return payload, parts
+
+
+def get_last_version():
+    """
+    Retorna la última versión de la app (misma estructura que /api/last-version)
+
+    Se sirve desde la caché del worker; sólo consulta app.version cuando la
+    entrada expiró o fue invalidada.
+    """
+    payload, _parts = _ensure_loaded()
+    return copy.deepcopy(payload)
+
+
+def update_required(version_app):
+    """
+    Indica si la versión enviada por la PDA es anterior a la última publicada
+
+    Sin versión o con formato inválido (de la PDA o de la última publicada)
+    se asume que requiere actualización.
+    """
+    if not version_app:
+        return True
+
+    app_parts = parse_version(version_app)
+    if app_parts is None:
+        return True
+
+    _payload, latest_parts = _ensure_loaded()
+    if latest_parts is None:
+        return True
+    return app_parts < latest_parts
+
+
+def invalidate_version_cache():
+    """Descarta la versión en caché; se repite tras el commit de la transacción"""
+    dbname = request.env.cr.dbname
+
+    def _reset_state():
+        with _lock:
+            _states.pop(dbname, None)
+
+    _reset_state()
+
+    # Evita que una petición concurrente deje en caché la fila anterior al commit
+    request.env.cr.postcommit.add(_reset_state)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+# barcode_index.py - Resolución de códigos de barras (exacta y por similitud)
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Orden de prioridad cuando un mismo código coincide con varias entidades
+# (el mismo que seguía la búsqueda secuencial de quickinfo)
+BARCODE_SOURCES = [
+    # (modelo, columna, condición adicional)
+    ("product.product", "barcode", "active"),
+    ("product.product", "default_code", "active"),
+    ("product.packaging", "barcode", None),
+    ("stock.lot", "name", None),
+    ("stock.quant.package", "name", None),
+    ("stock.location", "barcode", "active AND usage = 'internal'"),
+]
+
+# Tipo informado al cliente por modelo (los mismos nombres de quickinfo)
+BARCODE_TYPES = {
+    "product.product": "product",
+    "product.packaging": "packaging",
+    "stock.lot": "lote",
+    "stock.quant.package": "paquete",
+    "stock.location": "ubicacion",
+}
+
+# Máximo de códigos por petición en la resolución masiva
+BULK_BARCODES_LIMIT = 1000
+
+# Búsqueda por similitud (pg_trgm)
+FUZZY_DEFAULT_LIMIT = 20
+FUZZY_MAX_LIMIT = 100
+FUZZY_MIN_LENGTH = 3  # con menos caracteres los trigramas no discriminan
+
+
+def normalize_barcode(barcode):
+    return str(barcode or "").strip()
+
+
+def _extra_barcodes_source(env):
+    """Tabla de códigos adicionales (barcode_ids) si el módulo que la agrega está instalado"""
+    field = env["product.product"]._fields.get("barcode_ids")
+    if not field or field.type != "one2many":
+        return None
+    comodel = env[field.comodel_name]
+    return comodel._table, field.inverse_name
+
+
+def _sources(env):
+    """
+    Columnas de código de las entidades instaladas, en orden de prioridad
+
+    Returns:
+        Lista de tuplas (modelo, tabla, columna de código, columna de id,
+        condición adicional, prioridad)
+    """
+    sources = []
+    priority = 0
+    for model_name, column, condition in BARCODE_SOURCES:
+        if model_name not in env:
+            continue
+        priority += 1
+        sources.append((model_name, env[model_name]._table, column, "id", condition, priority))
+
+        if model_name == "product.product" and column == "barcode":
+            # Códigos adicionales del producto: misma prioridad que el código principal
+            extra = _extra_barcodes_source(env)
+            if extra:
+                table, inverse_name = extra
+                sources.append((model_name, table, "name", inverse_name, None, priority))
+    return sources
+
+
+def _build_query(env):
+    parts = []
+    for model_name, table, column, id_column, condition, priority in _sources(env):
+        where = f"{column} = ANY(%(codes)s)" + (f" AND {condition}" if condition else "")
+        parts.append(
+            f"SELECT {column} AS code, '{model_name}' AS model, {id_column} AS res_id, {priority} AS priority "
+            f"FROM {table} WHERE {where}"
+        )
+    return " UNION ALL ".join(parts) + " ORDER BY priority, res_id"
+
+
+def resolve_barcodes(env, barcodes):
+    """
+    Resuelve códigos de barras por coincidencia exacta
+
+    Una sola consulta UNION ALL sobre las columnas de código de cada entidad
+    (producto, código adicional, empaque, lote, paquete y ubicación). Cada
+    rama es un acceso por índice: los de Odoo más el de empaques de
+    DB_INDEXES; la tabla de códigos adicionales depende del módulo que la
+    agrega.
+
+    Args:
+        env: Entorno (normalmente con sudo)
+        barcodes: Iterable de códigos
+
+    Returns:
+        Diccionario código normalizado -> registro (producto, empaque, lote,
+        paquete o ubicación) de mayor prioridad; los códigos sin
+        coincidencia no aparecen
+    """
+    codes = sorted({normalize_barcode(barcode) for barcode in barcodes} - {""})
+    if not codes:
+        return {}
+
+    env.cr.execute(_build_query(env), {"codes": codes})
+    matches = {}
+    for code, model_name, res_id, _priority in env.cr.fetchall():
+        if code not in matches and res_id:
+            matches[code] = (model_name, res_id)
+
+    # Un browse por modelo para que los registros compartan prefetch
+    ids_by_model = {}
+    for model_name, res_id in matches.values():
+        ids_by_model.setdefault(model_name, []).append(res_id)
+    return {
+        code: env[model_name].browse(res_id).with_prefetch(ids_by_model[model_name])
+        for code, (model_name, res_id) in matches.items()
+    }
+
+
+def resolve_barcode(env, barcode):
+    """Registro que coincide exactamente con el código, o None"""
+    return resolve_barcodes(env, [barcode]).get(normalize_barcode(barcode))
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_barcodes(env, query, limit=FUZZY_DEFAULT_LIMIT):
+    """
+    Búsqueda parcial/aproximada de códigos (etiquetas dañadas o incompletas)
+
+    Cada entidad aporta sus mejores candidatos: los que contienen el texto
+    (ILIKE) o se le parecen (operador % de pg_trgm). El resultado global
+    pone primero las coincidencias exactas y luego ordena por similitud.
+    Sin pg_trgm sólo se usa ILIKE y la similitud se informa en 0.
+
+    Returns:
+        Lista de diccionarios con model, res_id, code y score
+    """
+    query = normalize_barcode(query)
+    if not query:
+        return []
+
+    has_trigram = env.registry.has_trigram
+    score = "similarity({column}, %(query)s)" if has_trigram else "0.0"
+    match = "({column} ILIKE %(like)s OR {column} %% %(query)s)" if has_trigram else "{column} ILIKE %(like)s"
+
+    parts = []
+    for model_name, table, column, id_column, condition, priority in _sources(env):
+        where = match.format(column=column) + (f" AND {condition}" if condition else "")
+        branch_score = score.format(column=column)
+        parts.append(
+            f"(SELECT {column} AS code, '{model_name}' AS model, {id_column} AS res_id, {priority} AS priority, "
+            f"{column} = %(query)s AS exact, {branch_score} AS score "
+            f"FROM {table} WHERE {where} "
+            f"ORDER BY {column} = %(query)s DESC, {branch_score} DESC, {id_column} LIMIT %(limit)s)"
+        )
+
+    env.cr.execute(
+        " UNION ALL ".join(parts) + " ORDER BY exact DESC, score DESC, priority, res_id LIMIT %(limit)s",
+        {"query": query, "like": f"%{_escape_like(query)}%", "limit": limit},
+    )
+
+    results = []
+    seen = set()
+    for code, model_name, res_id, _priority, exact, score_value in env.cr.fetchall():
+        if not res_id or (model_name, res_id, code) in seen:
+            continue
+        seen.add((model_name, res_id, code))
+        results.append(
+            {
+                "model": model_name,
+                "res_id": res_id,
+                "code": code,
+                "exact": exact,
+                "score": round(float(score_value or 0), 4),
+            }
+        )
+    return results
+
+
+def ensure_trigram_extension(env):
+    """
+    Instala la extensión pg_trgm si no lo está
+
+    Requiere permisos de creación de extensiones en la base de datos; sin
+    ellos deja un aviso en el log (la búsqueda por similitud usará sólo
+    ILIKE y no se crean los índices de trigramas).
+
+    Returns:
+        True si pg_trgm está disponible
+    """
+    if env.registry.has_trigram:
+        return True
+    try:
+        with env.cr.savepoint():
+            env.cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        _logger.warning(
+            "No se pudo instalar la extensión pg_trgm (%s); la búsqueda por similitud usará sólo ILIKE. "
+            "Un usuario con permisos debe ejecutar CREATE EXTENSION pg_trgm en la base %s y actualizar el módulo",
+            e,
+            env.cr.dbname,
+        )
+        return False
+    env.registry.has_trigram = True
+    return True
+
+
+def missing_trigram_indexes(env):
+    """
+    Índices GIN (gin_trgm_ops) que faltan en las columnas de código
+
+    Las columnas que ya tienen un índice de trigramas válido (p. ej. los
+    campos index="trigram" de Odoo) se omiten. Sin pg_trgm no hay ninguno.
+
+    Returns:
+        Lista de tuplas (nombre del índice, tabla, columna)
+    """
+    if not env.registry.has_trigram:
+        return []
+
+    cr = env.cr
+    missing = []
+    for _model_name, table, column, _id_column, _condition, _priority in _sources(env):
+        cr.execute(
+            """
+            SELECT 1
+              FROM pg_index i
+              JOIN pg_class t ON t.oid = i.indrelid
+             WHERE t.relname = %s AND i.indisvalid AND pg_get_indexdef(i.indexrelid) ~ %s
+            """,
+            [table, rf"\m{column}\M.*gin_trgm_ops"],
+        )
+        if not cr.fetchone():
+            missing.append((f"api_onpoint_{table}_{column}_trgm_idx", table, column))
+    return missing
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# db_indexes.py - Índices compuestos para los dominios más usados por la API
+
+import functools
+import logging
+
+from odoo import sql_db
+
+from .barcode_index import ensure_trigram_extension, missing_trigram_indexes
+
+_logger = logging.getLogger(__name__)
+
+# Prefijo de todos los índices que crea el módulo
+INDEX_PREFIX = "api_onpoint_"
+
+# (nombre, modelo, columnas, condición del índice parcial, uso)
+DB_INDEXES = [
+    (
+        "api_onpoint_mlu_batch_location_idx",
+        "move.line.unified",
+        ["stock_picking_batch_id", "location_id"],
+        None,
+        "Líneas de un batch por ubicación (picking por batch)",
+    ),
+    (
+        "api_onpoint_sml_picking_done_idx",
+        "stock.move.line",
+        ["picking_id", "is_done_item"],
+        None,
+        "Líneas pendientes / hechas de un picking",
+    ),
+    (
+        "api_onpoint_sml_result_package_idx",
+        "stock.move.line",
+        ["result_package_id", "state", "date"],
+        "result_package_id IS NOT NULL",
+        "Último movimiento de un paquete (quickinfo)",
+    ),
+    (
+        "api_onpoint_picking_type_state_idx",
+        "stock.picking",
+        ["picking_type_id", "state", "responsable_id", "batch_id"],
+        None,
+        "Listados de transferencias por tipo de operación, estado y responsable",
+    ),
+    (
+        "api_onpoint_packaging_barcode_idx",
+        "product.packaging",
+        ["barcode"],
+        "barcode IS NOT NULL",
+        "Resolución exacta de códigos de empaque (quickinfo)",
+    ),
+    (
+        "api_onpoint_pda_logs_device_idx",
+        "pda.logs",
+        ["device_id"],
+        None,
+        "Validación del dispositivo en cada petición",
+    ),
+]
+
+
+def _available_indexes(env):
+    """
+    Índices de DB_INDEXES cuyos modelos y columnas existen en esta base
+
+    Los modelos de otros módulos (move.line.unified, pda.logs...) o los campos
+    personalizados (is_done_item, responsable_id) pueden no estar instalados.
+    """
+    available = []
+    for name, model_name, columns, where, usage in DB_INDEXES:
+        if model_name not in env:
+            continue
+        model = env[model_name]
+        if not all(column in model._fields and model._fields[column].store for column in columns):
+            continue
+        available.append((name, model._table, columns, where, usage))
+    return available
+
+
+def _index_states(cr, names):
+    """Nombre -> válido (pg_index.indisvalid) de los índices existentes"""
+    cr.execute(
+        """
+        SELECT c.relname, i.indisvalid
+          FROM pg_index i
+          JOIN pg_class c ON c.oid = i.indexrelid
+         WHERE c.relname = ANY(%s)
+        """,
+        [list(names)],
+    )
+    return dict(cr.fetchall())
+
+
+def _index_definition(name, table, expressions, where=None, method="btree"):
+    where_clause = f" WHERE {where}" if where else ""
+    return (
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" '
+        f"USING {method} ({', '.join(expressions)}){where_clause}"
+    )
+
+
+def _pending_indexes(env):
+    """(nombre, sentencia) de los índices que faltan o quedaron inválidos (compuestos y de trigramas)"""
+    available = _available_indexes(env)
+    states = _index_states(env.cr, [name for name, *_rest in available])
+    pending = [
+        (name, _index_definition(name, table, [f'"{column}"' for column in columns], where))
+        for name, table, columns, where, _usage in available
+        if not states.get(name)
+    ]
+    pending += [
+        (name, _index_definition(name, table, [f'"{column}" gin_trgm_ops'], method="gin"))
+        for name, table, column in missing_trigram_indexes(env)
+    ]
+    return pending
+
+
+def create_indexes_concurrently(dbname, indexes):
+    """
+    Crea los índices con CREATE INDEX CONCURRENTLY en una conexión propia
+
+    CONCURRENTLY no se puede ejecutar dentro de una transacción, por eso la
+    conexión trabaja en modo autocommit. Un índice que quedó inválido por
+    una creación interrumpida se elimina antes de volver a crearlo (IF NOT
+    EXISTS lo daría por bueno). Un fallo sólo se registra en el log: el
+    índice se reintenta en la siguiente actualización del módulo.
+
+    Args:
+        dbname: Base de datos
+        indexes: Lista de tuplas (nombre, sentencia CREATE INDEX CONCURRENTLY)
+    """
+    cr = sql_db.db_connect(dbname).cursor()
+    try:
+        cr._cnx.autocommit = True
+        for name, definition in indexes:
+            try:
+                if _index_states(cr, [name]).get(name) is False:
+                    cr.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+                cr.execute(definition)
+                _logger.info("Índice creado: %s", name)
+            except Exception as e:
+                _logger.warning("No se pudo crear el índice %s: %s", name, e)
+    finally:
+        cr._cnx.autocommit = False
+        cr.close()
+
+
+def ensure_indexes(env):
+    """
+    Programa la creación de los índices del módulo que falten
+
+    Se llama desde init() al instalar y al actualizar el módulo. CREATE INDEX
+    CONCURRENTLY no bloquea las escrituras sobre la tabla, pero espera a que
+    terminen las transacciones anteriores, incluida la de la propia
+    actualización; por eso los índices se crean después del commit
+    (postcommit) y no dentro de la transacción. La extensión pg_trgm sí se
+    instala dentro de la transacción, antes de calcular los índices de
+    trigramas pendientes.
+
+    Returns:
+        Lista de nombres de índices programados
+    """
+    ensure_trigram_extension(env)
+    pending = _pending_indexes(env)
+    if pending:
+        env.cr.postcommit.add(functools.partial(create_indexes_concurrently, env.cr.dbname, pending))
+    return [name for name, _definition in pending]
+
+
+def check_indexes(env):
+    """
+    Estado de los índices del módulo según pg_stat_user_indexes
+
+    Returns:
+        Diccionario con la disponibilidad de pg_trgm (trigram), los índices
+        esperados que faltan (compuestos y de trigramas) y, por cada índice
+        existente, su número de lecturas (idx_scan), tamaño y validez; los que
+        no se han usado desde el último reinicio de estadísticas se listan en
+        unused y los que quedaron inválidos (creación concurrente
+        interrumpida) en invalid
+    """
+    cr = env.cr
+    cr.execute(
+        """
+        SELECT s.indexrelname, s.relname, s.idx_scan, pg_relation_size(s.indexrelid), i.indisvalid
+          FROM pg_stat_user_indexes s
+          JOIN pg_index i ON i.indexrelid = s.indexrelid
+         WHERE s.indexrelname LIKE %s
+         ORDER BY s.indexrelname
+        """,
+        [INDEX_PREFIX + "%"],
+    )
+    existing = {
+        name: {"name": name, "table": table, "idx_scan": scans, "size_bytes": size, "valid": valid}
+        for name, table, scans, size, valid in cr.fetchall()
+    }
+
+    usage = {name: usage for name, _table, _columns, _where, usage in _available_indexes(env)}
+    for name, info in existing.items():
+        info["usage"] = usage.get(name, "Búsqueda por similitud de códigos (pg_trgm)")
+
+    missing = {name for name in usage if name not in existing}
+    missing.update(name for name, _table, _column in missing_trigram_indexes(env))
+
+    return {
+        "trigram": env.registry.has_trigram,
+        "missing": sorted(missing),
+        "unused": sorted(name for name, info in existing.items() if not info["idx_scan"]),
+        "invalid": sorted(name for name, info in existing.items() if not info["valid"]),
+        "indexes": list(existing.values()),
+    }
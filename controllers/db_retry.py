@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# db_retry.py - Conflictos de concurrencia en PostgreSQL
+
+import functools
+import logging
+import random
+import threading
+
+from psycopg2 import errors
+from odoo.http import request
+
+_logger = logging.getLogger(__name__)
+
+# Errores que se resuelven repitiendo la transacción completa (los mismos
+# que reintenta odoo.service.model.retrying)
+CONCURRENCY_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected, errors.LockNotAvailable)
+
+# Reintentos por documento del diario offline (ver offline_journal)
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.1  # segundos
+RETRY_MAX_DELAY = 2.0
+
+
+class RetryStats:
+    """Contadores por worker de conflictos y reintentos por endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def add(self, endpoint, retries, exhausted=False):
+        with self._lock:
+            counter = self._counters.setdefault(endpoint, {"calls_retried": 0, "retries": 0, "exhausted": 0})
+            counter["calls_retried"] += 1
+            counter["retries"] += retries
+            counter["exhausted"] += int(exhausted)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: dict(counter) for endpoint, counter in self._counters.items()}
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+retry_stats = RetryStats()
+
+
+def retry_delay(attempt):
+    """Espera aleatoria con crecimiento exponencial antes del reintento attempt"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+def retry_on_concurrency(func):
+    """
+    Deja que Odoo repita la petición completa si choca con otra transacción
+
+    Odoo ya ejecuta cada petición dentro de odoo.service.model.retrying(),
+    que ante un error de serialización, bloqueo o deadlock hace rollback y
+    repite la petición con una espera aleatoria creciente; una segunda capa
+    de reintentos aquí multiplicaría los intentos. El decorador sólo escribe
+    lo pendiente dentro del handler (para que el conflicto aparezca aquí y
+    no al confirmar), lo cuenta en retry_stats y lo propaga. Los handlers
+    deben dejar pasar CONCURRENCY_ERRORS en lugar de convertirlos en una
+    respuesta de error. Se aplica debajo de @http.route.
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            result = func(self, *args, **kwargs)
+            # Los conflictos también pueden aparecer al escribir lo pendiente
+            request.env.flush_all()
+        except CONCURRENCY_ERRORS as err:
+            retry_stats.add(func.__name__, 1)
+            _logger.info("%s: conflicto de concurrencia (%s), Odoo repetirá la petición", func.__name__, err.pgcode)
+            raise
+        return result
+
+    return wrapper
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# delta_sync.py - Paginación por cursor y sincronización incremental (since)
+
+import base64
+import json
+from datetime import timedelta
+
+from odoo import fields
+from odoo.osv import expression
+
+SYNC_DEFAULT_LIMIT = 100
+SYNC_MAX_LIMIT = 500
+# Solapamiento para no perder registros de transacciones que confirmaron
+# después de iniciar esta petición; los repetidos se reemplazan en el cliente.
+SYNC_SAFETY_MARGIN = 60  # segundos
+
+
+def _encode_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    data = json.loads(base64.urlsafe_b64decode(str(cursor).encode()).decode())
+    return {"k": data["k"], "id": int(data["id"]), "t": _to_datetime(data["t"]), "s": data.get("s")}
+
+
+def _to_datetime(value):
+    return fields.Datetime.to_datetime(str(value).replace("T", " ")[:19])
+
+
+def parse_sync_params(kwargs):
+    """
+    Lee los parámetros limit, cursor y since de una petición de listado
+
+    Returns:
+        SyncParams, o diccionario con código y mensaje si algún parámetro no es válido
+    """
+    limit = kwargs.get("limit")
+    cursor = kwargs.get("cursor")
+    since = kwargs.get("since")
+
+    try:
+        if limit not in (None, ""):
+            limit = int(limit)
+            if limit <= 0:
+                raise ValueError(limit)
+            limit = min(limit, SYNC_MAX_LIMIT)
+        else:
+            limit = None
+    except (TypeError, ValueError):
+        return {"code": 400, "msg": "El parámetro limit debe ser un entero positivo"}
+
+    try:
+        cursor = _decode_cursor(cursor) if cursor else None
+    except Exception:
+        return {"code": 400, "msg": "El parámetro cursor no es válido"}
+
+    try:
+        # Las páginas siguientes conservan la ventana de la primera
+        since = since or (cursor and cursor["s"])
+        since = _to_datetime(since) if since else None
+    except (TypeError, ValueError):
+        return {"code": 400, "msg": "El parámetro since debe tener formato YYYY-MM-DD HH:MM:SS (UTC)"}
+
+    return SyncParams(limit=limit, cursor=cursor, since=since)
+
+
+class SyncParams:
+    """
+    Selecciona la página de documentos a serializar en un listado
+
+    Los listados recorren segmentos (p. ej. un almacén) en un orden estable;
+    el cursor guarda el segmento y el último id entregado. Con since sólo se
+    devuelven documentos modificados (ellos o sus líneas) después de esa
+    fecha, y se informan los ids que salieron del resultado.
+
+    Sin limit, cursor ni since el listado se comporta como antes.
+    """
+
+    def __init__(self, limit=None, cursor=None, since=None):
+        self.enabled = bool(limit or cursor or since)
+        self.limit = limit or SYNC_DEFAULT_LIMIT
+        self.since = since
+        self.has_more = False
+        self.page_ids = []
+        self.removed_ids = set()
+        self._remaining = self.limit
+        self._last_position = None
+
+        if cursor:
+            self._cursor_key, self._cursor_id, self.server_time = cursor["k"], cursor["id"], cursor["t"]
+        else:
+            self._cursor_key, self._cursor_id = None, None
+            self.server_time = fields.Datetime.now() - timedelta(seconds=SYNC_SAFETY_MARGIN)
+        self._cursor_reached = cursor is None
+
+    def search(self, key, model, domain, lines_field=None, volatile_fields=(), lines=None):
+        """
+        Busca los documentos de un segmento que entran en la página actual
+
+        Args:
+            key: Identificador estable del segmento (p. ej. id del almacén)
+            model: Modelo sobre el que se busca (con los permisos deseados)
+            domain: Lista de condiciones del listado (AND implícito)
+            lines_field: Campo one2many de líneas; sus cambios también cuentan para since
+            volatile_fields: Campos cuyo cambio saca un documento del listado
+                (estado, responsable...); se excluyen al calcular removed_ids
+            lines: Tupla (modelo de líneas, campo many2one al documento) para
+                las líneas que no son un one2many del documento (p. ej.
+                move.line.unified); sus cambios también cuentan para since
+        """
+        if not self.enabled:
+            return model.search(domain)
+
+        domain = list(domain)
+
+        # Los ids que salieron del resultado se informan una sola vez, en la primera página
+        if self.since and self._cursor_key is None:
+            self._collect_removed(model, domain, volatile_fields)
+
+        if not self._cursor_reached:
+            if key != self._cursor_key:
+                return model.browse()
+            self._cursor_reached = True
+            domain.append(("id", ">", self._cursor_id))
+
+        if self.since:
+            if lines_field:
+                domain += ["|", ("write_date", ">", self.since), (f"{lines_field}.write_date", ">", self.since)]
+            elif lines:
+                domain += ["|", ("write_date", ">", self.since), ("id", "in", self._changed_line_parents(*lines))]
+            else:
+                domain.append(("write_date", ">", self.since))
+
+        if self.has_more:
+            return model.browse()
+
+        if self._remaining == 0:
+            self.has_more = bool(model.search_count(domain, limit=1))
+            return model.browse()
+
+        records = model.search(domain, order="id", limit=self._remaining + 1)
+        if len(records) > self._remaining:
+            records = records[: self._remaining]
+            self.has_more = True
+
+        self._remaining -= len(records)
+        if records:
+            self._last_position = (key, records[-1].id)
+        self.page_ids.extend(records.ids)
+        return records
+
+    def _changed_line_parents(self, lines_model, parent_field):
+        """Ids de los documentos con líneas modificadas después de since (una consulta agrupada)"""
+        groups = lines_model._read_group([(parent_field, "!=", False), ("write_date", ">", self.since)], [parent_field])
+        return [parent.id for (parent,) in groups]
+
+    def _collect_removed(self, model, domain, volatile_fields):
+        scope = [leaf for leaf in domain if expression.is_leaf(leaf) and leaf[0].split(".")[0] not in volatile_fields]
+        removed = model.search(
+            expression.AND(
+                [
+                    scope,
+                    [("write_date", ">", self.since)],
+                    ["!"] + expression.normalize_domain(domain),
+                ]
+            )
+        )
+        self.removed_ids.update(removed.ids)
+
+    def meta(self, emitted_ids):
+        """
+        Datos de sincronización a incluir en la respuesta
+
+        Los documentos de la página que no se serializaron (p. ej. sin líneas
+        pendientes) también se informan como retirados.
+        """
+        if not self.enabled:
+            return {}
+
+        emitted_ids = set(emitted_ids)
+        removed_ids = (self.removed_ids | set(self.page_ids)) - emitted_ids
+        server_time = fields.Datetime.to_string(self.server_time)
+
+        next_cursor = None
+        if self.has_more and self._last_position:
+            key, last_id = self._last_position
+            since = fields.Datetime.to_string(self.since) if self.since else None
+            next_cursor = _encode_cursor({"k": key, "id": last_id, "t": server_time, "s": since})
+
+        return {
+            "sync": {
+                "has_more": self.has_more,
+                "next_cursor": next_cursor,
+                "server_time": server_time,
+                "removed_ids": sorted(removed_ids),
+            }
+        }
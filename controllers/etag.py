@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# etag.py - ETags para endpoints de datos maestros
+
+import hashlib
+import json
+
+from odoo import fields
+from odoo.http import request
+
+
+def compute_etag(sources, extra=()):
+    """
+    Calcula un ETag fuerte a partir de los datos de origen de una respuesta
+
+    Args:
+        sources: Lista de tuplas (modelo, dominio); por cada una se hace una
+            sola consulta agregada con el write_date máximo y el conteo
+            (el conteo detecta eliminaciones)
+        extra: Valores adicionales de los que depende la respuesta
+            (usuario, compañías...)
+
+    Returns:
+        ETag entre comillas, listo para la cabecera
+    """
+    parts = [list(extra)]
+    for model, domain in sources:
+        [(max_write_date, count)] = model._read_group(domain, aggregates=["write_date:max", "__count"])
+        parts.append([model._name, fields.Datetime.to_string(max_write_date) or "", count])
+    digest = hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def check_etag(sources, extra=(), client_etag=None):
+    """
+    Compara el ETag actual con el del cliente (If-None-Match o parámetro etag)
+
+    Returns:
+        Tupla (etag, respuesta): respuesta es el diccionario 304 a devolver
+        cuando el cliente ya tiene la versión vigente, o None si hay que
+        serializar
+    """
+    etag = compute_etag(sources, extra)
+
+    future_response = getattr(request, "future_response", None)
+    if future_response is not None:
+        future_response.headers["ETag"] = etag
+
+    client_etag = client_etag or request.httprequest.headers.get("If-None-Match")
+    if client_etag:
+        client_tags = {tag.strip() for tag in client_etag.split(",")}
+        if "*" in client_tags or etag in client_tags or etag.strip('"') in client_tags:
+            return etag, {"code": 304, "msg": "Sin cambios", "etag": etag}
+
+    return etag, None
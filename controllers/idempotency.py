@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# idempotency.py - Respuestas idempotentes para los envíos de la PDA (Idempotency-Key)
+
+import functools
+import hashlib
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from psycopg2.extras import Json
+from odoo.http import request
+from odoo.tools.date_utils import json_default
+
+_logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_PARAM = "idempotency_key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Parámetro del sistema (ir.config_parameter): horas que se conserva cada respuesta
+PARAM_TTL_HOURS = "api_onpoint.idempotency_ttl_hours"
+DEFAULT_TTL_HOURS = 24
+
+# Respuestas que no se guardan: el cliente debe poder reintentar con la misma clave
+NOT_STORED_CODES = (409, 500, 503)
+
+
+class NotStoredResult(dict):
+    """Respuesta que no se guarda bajo la clave (ver not_stored)"""
+
+
+def not_stored(result):
+    """
+    Marca la respuesta del except genérico de un handler para que no se guarde
+
+    Un bloqueo, un timeout o una conexión caída terminan en ese except con
+    un código 400 o 500; si se guardara, el reenvío de la PDA recibiría el
+    mismo error durante todo el TTL en lugar de volver a intentarlo. Sólo
+    se guardan los resultados del negocio (éxitos y validaciones explícitas).
+    """
+    return NotStoredResult(result)
+
+# Llamadas anidadas (p. ej. el diario offline) gestionan su propia clave
+_local = threading.local()
+
+
+@contextmanager
+def idempotency_suspended():
+    """Dentro del bloque, los endpoints decorados no leen la clave de la petición"""
+    previous = getattr(_local, "suspended", False)
+    _local.suspended = True
+    try:
+        yield
+    finally:
+        _local.suspended = previous
+
+
+def request_hash(kwargs):
+    payload = {key: value for key, value in kwargs.items() if key != IDEMPOTENCY_PARAM}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=json_default).encode()).hexdigest()
+
+
+def ttl_hours(env):
+    try:
+        return max(1, int(env["ir.config_parameter"].sudo().get_param(PARAM_TTL_HOURS, DEFAULT_TTL_HOURS)))
+    except (TypeError, ValueError):
+        return DEFAULT_TTL_HOURS
+
+
+def claim_key(cr, key, user_id, route, payload_hash, ttl):
+    """
+    Reserva la clave dentro de la transacción de la petición
+
+    Si otra petición con la misma clave está en curso, el INSERT espera a que
+    termine: si confirma, la clave ya existe y se responde lo guardado; si hace
+    rollback, esta petición se queda con la clave. Una clave vencida se reutiliza.
+
+    Returns:
+        True si esta petición debe ejecutar el handler
+    """
+    cr.execute(
+        """
+        INSERT INTO onpoint_idempotency_key (key, user_id, route, request_hash, expires_at)
+        VALUES (%s, %s, %s, %s, NOW() AT TIME ZONE 'UTC' + make_interval(hours => %s))
+        ON CONFLICT (key, user_id, route) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, response = NULL, expires_at = EXCLUDED.expires_at
+            WHERE onpoint_idempotency_key.expires_at < NOW() AT TIME ZONE 'UTC'
+        RETURNING id
+        """,
+        (key, user_id, route, payload_hash, ttl),
+    )
+    return bool(cr.fetchone())
+
+
+def _replay(row, payload_hash):
+    if not row or row[1] is None:
+        return {"code": 409, "msg": "La petición con esta clave de idempotencia aún está en proceso"}
+    if row[0] != payload_hash:
+        return {"code": 422, "msg": "La clave de idempotencia ya se usó con otros datos"}
+    return row[1]
+
+
+def stored_response(cr, key, user_id, route, payload_hash):
+    """Respuesta guardada para una clave ya reservada (o el error 409/422 correspondiente)"""
+    cr.execute(
+        "SELECT request_hash, response FROM onpoint_idempotency_key WHERE key = %s AND user_id = %s AND route = %s",
+        (key, user_id, route),
+    )
+    return _replay(cr.fetchone(), payload_hash)
+
+
+def stored_responses(cr, keys, user_id, route, payload_hashes):
+    """
+    Respuestas guardadas de varias claves con una sola consulta
+
+    Returns:
+        Diccionario clave -> respuesta, sólo con las claves vigentes
+    """
+    if not keys:
+        return {}
+    cr.execute(
+        """
+        SELECT key, request_hash, response FROM onpoint_idempotency_key
+         WHERE key = ANY(%s) AND user_id = %s AND route = %s AND expires_at >= NOW() AT TIME ZONE 'UTC'
+        """,
+        (list(keys), user_id, route),
+    )
+    return {key: _replay((hash_, response), payload_hashes.get(key)) for key, hash_, response in cr.fetchall()}
+
+
+def store_response(cr, key, user_id, route, result):
+    """
+    Guarda la respuesta de una clave reservada, o libera la clave si no se debe guardar
+    (códigos de NOT_STORED_CODES y respuestas marcadas con not_stored)
+
+    Si el handler hizo rollback la reserva ya no existe y estas sentencias no afectan filas.
+    """
+    code = result.get("code") if isinstance(result, dict) else None
+    if code in NOT_STORED_CODES or isinstance(result, NotStoredResult):
+        cr.execute(
+            "DELETE FROM onpoint_idempotency_key WHERE key = %s AND user_id = %s AND route = %s",
+            (key, user_id, route),
+        )
+    else:
+        cr.execute(
+            "UPDATE onpoint_idempotency_key SET response = %s WHERE key = %s AND user_id = %s AND route = %s",
+            (Json(result, dumps=lambda value: json.dumps(value, default=json_default)), key, user_id, route),
+        )
+
+
+def idempotent(func):
+    """
+    Devuelve la respuesta original cuando la PDA reenvía la misma petición
+
+    La clave se lee de la cabecera Idempotency-Key o del parámetro
+    idempotency_key; sin clave el endpoint se comporta como antes. La
+    respuesta se guarda por (clave, usuario, ruta) en la misma transacción
+    que las escrituras del handler, así un reenvío sólo cuesta una consulta
+    por índice. Reusar la clave con otros datos responde 422.
+
+    Se aplica debajo de @http.route y de @retry_on_concurrency (cada
+    reintento de la petición por Odoo vuelve a reservar la clave tras el
+    rollback).
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = request.httprequest.headers.get(IDEMPOTENCY_HEADER) or kwargs.get(IDEMPOTENCY_PARAM)
+        if getattr(_local, "suspended", False):
+            kwargs.pop(IDEMPOTENCY_PARAM, None)
+            key = None
+        if not key:
+            return func(self, *args, **kwargs)
+
+        kwargs.pop(IDEMPOTENCY_PARAM, None)
+        key = str(key).strip()[:IDEMPOTENCY_KEY_MAX_LENGTH]
+        cr = request.env.cr
+        user_id = request.env.uid
+        route = request.httprequest.path
+        payload_hash = request_hash(kwargs)
+
+        if not claim_key(cr, key, user_id, route, payload_hash, ttl_hours(request.env)):
+            _logger.info("%s: reenvío con Idempotency-Key %s, se devuelve la respuesta original", route, key)
+            future_response = getattr(request, "future_response", None)
+            if future_response is not None:
+                future_response.headers["Idempotent-Replayed"] = "true"
+            return stored_response(cr, key, user_id, route, payload_hash)
+
+        result = func(self, *args, **kwargs)
+        store_response(cr, key, user_id, route, result)
+        return result
+
+    return wrapper
@@ -6,74 +6,30 @@ from odoo import http
 from odoo.exceptions import AccessError
 from odoo.http import request
 
-from .utils import get_barcodes, get_packagings
+from . import app_version
+from .db_retry import CONCURRENCY_ERRORS, retry_on_concurrency
+from .idempotency import idempotent, not_stored
+from .offline_journal import register_journal_operation
+from .utils import FieldSelector, ProductCatalog, get_barcodes, get_packagings, product_fragment
 
 
 class InventoryController(http.Controller):
-    def get_last_version(self):
-        try:
-            # Obtener la última versión
-            last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
-
-            if not last_version:
-                return {"code": 404, "msg": "No se encontró ninguna versión"}
-
-            # Convertir el texto JSON a una lista Python
-            notes_list = []
-            if last_version.notes:
-                try:
-                    notes_list = json.loads(last_version.notes)
-                except:
-                    notes_list = ["Error al procesar las notas"]
-
-            return {
-                "code": 200,
-                "result": {
-                    "id": last_version.id,
-                    "version": last_version.version,
-                    "release_date": str(last_version.release_date),
-                    "notes": notes_list,  # Ahora devuelve la lista en lugar del string JSON
-                    "url_download": last_version.url_download,
-                },
-            }
-
-        except AccessError as e:
-            return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
-        except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
-
     @http.route("/api/inventory/all_orders", type="json", auth="user", methods=["GET"], csrf=False)
     def get_all_orders(self, **kwargs):
         try:
             version_app = kwargs.get("version_app") or request.params.get("version_app")
 
-            # 1. Llama al método que obtiene la última versión
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                try:
-                    app_parts = list(map(int, version_app.split(".")))
-                    latest_parts = list(map(int, latest_version_str.split(".")))
-                    if app_parts < latest_parts:
-                        update_required = True
-                except (ValueError, TypeError):
-                    update_required = True  # Requiere actualización si el formato es incorrecto
-            else:
-                update_required = True  # Requiere actualización si no se envía versión
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
             if not user:
                 return {"code": 400, "update_version": update_required, "msg": "Usuario no encontrado"}
 
+            # Con normalized=1 los datos de producto se entregan una sola vez en "products"
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            line_filter = FieldSelector(exclude=catalog.line_keys)
+
             all_orders = []
 
             # Obtener los almacenes permitidos para el usuario
@@ -156,58 +112,61 @@ class InventoryController(http.Controller):
                                     "cantidad": 0,
                                     "barcode_type": "",
                                 }
-                                for barcode in product.barcode_ids
+                                for barcode in product_fragment(product)["barcodes"]
                                 if barcode.name
                             ]
                             if hasattr(product, "barcode_ids")
                             else []
                         )
 
-                        line_data = {
-                            "id": line.id,
-                            "is_original": line.is_original,
-                            "id_move": line.id,
-                            "order_id": order.id,
-                            "product_id": product.id,
-                            "product_name": product.display_name,
-                            "product_code": product.default_code or "",
-                            "product_barcode": product.barcode or "",
-                            "product_tracking": product.tracking or "",
-                            "use_expiration_date": product.use_expiration_date or False,
-                            "expiration_time": product.expiration_time,
-                            "other_barcodes": get_barcodes(product, line.id, order.id),
-                            "product_packing": [
-                                {
-                                    "barcode": p.barcode,
-                                    "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
-                                    "id_move": line.id,
-                                    "batch_id": order.id,
-                                }
-                                for p in getattr(product, "packaging_ids", [])
-                                if p.barcode and p.barcode.strip()
-                            ],
-                            "location_id": line.location_id.id,
-                            "location_name": line.location_id.display_name,
-                            "location_barcode": line.location_id.barcode or "",
-                            "quantity_inventory": line.quantity_inventory,
-                            "quantity_counted": line.quantity_counted,
-                            "difference_qty": line.difference_qty,
-                            "uom": product.uom_id.name if product.uom_id else "UND",
-                            "weight": product.weight or 0,
-                            "is_done_item": line.is_done_item,
-                            "date_transaction": (
-                                line.date_transaction.strftime("%Y-%m-%d %H:%M:%S")
-                                if line.date_transaction
-                                else ""
-                            ),
-                            "observation": line.new_observation or "",
-                            "time": line.time or 0,
-                            "user_operator_id": line.user_operator_id.id if line.user_operator_id else 0,
-                            "user_operator_name": line.user_operator_id.name if line.user_operator_id else "",
-                            "category_id": line.product_categ_id.id if line.product_categ_id else 0,
-                            "category_name": line.product_categ_id.name if line.product_categ_id else "",
-                        }
+                        catalog.add(product)
+                        line_data = line_filter.build(
+                            {
+                                "id": line.id,
+                                "is_original": line.is_original,
+                                "id_move": line.id,
+                                "order_id": order.id,
+                                "product_id": product.id,
+                                "product_name": lambda: product.display_name,
+                                "product_code": lambda: product.default_code or "",
+                                "product_barcode": lambda: product.barcode or "",
+                                "product_tracking": lambda: product.tracking or "",
+                                "use_expiration_date": product.use_expiration_date or False,
+                                "expiration_time": product.expiration_time,
+                                "other_barcodes": lambda: get_barcodes(product, line.id, order.id),
+                                "product_packing": lambda: [
+                                    {
+                                        "barcode": p.barcode,
+                                        "cantidad": p.qty,
+                                        "id_product": p.product_id,
+                                        "id_move": line.id,
+                                        "batch_id": order.id,
+                                    }
+                                    for p in product_fragment(product)["packagings"]
+                                    if p.barcode and p.barcode.strip()
+                                ],
+                                "location_id": line.location_id.id,
+                                "location_name": line.location_id.display_name,
+                                "location_barcode": line.location_id.barcode or "",
+                                "quantity_inventory": line.quantity_inventory,
+                                "quantity_counted": line.quantity_counted,
+                                "difference_qty": line.difference_qty,
+                                "uom": product.uom_id.name if product.uom_id else "UND",
+                                "weight": lambda: product.weight or 0,
+                                "is_done_item": line.is_done_item,
+                                "date_transaction": (
+                                    line.date_transaction.strftime("%Y-%m-%d %H:%M:%S")
+                                    if line.date_transaction
+                                    else ""
+                                ),
+                                "observation": line.new_observation or "",
+                                "time": line.time or 0,
+                                "user_operator_id": line.user_operator_id.id if line.user_operator_id else 0,
+                                "user_operator_name": line.user_operator_id.name if line.user_operator_id else "",
+                                "category_id": line.product_categ_id.id if line.product_categ_id else 0,
+                                "category_name": line.product_categ_id.name if line.product_categ_id else "",
+                            }
+                        )
 
                         # Información del lote si existe
                         if line.lot_id:
@@ -246,6 +205,7 @@ class InventoryController(http.Controller):
                 "data": all_orders,
                 "user_id": user.id,
                 "allowed_warehouses": [{"id": wh.id, "name": wh.name} for wh in allowed_warehouses],
+                **catalog.meta(),
             }
 
         except Exception as e:
@@ -327,11 +287,11 @@ class InventoryController(http.Controller):
                         {
                             "barcode": p.barcode,
                             "cantidad": p.qty,
-                            "id_product": p.product_id.id,
+                            "id_product": p.product_id,
                             "id_line": line.id,
                             "order_id": order.id,
                         }
-                        for p in getattr(product, "packaging_ids", [])
+                        for p in product_fragment(product)["packagings"]
                     ],
                     "location_id": line.location_id.id,
                     "location_name": line.location_id.display_name,
@@ -391,6 +351,8 @@ class InventoryController(http.Controller):
 
     ## Envio de datos de inventario
     @http.route("/api/inventory/send_inventory", type="json", auth="user", methods=["POST"], csrf=False)
+    @retry_on_concurrency
+    @idempotent
     def send_inventory(self, **kwargs):
         try:
             user = request.env.user
@@ -601,9 +563,11 @@ class InventoryController(http.Controller):
         except AccessError as e:
             request.env.cr.rollback()
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             request.env.cr.rollback()
-            return {"code": 500, "msg": f"Error interno del servidor: {str(e)}", "data": {}}
+            return not_stored({"code": 500, "msg": f"Error interno del servidor: {str(e)}", "data": {}})
 
     ## Eliminar datos de la linea
     @http.route("/api/inventory/delete_line", type="json", auth="user", methods=["POST"], csrf=False)
@@ -685,6 +649,9 @@ class InventoryController(http.Controller):
             return {"code": 500, "msg": f"Error interno del servidor: {str(e)}", "data": {}}
 
 
+register_journal_operation("send_inventory", InventoryController, "send_inventory", "bexwms_counted.order", "order_id")
+
+
 def procesar_fecha_naive(fecha_transaccion, zona_horaria_cliente):
     if fecha_transaccion:
         # Convertir la fecha enviada a datetime y agregar la zona horaria del cliente
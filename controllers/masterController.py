@@ -6,15 +6,42 @@ from datetime import datetime, date
 import json
 import base64
 
+from . import app_version
+from .db_indexes import check_indexes
+from .db_retry import CONCURRENCY_ERRORS, retry_stats
+from .etag import check_etag
+from .offline_journal import JOURNAL_MAX_OPERATIONS, apply_journal, register_journal_operation
+from .response_compression import compression_stats
+from .settings_snapshot import get_settings
+from .utils import product_fragment
+
 
 class MasterData(http.Controller):
 
     ## GET Configuraciones
     @http.route("/api/configurations", auth="user", type="json", methods=["GET"])
-    def get_configurations(self):
+    def get_configurations(self, **kwargs):
         try:
+            user = request.env.user
+            etag, not_modified = check_etag(
+                [
+                    (request.env["res.users"].sudo(), [("id", "=", user.id)]),
+                    (request.env["appwms.users_wms"].sudo(), [("user_id", "=", user.id)]),
+                    (request.env["appwms.user_permission_app"].sudo(), [("user_id", "=", user.id)]),
+                    (request.env["stock.warehouse"].sudo(), []),
+                    (request.env["appwms.config.general"].sudo(), []),
+                    (request.env["appwms.temperature"].sudo(), []),
+                    (request.env["config.returns.general"].sudo(), []),
+                ],
+                extra=("configurations", user.id),
+                client_etag=kwargs.get("etag"),
+            )
+            if not_modified:
+                return not_modified
+
             # Obtener configuración general
-            config = request.env["appwms.config.general"].sudo().search([], limit=1)
+            settings = get_settings()
+            config = settings.general
             config_data = {"muelle_option": config.muelle_option if config else None}
 
             # Obtener datos del usuario autenticado
@@ -60,13 +87,13 @@ class MasterData(http.Controller):
                     "msg": "El usuario no tiene permisos específicos asignados",
                 }
 
-            show_photo_temperature = request.env["appwms.temperature"].sudo().search([], limit=1)
+            show_photo_temperature = settings.temperature
             if show_photo_temperature:
                 user_data["show_photo_temperature"] = show_photo_temperature.show_photo_temperature
             else:
                 user_data["show_photo_temperature"] = False
 
-            config_returns = request.env["config.returns.general"].sudo().search([], limit=1)
+            config_returns = settings.returns
             if config_returns:
                 user_data["returns_location_dest_option"] = config_returns.location_option
             else:
@@ -133,7 +160,7 @@ class MasterData(http.Controller):
                 ),
             }
 
-            return {"code": 200, "result": response_data}
+            return {"code": 200, "result": response_data, "etag": etag}
 
         except AccessError as e:
             return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
@@ -144,20 +171,26 @@ class MasterData(http.Controller):
 
     ## GET Muelles
     @http.route("/api/muelles", auth="user", type="json", methods=["GET"])
-    def get_muelles(self):
+    def get_muelles(self, **kwargs):
         try:
-            # Obtener todos los muelles con las condiciones especificadas
-            muelles = (
-                request.env["stock.location"]
-                .sudo()
-                .search(
-                    [
-                        ("usage", "=", "internal"),
-                        ("is_a_dock", "=", True),
-                        ("is_full", "=", False),
-                    ]
-                )
+            domain = [
+                ("usage", "=", "internal"),
+                ("is_a_dock", "=", True),
+                ("is_full", "=", False),
+            ]
+
+            # El ETag cubre también las ubicaciones que dejaron de ser muelles disponibles
+            locations = request.env["stock.location"].sudo()
+            etag, not_modified = check_etag(
+                [(locations, [("usage", "=", "internal")])],
+                extra=("muelles",),
+                client_etag=kwargs.get("etag"),
             )
+            if not_modified:
+                return not_modified
+
+            # Obtener todos los muelles con las condiciones especificadas
+            muelles = locations.search(domain)
 
             array_muelles = []
 
@@ -172,7 +205,7 @@ class MasterData(http.Controller):
                     }
                 )
 
-            return {"code": 200, "result": array_muelles}
+            return {"code": 200, "result": array_muelles, "etag": etag}
 
         except AccessError as e:
             return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
@@ -211,8 +244,16 @@ class MasterData(http.Controller):
 
     ## Obtener almacenes
     @http.route("/api/warehouses", auth="user", type="json", methods=["GET"])
-    def get_warehouses(self):
+    def get_warehouses(self, **kwargs):
         try:
+            etag, not_modified = check_etag(
+                [(request.env["stock.warehouse"], []), (request.env["res.company"].sudo(), [])],
+                extra=("warehouses", request.env.user.id, request.env.companies.ids),
+                client_etag=kwargs.get("etag"),
+            )
+            if not_modified:
+                return not_modified
+
             # Buscar todos los registros del modelo 'stock.warehouse'
             warehouses = request.env["stock.warehouse"].search([])
 
@@ -229,7 +270,7 @@ class MasterData(http.Controller):
                     }
                 )
 
-            return {"code": 200, "result": array_warehouses}
+            return {"code": 200, "result": array_warehouses, "etag": etag}
 
         except AccessError as e:
             return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
@@ -238,10 +279,15 @@ class MasterData(http.Controller):
 
     ## GET Novedades de Picking
     @http.route("/api/picking_novelties", auth="user", type="json", methods=["GET"])
-    def get_picking_novelties(self):
+    def get_picking_novelties(self, **kwargs):
         try:
+            novelties = request.env["picking.novelties"].sudo()
+            etag, not_modified = check_etag([(novelties, [])], extra=("picking_novelties",), client_etag=kwargs.get("etag"))
+            if not_modified:
+                return not_modified
+
             # Obtener todas las novedades de picking
-            picking_novelties = request.env["picking.novelties"].sudo().search([])
+            picking_novelties = novelties.search([])
 
             array_picking_novelties = []
 
@@ -254,7 +300,7 @@ class MasterData(http.Controller):
                     }
                 )
 
-            return {"code": 200, "result": array_picking_novelties}
+            return {"code": 200, "result": array_picking_novelties, "etag": etag}
 
         except AccessError as e:
             return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
@@ -314,6 +360,8 @@ class MasterData(http.Controller):
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as err:
             return {"code": 400, "msg": f"Error inesperado {str(err)}"}
 
@@ -375,9 +423,26 @@ class MasterData(http.Controller):
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as err:
             return {"code": 400, "msg": f"Error inesperado {str(err)}"}
 
+    ## POST Sincronización del diario de operaciones registradas sin conexión
+    @http.route("/api/sync/journal", auth="user", type="json", methods=["POST"], csrf=False)
+    def sync_journal(self, **auth):
+        try:
+            operations = auth.get("operations")
+            if not isinstance(operations, list) or not operations:
+                return {"code": 400, "msg": "operations debe ser una lista no vacía"}
+            if len(operations) > JOURNAL_MAX_OPERATIONS:
+                return {"code": 400, "msg": f"Máximo {JOURNAL_MAX_OPERATIONS} operaciones por sincronización"}
+
+            return apply_journal(operations)
+
+        except Exception as err:
+            return {"code": 500, "msg": f"Error interno: {str(err)}"}
+
     ## POST Tiempo de inicio de batch por usuario
     @http.route("/api/start_time_batch_user", auth="user", type="json", methods=["POST"])
     def post_start_time_batch_user(self, **auth):
@@ -581,6 +646,7 @@ class MasterData(http.Controller):
                     }
                 )
             )
+            app_version.invalidate_version_cache()
 
             # Para la respuesta, devuelve las notas como lista
             return {
@@ -631,30 +697,7 @@ class MasterData(http.Controller):
     @http.route("/api/last-version", auth="user", type="json", methods=["GET"])
     def get_last_version(self):
         try:
-            # Obtener la última versión
-            last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
-
-            if not last_version:
-                return {"code": 404, "msg": "No se encontró ninguna versión"}
-
-            # Convertir el texto JSON a una lista Python
-            notes_list = []
-            if last_version.notes:
-                try:
-                    notes_list = json.loads(last_version.notes)
-                except:
-                    notes_list = ["Error al procesar las notas"]
-
-            return {
-                "code": 200,
-                "result": {
-                    "id": last_version.id,
-                    "version": last_version.version,
-                    "release_date": str(last_version.release_date),
-                    "notes": notes_list,  # Ahora devuelve la lista en lugar del string JSON
-                    "url_download": last_version.url_download,
-                },
-            }
+            return app_version.get_last_version()
 
         except AccessError as e:
             return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
@@ -676,6 +719,7 @@ class MasterData(http.Controller):
 
             # Eliminar la versión
             version.unlink()
+            app_version.invalidate_version_cache()
 
             return {"code": 200, "msg": "Versión eliminada correctamente"}
 
@@ -978,7 +1022,7 @@ class MasterData(http.Controller):
                     )
 
             # Obtener códigos de barras de paquetes
-            paquetes = product.packaging_ids.mapped("barcode")
+            paquetes = [pack.barcode for pack in product_fragment(product)["packagings"]]
 
             # Construir respuesta completa como en la imagen
             response_data = {
@@ -1067,12 +1111,19 @@ class MasterData(http.Controller):
 
     ## GET Todas las categorías de productos
     @http.route("/api/get_product_categories", auth="user", type="json", methods=["GET", "POST"])
-    def get_product_categories(self):
+    def get_product_categories(self, **kwargs):
         """
         Obtiene todas las categorías de productos
         """
         try:
-            categories = request.env["product.category"].sudo().search([])
+            category_model = request.env["product.category"].sudo()
+            etag, not_modified = check_etag(
+                [(category_model, [])], extra=("product_categories",), client_etag=kwargs.get("etag")
+            )
+            if not_modified:
+                return not_modified
+
+            categories = category_model.search([])
 
             if not categories:
                 return {"code": 404, "msg": "No se encontraron categorías de productos"}
@@ -1088,7 +1139,7 @@ class MasterData(http.Controller):
                     }
                 )
 
-            return {"code": 200, "result": result}
+            return {"code": 200, "result": result, "etag": etag}
 
         except Exception as e:
             return {"code": 400, "msg": f"Error interno del servidor: {str(e)}"}
@@ -1561,6 +1612,38 @@ class MasterData(http.Controller):
         except Exception as e:
             return request.make_json_response({"code": 500, "msg": f"Error interno del servidor: {str(e)}"})
 
+    ## GET Métricas de compresión de respuestas (por worker)
+    @http.route("/api/compression_stats", auth="user", type="json", methods=["GET"])
+    def get_compression_stats(self, **kwargs):
+        if not request.env.user.has_group("base.group_system"):
+            return {"code": 403, "msg": "Permisos insuficientes"}
+
+        return {"code": 200, "result": compression_stats.snapshot()}
+
+    ## GET Métricas de reintentos por conflictos de concurrencia (por worker)
+    @http.route("/api/retry_stats", auth="user", type="json", methods=["GET"])
+    def get_retry_stats(self, **kwargs):
+        if not request.env.user.has_group("base.group_system"):
+            return {"code": 403, "msg": "Permisos insuficientes"}
+
+        return {"code": 200, "result": retry_stats.snapshot()}
+
+    ## GET Estado de los índices del módulo (se crean al instalar/actualizar el módulo)
+    @http.route("/api/db_indexes", auth="user", type="json", methods=["GET"])
+    def get_db_indexes(self, **kwargs):
+        if not request.env.user.has_group("base.group_system"):
+            return {"code": 403, "msg": "Permisos insuficientes"}
+
+        try:
+            return {"code": 200, "result": check_indexes(request.env(su=True))}
+
+        except Exception as e:
+            return {"code": 500, "msg": f"Error interno del servidor: {str(e)}"}
+
+
+register_journal_operation("update_start_time", MasterData, "post_picking_start_time", "stock.picking.batch", "picking_id")
+register_journal_operation("update_end_time", MasterData, "post_picking_end_time", "stock.picking.batch", "picking_id")
+
 
 def obtener_almacenes_usuario(user):
 
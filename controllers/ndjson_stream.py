@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# ndjson_stream.py - Respuestas NDJSON generadas por bloques (type="http")
+
+import json
+import logging
+
+from odoo import api
+from odoo.http import Response, request
+from odoo.modules.registry import Registry
+from odoo.tools import split_every
+from odoo.tools.date_utils import json_default
+
+_logger = logging.getLogger(__name__)
+
+# Documentos que se leen (y se mantienen en caché) a la vez
+STREAM_CHUNK_SIZE = 100
+
+
+def iter_records(records, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Recorre un recordset por bloques
+
+    Cada bloque tiene su propio prefetch y la caché del entorno se libera
+    entre bloques, así la memoria no crece con el número de documentos.
+    """
+    for index, ids in enumerate(split_every(chunk_size, records.ids)):
+        if index:
+            records.env.invalidate_all()
+        yield from records.browse(ids)
+
+
+def ndjson_response(documents, trailer=None):
+    """
+    Respuesta HTTP con un documento JSON por línea
+
+    El cuerpo se envía después de que Odoo cierra el cursor de la petición,
+    por eso los documentos se generan con un cursor propio de solo lectura.
+
+    Args:
+        documents: Callable que recibe el entorno y retorna un iterable de documentos
+        trailer: Callable opcional que recibe los ids emitidos y retorna datos
+            adicionales para la última línea (p. ej. sync.meta)
+
+    La última línea siempre es {"code": 200, "count": N, ...} o, si algo falla a
+    mitad del envío, {"code": 400, "msg": ...}.
+    """
+    dbname = request.db
+    uid = request.env.uid
+    context = dict(request.env.context)
+
+    def _lines():
+        emitted_ids = []
+        with Registry(dbname).cursor() as cr:
+            env = api.Environment(cr, uid, context)
+            try:
+                for document in documents(env):
+                    emitted_ids.append(document.get("id"))
+                    yield json.dumps(document, default=json_default) + "\n"
+                summary = {"code": 200, "count": len(emitted_ids)}
+                if trailer:
+                    summary.update(trailer(emitted_ids))
+            except Exception as err:
+                _logger.exception("Error generando respuesta NDJSON")
+                summary = {"code": 400, "msg": f"Error inesperado: {str(err)}"}
+            finally:
+                cr.rollback()
+            yield json.dumps(summary, default=json_default) + "\n"
+
+    return Response(
+        _lines(),
+        headers=[("Content-Type", "application/x-ndjson; charset=utf-8"), ("Cache-Control", "no-store")],
+        direct_passthrough=True,
+    )
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+# offline_journal.py - Sincronización del diario de operaciones registradas sin conexión
+
+import logging
+import time
+from datetime import datetime
+
+from odoo.http import request
+
+from .db_retry import CONCURRENCY_ERRORS, RETRY_MAX_ATTEMPTS, retry_delay, retry_stats
+from .idempotency import (
+    claim_key,
+    idempotency_suspended,
+    request_hash,
+    store_response,
+    stored_response,
+    stored_responses,
+    ttl_hours,
+)
+
+_logger = logging.getLogger(__name__)
+
+JOURNAL_MAX_OPERATIONS = 500
+JOURNAL_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Códigos con los que una operación se considera aplicada
+SUCCESS_CODES = (200, 201, 202)
+
+# Listas de líneas de los envíos (la fecha del diario completa fecha_transaccion)
+ITEM_LIST_PARAMS = ("list_item", "list_items")
+
+# tipo -> (controlador, método, modelo del documento, parámetro con el id del documento)
+_operations = {}
+
+
+def register_journal_operation(op_type, controller_class, method_name, document_model, document_param):
+    """
+    Registra el endpoint que aplica un tipo de operación del diario
+
+    El método se llama con los mismos parámetros que el endpoint y debe
+    retornar la misma respuesta.
+    """
+    _operations[op_type] = (controller_class, method_name, document_model, document_param)
+
+
+def _parse_operation(position, operation):
+    """Valida una operación del diario; retorna (operación normalizada, error)"""
+    if not isinstance(operation, dict):
+        return None, "La operación debe ser un objeto"
+
+    op_id = str(operation.get("op_id") or "").strip()
+    op_type = operation.get("type")
+    params = operation.get("params") or {}
+    timestamp = operation.get("timestamp") or ""
+
+    if not op_id:
+        return None, "op_id es requerido"
+    if op_type not in _operations:
+        return None, f"Tipo de operación no soportado: {op_type}"
+    if not isinstance(params, dict):
+        return None, "params debe ser un objeto"
+    if timestamp:
+        try:
+            datetime.strptime(timestamp, JOURNAL_TIMESTAMP_FORMAT)
+        except (TypeError, ValueError):
+            return None, f"Formato de timestamp inválido. Debe ser '{JOURNAL_TIMESTAMP_FORMAT}'"
+
+    controller_class, method_name, document_model, document_param = _operations[op_type]
+    try:
+        document_id = int(params.get(document_param) or 0)
+    except (TypeError, ValueError):
+        document_id = 0
+    if not document_id:
+        return None, f"{document_param} es requerido"
+
+    # Las líneas sin fecha propia se registran con la hora en que ocurrieron, no la de la sincronización
+    if timestamp:
+        for list_param in ITEM_LIST_PARAMS:
+            for item in params.get(list_param) or []:
+                if isinstance(item, dict) and not item.get("fecha_transaccion"):
+                    item["fecha_transaccion"] = timestamp
+
+    return {
+        "position": position,
+        "op_id": op_id,
+        "type": op_type,
+        "timestamp": timestamp,
+        "params": params,
+        "handler": (controller_class, method_name),
+        "document": (document_model, document_id),
+        "hash": request_hash({"type": op_type, "params": params}),
+    }, None
+
+
+def _operation_result(operation, status, result):
+    return {
+        "op_id": operation["op_id"],
+        "type": operation["type"],
+        "timestamp": operation["timestamp"],
+        "status": status,
+        "code": result.get("code", 200) if isinstance(result, dict) else 200,
+        "result": result,
+    }
+
+
+def _apply_document(env, route, document_operations, ttl):
+    """
+    Aplica las operaciones de un documento y confirma la transacción
+
+    Si una operación falla se deshacen las anteriores y se omiten las
+    siguientes. Los conflictos de concurrencia se propagan para repetir el
+    documento completo (los handlers registrados los dejan pasar en lugar
+    de convertirlos en una respuesta de error).
+
+    Returns:
+        Diccionario posición en el diario -> resultado
+    """
+    cr = env.cr
+    user_id = env.uid
+    results = {}
+    applied = []
+    failure = None
+
+    for operation in document_operations:
+        if failure:
+            results[operation["position"]] = _operation_result(
+                operation, "skipped", {"code": 424, "msg": f"No se aplicó: falló la operación {failure['op_id']}"}
+            )
+            continue
+
+        # Otra sincronización aplicó la operación mientras se procesaba este diario
+        if not claim_key(cr, operation["op_id"], user_id, route, operation["hash"], ttl):
+            result = stored_response(cr, operation["op_id"], user_id, route, operation["hash"])
+            results[operation["position"]] = _operation_result(operation, "replayed", result)
+            continue
+
+        controller_class, method_name = operation["handler"]
+        try:
+            with idempotency_suspended():
+                result = getattr(controller_class(), method_name)(**operation["params"])
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as err:
+            _logger.exception("Error aplicando la operación %s del diario", operation["op_id"])
+            result = {"code": 500, "msg": f"Error interno: {str(err)}"}
+
+        code = result.get("code", 200) if isinstance(result, dict) else 200
+        if code not in SUCCESS_CODES:
+            failure = operation
+            results[operation["position"]] = _operation_result(operation, "failed", result)
+            continue
+
+        store_response(cr, operation["op_id"], user_id, route, result)
+        applied.append((operation, result))
+
+    if failure:
+        cr.rollback()
+        for operation, _result in applied:
+            results[operation["position"]] = _operation_result(
+                operation,
+                "rolled_back",
+                {"code": 424, "msg": f"Se deshizo: falló la operación {failure['op_id']} del mismo documento"},
+            )
+    else:
+        env.flush_all()
+        cr.commit()
+        for operation, result in applied:
+            results[operation["position"]] = _operation_result(operation, "applied", result)
+
+    return results
+
+
+def apply_journal(operations):
+    """
+    Aplica en orden las operaciones registradas por la PDA sin conexión
+
+    Cada operación lleva op_id (único, generado en la PDA), type, params
+    (los mismos del endpoint) y timestamp (hora del cliente). Las búsquedas
+    se hacen una sola vez para todo el diario: documentos existentes y
+    operaciones ya aplicadas en una sincronización anterior, que se
+    responden con su resultado original.
+
+    Las operaciones de un mismo documento se aplican en una transacción
+    (ver _apply_document), que se repite completa ante conflictos de
+    concurrencia; los demás documentos no se ven afectados. Los conflictos
+    se capturan aquí y no llegan al reintento de la petición de Odoo, que
+    repetiría también los documentos ya confirmados.
+
+    Returns:
+        Diccionario con un resultado por operación, en el orden del diario
+    """
+    env = request.env
+    cr = env.cr
+    user_id = env.uid
+    route = request.httprequest.path
+
+    results = [None] * len(operations)
+    pending = []
+    seen_op_ids = set()
+
+    for position, raw_operation in enumerate(operations):
+        operation, error = _parse_operation(position, raw_operation)
+        if operation and operation["op_id"] in seen_op_ids:
+            operation, error = None, "op_id repetido en el diario"
+        if error:
+            op_id = raw_operation.get("op_id") if isinstance(raw_operation, dict) else None
+            results[position] = {"op_id": op_id, "status": "rejected", "code": 400, "result": {"code": 400, "msg": error}}
+            continue
+        seen_op_ids.add(operation["op_id"])
+        pending.append(operation)
+
+    # 1. Operaciones ya aplicadas en una sincronización anterior
+    replayed = stored_responses(cr, [op["op_id"] for op in pending], user_id, route, {op["op_id"]: op["hash"] for op in pending})
+
+    # 2. Documentos existentes, una búsqueda por modelo
+    ids_by_model = {}
+    for operation in pending:
+        model_name, document_id = operation["document"]
+        ids_by_model.setdefault(model_name, set()).add(document_id)
+    # Los modelos de otros módulos (p. ej. bexwms_counted.order) pueden no estar instalados en esta base
+    existing = {
+        model_name: set(env[model_name].sudo().search([("id", "in", list(ids))]).ids)
+        for model_name, ids in ids_by_model.items()
+        if model_name in env
+    }
+
+    # 3. Agrupar por documento conservando el orden del diario
+    documents = {}
+    for operation in pending:
+        if operation["op_id"] in replayed:
+            results[operation["position"]] = _operation_result(operation, "replayed", replayed[operation["op_id"]])
+            continue
+        model_name, document_id = operation["document"]
+        if model_name not in existing:
+            results[operation["position"]] = _operation_result(
+                operation, "rejected", {"code": 400, "msg": f"El modelo {model_name} no está instalado en esta base de datos"}
+            )
+            continue
+        if document_id not in existing[model_name]:
+            results[operation["position"]] = _operation_result(
+                operation, "failed", {"code": 404, "msg": f"Documento {model_name} {document_id} no encontrado"}
+            )
+            continue
+        documents.setdefault(operation["document"], []).append(operation)
+
+    ttl = ttl_hours(env)
+    for document_operations in documents.values():
+        attempt = 0
+        while True:
+            try:
+                document_results = _apply_document(env, route, document_operations, ttl)
+            except CONCURRENCY_ERRORS as err:
+                cr.rollback()
+                attempt += 1
+                if attempt >= RETRY_MAX_ATTEMPTS:
+                    retry_stats.add("sync_journal", attempt - 1, exhausted=True)
+                    _logger.warning("Diario offline: conflicto de concurrencia tras %d intentos: %s", attempt, err)
+                    conflict = {"code": 409, "msg": "Otro usuario está modificando los mismos registros, intente de nuevo"}
+                    document_results = {op["position"]: _operation_result(op, "failed", conflict) for op in document_operations}
+                    break
+                time.sleep(retry_delay(attempt))
+                continue
+            if attempt:
+                retry_stats.add("sync_journal", attempt)
+            break
+        for position, result in document_results.items():
+            results[position] = result
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+
+    return {"code": 200, "results": results, "summary": summary}
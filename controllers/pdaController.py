@@ -3,6 +3,9 @@ from odoo import http, fields
 from odoo.http import request
 import logging
 
+from .pda_auth import invalidate_pda
+from .pda_heartbeat import invalidate_heartbeat_status, record_heartbeat
+
 _logger = logging.getLogger(__name__)
 
 
@@ -43,6 +46,8 @@ class PdaController(http.Controller):
 
                 if update_vals:
                     pda.sudo().write(update_vals)
+                invalidate_pda(device_id)
+                invalidate_heartbeat_status(device_id)
 
                 # Registrar la conexión usando el método específico
                 pda.sudo().register_connection(user_id=request.env.user.id, ip_address=request.httprequest.remote_addr, additional_data=kwargs)  # Puedes pasar datos adicionales si los necesitas
@@ -68,6 +73,8 @@ class PdaController(http.Controller):
 
                 # Registrar la primera conexión
                 new_pda.sudo().register_connection(user_id=request.env.user.id, ip_address=request.httprequest.remote_addr, additional_data=kwargs)
+                invalidate_pda(device_id)
+                invalidate_heartbeat_status(device_id)
 
                 return {
                     "code": 201,
@@ -103,28 +110,26 @@ class PdaController(http.Controller):
             if not device_id:
                 return {"code": 400, "msg": "Parámetro device_id es obligatorio"}
 
-            pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)], limit=1)
+            # Actualizar última actividad (se consolida en pda.logs por cron, ver pda_heartbeat)
+            pda = record_heartbeat(request.env, device_id, request.env.user.id, request.httprequest.remote_addr, count_login=True)
 
             if not pda:
                 return {"code": 404, "msg": "Dispositivo no encontrado"}
 
-            # Actualizar última actividad
-            pda.sudo().write({"last_login": request.env["ir.fields"].Datetime.now(), "login_count": pda.login_count + 1, "user_id": request.env.user.id, "ip_address": request.httprequest.remote_addr})
-
-            is_authorized = pda.is_authorized == "yes" and pda.is_active
+            is_authorized = pda["is_authorized"] == "yes" and pda["is_active"]
 
             return {
                 "code": 200,
                 "msg": "Estado verificado correctamente",
                 "data": {
-                    "device_id": pda.device_id,
-                    "device_name": pda.device_name,
-                    "device_model": pda.device_model,
+                    "device_id": pda["device_id"],
+                    "device_name": pda["device_name"],
+                    "device_model": pda["device_model"],
                     "is_authorized": is_authorized,
-                    "is_active": pda.is_active,
-                    "authorization_status": pda.is_authorized,
-                    "last_login": pda.last_login.isoformat() if pda.last_login else None,
-                    "login_count": pda.login_count,
+                    "is_active": pda["is_active"],
+                    "authorization_status": pda["is_authorized"],
+                    "last_login": pda["last_login"].isoformat() if pda["last_login"] else None,
+                    "login_count": pda["login_count"],
                 },
             }
 
@@ -215,6 +220,8 @@ class PdaController(http.Controller):
             else:
                 pda.sudo().action_revoke_device()
                 message = f"Dispositivo {pda.device_name} desautorizado correctamente"
+            invalidate_pda(device_id)
+            invalidate_heartbeat_status(device_id)
 
             return {"code": 200, "msg": message, "data": {"device_id": pda.device_id, "device_name": pda.device_name, "is_authorized": pda.is_authorized, "is_active": pda.is_active}}
 
@@ -238,17 +245,15 @@ class PdaController(http.Controller):
             if not device_id:
                 return {"code": 400, "msg": "Parámetro device_id es obligatorio"}
 
-            pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)], limit=1)
+            # Actualizar actividad (se consolida en pda.logs por cron, ver pda_heartbeat)
+            pda = record_heartbeat(request.env, device_id, request.env.user.id, request.httprequest.remote_addr)
 
             if not pda:
                 return {"code": 404, "msg": "Dispositivo no encontrado"}
 
-            # Actualizar actividad
-            pda.sudo().write({"last_login": request.env["ir.fields"].Datetime.now(), "user_id": request.env.user.id, "ip_address": request.httprequest.remote_addr})
-
-            is_authorized = pda.is_authorized == "yes" and pda.is_active
+            is_authorized = pda["is_authorized"] == "yes" and pda["is_active"]
 
-            return {"code": 200, "msg": "Heartbeat registrado correctamente", "data": {"device_id": pda.device_id, "is_authorized": is_authorized, "is_active": pda.is_active, "last_login": pda.last_login.isoformat()}}
+            return {"code": 200, "msg": "Heartbeat registrado correctamente", "data": {"device_id": pda["device_id"], "is_authorized": is_authorized, "is_active": pda["is_active"], "last_login": pda["last_login"].isoformat()}}
 
         except Exception as e:
             _logger.error(f"Error en heartbeat PDA: {str(e)}")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# pda_auth.py - Validación de dispositivos PDA con caché por worker
+
+import threading
+import time
+from collections import OrderedDict
+
+from odoo.http import request
+
+# Segundos que se confía en el estado en caché de un dispositivo. Acota el
+# tiempo que tarda en verse una autorización hecha desde otro worker.
+PDA_CACHE_TTL = 30
+PDA_CACHE_MAX_SIZE = 2048
+
+_lock = threading.Lock()
+# (dbname, device_id) -> (is_authorized, is_active, timestamp)
+# Un worker puede atender varias bases de datos con los mismos device_id
+_pda_cache = OrderedDict()
+
+
+def _cache_get(dbname, device_id):
+    key = (dbname, device_id)
+    with _lock:
+        entry = _pda_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] >= PDA_CACHE_TTL:
+            del _pda_cache[key]
+            return None
+        _pda_cache.move_to_end(key)
+        return entry
+
+
+def _cache_set(dbname, device_id, is_authorized, is_active):
+    key = (dbname, device_id)
+    with _lock:
+        _pda_cache[key] = (is_authorized, is_active, time.monotonic())
+        _pda_cache.move_to_end(key)
+        while len(_pda_cache) > PDA_CACHE_MAX_SIZE:
+            _pda_cache.popitem(last=False)
+
+
+def refresh_pda(pda):
+    """Actualiza la caché con el estado actual de un registro pda.logs"""
+    if pda and pda.device_id:
+        _cache_set(pda.env.cr.dbname, pda.device_id, pda.is_authorized, pda.is_active)
+
+
+def invalidate_pda(device_id=None):
+    """
+    Descarta el estado en caché de un dispositivo (o de todos los de la base
+    de datos actual si no se indica)
+
+    Se repite tras el commit para que una petición concurrente no deje en
+    caché el estado previo a la modificación.
+    """
+
+    dbname = request.env.cr.dbname
+
+    def _invalidate():
+        with _lock:
+            if device_id is None:
+                for key in [key for key in _pda_cache if key[0] == dbname]:
+                    del _pda_cache[key]
+            else:
+                _pda_cache.pop((dbname, device_id), None)
+
+    _invalidate()
+    request.env.cr.postcommit.add(_invalidate)
+
+
+def validate_pda(device_id):
+    """
+    Solo valida que la PDA existe y está autorizada
+    Returns: dict con error si hay problema, None si todo está OK
+    """
+    if not device_id:
+        return {"code": 400, "msg": "Device ID no proporcionado, por favor actualizar a la ultima version de la app"}
+
+    dbname = request.env.cr.dbname
+    entry = _cache_get(dbname, device_id)
+    if entry is None:
+        pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)], limit=1)
+
+        # Los dispositivos inexistentes no se guardan: deben verse apenas se registren
+        if not pda:
+            return {"code": 404, "msg": "PDA no encontrado"}
+
+        _cache_set(dbname, device_id, pda.is_authorized, pda.is_active)
+        entry = (pda.is_authorized, pda.is_active)
+
+    if entry[0] == "no":
+        return {"code": 403, "msg": "PDA no autorizado"}
+
+    # Si llegamos aquí, todo está bien
+    return None
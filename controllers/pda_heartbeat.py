@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# pda_heartbeat.py - Heartbeats de PDA registrados sin bloquear pda.logs
+
+import threading
+import time
+from collections import OrderedDict
+
+from odoo import fields
+from odoo.http import request
+
+from .pda_auth import refresh_pda
+
+# Segundos que se responde con el estado en caché de un dispositivo
+HEARTBEAT_STATUS_TTL = 30
+HEARTBEAT_STATUS_MAX_SIZE = 2048
+
+STATUS_FIELDS = ["device_id", "device_name", "device_model", "is_authorized", "is_active", "last_login", "login_count"]
+
+_lock = threading.Lock()
+# (dbname, device_id) -> (estado, write_date, timestamp)
+# Un worker puede atender varias bases de datos con los mismos device_id
+_status_cache = OrderedDict()
+
+
+def _status_get(key):
+    entry = _status_cache.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[2] >= HEARTBEAT_STATUS_TTL:
+        del _status_cache[key]
+        return None
+    _status_cache.move_to_end(key)
+    return entry
+
+
+def _status_set(key, status, write_date):
+    _status_cache[key] = (status, write_date, time.monotonic())
+    _status_cache.move_to_end(key)
+    while len(_status_cache) > HEARTBEAT_STATUS_MAX_SIZE:
+        _status_cache.popitem(last=False)
+
+
+def invalidate_heartbeat_status(device_id=None):
+    """
+    Descarta el estado en caché de un dispositivo (o de todos los de la base
+    de datos actual si no se indica)
+
+    Se repite tras el commit para que una petición concurrente no deje en
+    caché el estado previo a la modificación.
+    """
+
+    dbname = request.env.cr.dbname
+
+    def _invalidate():
+        with _lock:
+            if device_id is None:
+                for key in [key for key in _status_cache if key[0] == dbname]:
+                    del _status_cache[key]
+            else:
+                _status_cache.pop((dbname, device_id), None)
+
+    _invalidate()
+    request.env.cr.postcommit.add(_invalidate)
+
+
+def _read_status(env, device_id):
+    """Lee el estado del dispositivo, lo guarda en caché y actualiza la de validación"""
+    key = (env.cr.dbname, device_id)
+    pda = env["pda.logs"].sudo().search([("device_id", "=", device_id)], limit=1)
+    if not pda:
+        with _lock:
+            _status_cache.pop(key, None)
+        return None
+    status = dict(pda.read(STATUS_FIELDS)[0])
+    refresh_pda(pda)
+    with _lock:
+        _status_set(key, status, pda.write_date)
+    return status, pda.write_date
+
+
+def _insert_activity(env, pda_id, last_login, user_id, ip_address, logins):
+    """
+    Registra la actividad en onpoint.pda.heartbeat y lee el estado vigente
+    del dispositivo en la misma consulta
+
+    Returns:
+        Tupla (write_date, login_count consolidado, conexiones pendientes
+        de consolidar incluida ésta), o None si el dispositivo ya no existe
+    """
+    heartbeat_table = env["onpoint.pda.heartbeat"]._table
+    env.cr.execute(
+        f"""
+        WITH ins AS (
+            INSERT INTO {heartbeat_table} (pda_id, last_login, user_id, ip_address, logins)
+            VALUES (%(pda_id)s, %(last_login)s, %(user_id)s, %(ip_address)s, %(logins)s)
+         RETURNING logins
+        )
+        SELECT p.write_date,
+               COALESCE(p.login_count, 0),
+               (SELECT COALESCE(SUM(h.logins), 0) FROM {heartbeat_table} h WHERE h.pda_id = p.id)
+               + (SELECT logins FROM ins)
+          FROM {env["pda.logs"]._table} p
+         WHERE p.id = %(pda_id)s
+        """,
+        {
+            "pda_id": pda_id,
+            "last_login": last_login,
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "logins": logins,
+        },
+    )
+    return env.cr.fetchone()
+
+
+def record_heartbeat(env, device_id, user_id, ip_address, count_login=False):
+    """
+    Registra la actividad de un dispositivo sin escribir en pda.logs
+
+    Cada heartbeat inserta una fila en onpoint.pda.heartbeat dentro de la
+    transacción de la petición (no bloquea la fila del dispositivo ni se
+    pierde si el worker se reinicia); el cron de consolidación la suma a
+    pda.logs. La misma consulta devuelve el write_date del dispositivo: si
+    cambió desde el backend (autorización, revocación...) el estado en
+    caché se vuelve a leer.
+
+    Returns:
+        Diccionario con el estado del dispositivo (incluida la actividad
+        pendiente de consolidar), o None si el dispositivo no existe
+    """
+    with _lock:
+        entry = _status_get((env.cr.dbname, device_id))
+
+    if entry is None:
+        entry = _read_status(env, device_id)
+        if entry is None:
+            return None
+    status, write_date = entry[0], entry[1]
+
+    now = fields.Datetime.now()
+    row = _insert_activity(env, status["id"], now, user_id, ip_address, int(count_login))
+    if row is None:
+        with _lock:
+            _status_cache.pop((env.cr.dbname, device_id), None)
+        return None
+
+    current_write_date, login_count, pending_logins = row
+    if current_write_date != write_date:
+        entry = _read_status(env, device_id)
+        if entry is None:
+            return None
+        status = entry[0]
+
+    return dict(status, last_login=now, login_count=login_count + pending_logins)
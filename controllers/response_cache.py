@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# response_cache.py - Caché de respuestas por worker (LRU con TTL)
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from odoo.http import request
+
+
+def generate_cache_key(user_id, params=None):
+    """Generar clave de caché única por usuario y parámetros"""
+    cache_data = {"user_id": user_id}
+    if params:
+        cache_data.update(params)
+    cache_string = json.dumps(cache_data, sort_keys=True, default=str)
+    return hashlib.md5(cache_string.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caché de respuestas acotada en tamaño (LRU) y en tiempo (TTL)
+
+    Cada entrada puede etiquetarse (p. ej. ("batch", 12)) para invalidar
+    todas las respuestas que contienen un documento cuando éste cambia.
+    La caché vive en el worker; el TTL acota lo que tardan en verse los
+    cambios hechos desde otros workers. Claves y etiquetas se separan por
+    base de datos (un worker puede atender varias) y get() retorna una
+    copia, así quien la modifique no altera la entrada guardada.
+    """
+
+    def __init__(self, name, max_size=256, ttl=60):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> (data, tags, timestamp)
+        self._entries = OrderedDict()
+        # tag -> set(keys)
+        self._tags = {}
+
+    def get(self, key):
+        """Retorna una copia de la respuesta en caché o None si no existe o expiró"""
+        key = (request.env.cr.dbname, key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[0])
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, data, tags=()):
+        """Almacena una respuesta asociada a las etiquetas indicadas"""
+        dbname = request.env.cr.dbname
+        key = (dbname, key)
+        tags = frozenset((dbname, tag) for tag in tags)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (copy.deepcopy(data), tags, time.monotonic())
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        """
+        Descarta las respuestas que contienen alguna de las etiquetas
+
+        Se repite tras el commit para que una petición concurrente no deje
+        en caché datos anteriores a la modificación.
+        """
+        dbname = request.env.cr.dbname
+        tags = [(dbname, tag) for tag in tags]
+
+        def _invalidate():
+            with self._lock:
+                for tag in tags:
+                    for key in list(self._tags.get(tag, ())):
+                        self._discard(key)
+
+        _invalidate()
+        request.env.cr.postcommit.add(_invalidate)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# response_compression.py - Compresión negociada (gzip / brotli) de respuestas JSON-RPC
+
+import gzip
+import logging
+import threading
+
+from odoo.tools import str2bool
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_logger = logging.getLogger(__name__)
+
+# Paquete del módulo (odoo.addons.<módulo>): sólo se comprimen sus endpoints
+MODULE_PACKAGE = __name__.rsplit(".", 2)[0]
+# Marca en el environ de la petición (ver models/ir_http.py)
+COMPRESS_ENVIRON_KEY = "api_onpoint.compress"
+
+# Parámetros del sistema (ir.config_parameter)
+PARAM_ENABLED = "api_onpoint.compression_enabled"
+PARAM_MIN_SIZE = "api_onpoint.compression_min_size"
+PARAM_GZIP_LEVEL = "api_onpoint.compression_gzip_level"
+PARAM_BROTLI_QUALITY = "api_onpoint.compression_brotli_quality"
+
+DEFAULT_MIN_SIZE = 1024  # bytes; por debajo no compensa comprimir
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5
+
+
+class CompressionStats:
+    """Contadores por worker de bytes originales y enviados por codificación"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def add(self, encoding, raw_bytes, sent_bytes):
+        with self._lock:
+            counter = self._counters.setdefault(encoding, {"responses": 0, "raw_bytes": 0, "sent_bytes": 0})
+            counter["responses"] += 1
+            counter["raw_bytes"] += raw_bytes
+            counter["sent_bytes"] += sent_bytes
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for encoding, counter in self._counters.items():
+                ratio = counter["sent_bytes"] / counter["raw_bytes"] if counter["raw_bytes"] else 1
+                result[encoding] = dict(counter, ratio=round(ratio, 4))
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+compression_stats = CompressionStats()
+
+
+def _int_param(params, key, default, minimum, maximum):
+    try:
+        value = int(params.get_param(key, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(minimum, min(maximum, value))
+
+
+def _compress(data, encoding, params):
+    if encoding == "br":
+        quality = _int_param(params, PARAM_BROTLI_QUALITY, DEFAULT_BROTLI_QUALITY, 0, 11)
+        return brotli.compress(data, quality=quality)
+    level = _int_param(params, PARAM_GZIP_LEVEL, DEFAULT_GZIP_LEVEL, 1, 9)
+    # mtime=0 para que la misma respuesta produzca siempre los mismos bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def is_compressible_endpoint(endpoint):
+    """Endpoint JSON-RPC definido en un controlador de este módulo"""
+    routing = getattr(endpoint, "routing", None) or {}
+    original = getattr(endpoint, "original_endpoint", endpoint)
+    module = getattr(original, "__module__", None) or ""
+    return routing.get("type") == "json" and module.startswith(MODULE_PACKAGE + ".")
+
+
+def compress_response(httprequest, response, env):
+    """
+    Comprime la respuesta si el cliente lo acepta y supera el tamaño mínimo
+
+    Se activa con el parámetro del sistema api_onpoint.compression_enabled.
+    Se prefiere brotli cuando está instalado y el cliente lo acepta; si no,
+    gzip.
+    """
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+
+    params = env["ir.config_parameter"].sudo()
+    if not str2bool(params.get_param(PARAM_ENABLED, "False"), False):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    available = ["br", "gzip"] if brotli else ["gzip"]
+    encoding = httprequest.accept_encodings.best_match(available)
+    data = response.get_data()
+    raw_size = len(data)
+
+    if not encoding or raw_size < _int_param(params, PARAM_MIN_SIZE, DEFAULT_MIN_SIZE, 0, 2**31):
+        compression_stats.add("identity", raw_size, raw_size)
+        return response
+
+    compressed = _compress(data, encoding, params)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    compression_stats.add(encoding, raw_size, len(compressed))
+    _logger.debug("%s: %s %d -> %d bytes", httprequest.path, encoding, raw_size, len(compressed))
+    return response
+
+
+def compress_endpoint_response(request, response):
+    """
+    Post-proceso de la respuesta: comprime sólo si el endpoint se marcó en
+    _pre_dispatch; un error al comprimir deja la respuesta original
+    """
+    if not request.httprequest.environ.get(COMPRESS_ENVIRON_KEY):
+        return response
+    try:
+        return compress_response(request.httprequest, response, request.env)
+    except Exception:
+        _logger.exception("No se pudo comprimir la respuesta de %s", request.httprequest.path)
+        return response
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# settings_snapshot.py - Configuración de la app en caché (por worker)
+
+import threading
+
+from odoo.http import request
+
+# (clave, modelo, campos, registro): los modelos de configuración son de
+# registro único; algunos controladores leen siempre el id 1 y otros el
+# primero que exista
+SETTINGS_SOURCES = [
+    ("general", "appwms.config.general", ["muelle_option"], "first"),
+    ("temperature", "appwms.temperature", ["show_photo_temperature"], "first"),
+    ("returns", "config.returns.general", ["location_option"], "first"),
+    ("picking_config", "picking.config.general", ["picking_type"], 1),
+    ("packing_config", "packing.config.general", ["packing_type"], 1),
+    ("picking_strategy", "picking.strategy", ["picking_priority_app", "picking_order_app"], 1),
+]
+
+_lock = threading.Lock()
+# dbname -> (stamp, snapshot)
+_snapshots = {}
+
+
+class SettingsRecord:
+    """
+    Valores de un registro de configuración, desacoplados del cursor
+
+    Se usa igual que el registro: atributos por campo y falso si el registro
+    no existe (los campos valen False).
+    """
+
+    def __init__(self, values, exists):
+        self.__dict__.update(values)
+        self._exists = exists
+
+    def __bool__(self):
+        return self._exists
+
+
+class SettingsSnapshot:
+    """Configuración vigente de la app leída una sola vez"""
+
+    def __init__(self, env):
+        for key, model_name, field_names, which in SETTINGS_SOURCES:
+            record = None
+            if model_name in env:
+                model = env[model_name].sudo()
+                record = model.browse(which).exists() if which != "first" else model.search([], limit=1)
+            values = {
+                field_name: (record[field_name] if record and field_name in record._fields else False)
+                for field_name in field_names
+            }
+            setattr(self, key, SettingsRecord(values, bool(record)))
+
+        # Equivale a res.config.settings.group_stock_tracking_owner (grupo implícito de los usuarios internos)
+        owner_group = env.ref("stock.group_tracking_owner", raise_if_not_found=False)
+        user_group = env.ref("base.group_user", raise_if_not_found=False)
+        self.tracking_owner = bool(owner_group and user_group and owner_group in user_group.sudo().implied_ids)
+
+
+def _stamp(env):
+    """
+    Huella de la configuración: write_date máximo y conteo de cada modelo,
+    más el write_date del grupo de usuarios internos, en una sola consulta
+    """
+    parts = [
+        f"SELECT '{model_name}', MAX(write_date), COUNT(*) FROM {env[model_name]._table}"
+        for _key, model_name, _fields, _which in SETTINGS_SOURCES
+        if model_name in env
+    ]
+    parts.append(
+        "SELECT 'res.groups', MAX(g.write_date), COUNT(r.hid) FROM res_groups g "
+        "LEFT JOIN res_groups_implied_rel r ON r.gid = g.id "
+        "WHERE g.id = (SELECT res_id FROM ir_model_data WHERE module = 'base' AND name = 'group_user')"
+    )
+    env.cr.execute(" UNION ALL ".join(parts))
+    return tuple(env.cr.fetchall())
+
+
+def get_settings(env=None):
+    """
+    Configuración de la app (SettingsSnapshot) desde la caché del worker
+
+    Cada llamada hace una consulta liviana para detectar cambios: cualquier
+    escritura en los modelos de configuración (o en los grupos implícitos de
+    los usuarios internos) cambia la huella y la configuración se vuelve a
+    leer. Reemplaza las búsquedas sueltas y la creación de un
+    res.config.settings transitorio en cada petición.
+    """
+    env = env or request.env
+    stamp = _stamp(env)
+    dbname = env.cr.dbname
+
+    with _lock:
+        cached = _snapshots.get(dbname)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    snapshot = SettingsSnapshot(env)
+    with _lock:
+        _snapshots[dbname] = (stamp, snapshot)
+    return snapshot
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# stock_availability.py - Validación de stock disponible por lotes de líneas
+
+from collections import defaultdict
+
+from odoo.http import request
+
+# Estados de picking cuyas líneas se consideran reservas
+RESERVATION_STATES = ["assigned", "confirmed", "waiting", "partially_available"]
+
+
+def check_stock_availability(lines, allowed_picking_ids=None):
+    """
+    Valida el stock disponible de varias líneas con dos consultas agrupadas
+
+    Cada línea se compara contra el stock físico de su (producto, ubicación,
+    lote) menos las reservas de terceros. Las reservas de los pickings
+    permitidos se consideran propias. La demanda es acumulada: varias líneas
+    sobre el mismo stock consumen del mismo disponible, y una línea con lote
+    también consume del disponible total del producto en esa ubicación.
+
+    Args:
+        lines: Lista de diccionarios con "key", "product_id", "location_id",
+            "lot_id" (opcional) y "quantity"
+        allowed_picking_ids: IDs de pickings cuyas reservas son propias
+
+    Returns:
+        Diccionario key -> veredicto con stock_disponible, stock_total,
+        stock_reservado_otros, stock_reservado_esta, cantidad_acumulada y
+        es_suficiente
+    """
+    if not lines:
+        return {}
+
+    allowed_picking_ids = set(allowed_picking_ids or [])
+    product_ids = list({line["product_id"] for line in lines})
+    location_ids = list({line["location_id"] for line in lines})
+
+    # Acumuladores por (producto, ubicación, lote); lote None = todos los lotes
+    stock_total = defaultdict(float)
+    reserved_mine = defaultdict(float)
+    reserved_others = defaultdict(float)
+
+    # 1. Stock físico
+    quant_groups = (
+        request.env["stock.quant"]
+        .sudo()
+        ._read_group(
+            [("product_id", "in", product_ids), ("location_id", "in", location_ids)],
+            groupby=["product_id", "location_id", "lot_id"],
+            aggregates=["quantity:sum"],
+        )
+    )
+    for product, location, lot, quantity in quant_groups:
+        stock_total[(product.id, location.id, None)] += quantity
+        if lot:
+            stock_total[(product.id, location.id, lot.id)] += quantity
+
+    # 2. Reservas, separando las de los pickings permitidos
+    move_line_groups = (
+        request.env["stock.move.line"]
+        .sudo()
+        ._read_group(
+            [
+                ("product_id", "in", product_ids),
+                ("location_id", "in", location_ids),
+                ("picking_id.state", "in", RESERVATION_STATES),
+            ],
+            groupby=["product_id", "location_id", "lot_id", "picking_id"],
+            aggregates=["quantity:sum"],
+        )
+    )
+    for product, location, lot, picking, quantity in move_line_groups:
+        reserved = reserved_mine if picking.id in allowed_picking_ids else reserved_others
+        reserved[(product.id, location.id, None)] += quantity
+        if lot:
+            reserved[(product.id, location.id, lot.id)] += quantity
+
+    # 3. Veredicto por línea con demanda acumulada
+    demand = defaultdict(float)
+    verdicts = {}
+    for line in lines:
+        product_id, location_id = line["product_id"], line["location_id"]
+        lot_id = line.get("lot_id") or None
+        quantity = float(line.get("quantity") or 0)
+
+        demand[(product_id, location_id, None)] += quantity
+        if lot_id:
+            demand[(product_id, location_id, lot_id)] += quantity
+
+        key = (product_id, location_id, lot_id)
+        # No se resta la reserva propia: es justamente la que se consume ahora
+        stock_disponible = stock_total[key] - reserved_others[key]
+        verdicts[line["key"]] = {
+            "stock_disponible": stock_disponible,
+            "stock_total": stock_total[key],
+            "stock_reservado_otros": reserved_others[key],
+            "stock_reservado_esta": reserved_mine[key],
+            "cantidad_acumulada": demand[key],
+            "es_suficiente": stock_disponible >= demand[key],
+        }
+
+    return verdicts
@@ -6,40 +6,19 @@ from datetime import datetime, timedelta
 import pytz
 import base64
 
+from . import app_version
+from .db_retry import CONCURRENCY_ERRORS, retry_on_concurrency
+from .idempotency import idempotent, not_stored
+from .offline_journal import register_journal_operation
+from .pda_auth import validate_pda
+from .settings_snapshot import get_settings
+from .utils import FieldSelector, ProductCatalog, product_fragment
 
-class TransaccionDataPacking(http.Controller):
-
-    def get_last_version(self):
-        try:
-            # Obtener la última versión
-            last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
-
-            if not last_version:
-                return {"code": 404, "msg": "No se encontró ninguna versión"}
+# Listas anidadas de los serializadores con selección de campos (fields=)
+BATCH_PACKING_CONTAINERS = {"lista_pedidos": {"lista_productos": {}, "lista_paquetes": {"lista_productos_in_packing": {}}}}
 
-            # Convertir el texto JSON a una lista Python
-            notes_list = []
-            if last_version.notes:
-                try:
-                    notes_list = json.loads(last_version.notes)
-                except:
-                    notes_list = ["Error al procesar las notas"]
 
-            return {
-                "code": 200,
-                "result": {
-                    "id": last_version.id,
-                    "version": last_version.version,
-                    "release_date": str(last_version.release_date),
-                    "notes": notes_list,  # Ahora devuelve la lista en lugar del string JSON
-                    "url_download": last_version.url_download,
-                },
-            }
-
-        except AccessError as e:
-            return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
-        except Exception as err:
-            return {"code": 400, "msg": "Error inesperado: {}".format(str(err))}
+class TransaccionDataPacking(http.Controller):
 
     ## GET Transacciones batchs para packing
     @http.route("/api/batch_packing", auth="user", type="json", methods=["GET"])
@@ -47,24 +26,7 @@ class TransaccionDataPacking(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
             if not user:
@@ -85,7 +47,8 @@ class TransaccionDataPacking(http.Controller):
             #     return {"code": 400, "msg": "El usuario no tiene acceso a ningún almacén"}
 
             # obtener la configuracion picking de la app
-            config_picking = request.env["packing.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.packing_config
 
             # Obtener almacenes del usuario
             allowed_warehouses = obtener_almacenes_usuario(user)
@@ -95,7 +58,7 @@ class TransaccionDataPacking(http.Controller):
                 return allowed_warehouses  # Devolver el error directamente
 
             # ✅ Obtener la estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # ✅ Iterar sobre los almacenes permitidos y procesar cada uno
             for warehouse in allowed_warehouses:
@@ -230,7 +193,7 @@ class TransaccionDataPacking(http.Controller):
 
                                 # ✅ Verificar dinámicamente la existencia de `barcode_ids`
                                 array_all_barcode = []
-                                if "barcode_ids" in product.fields_get():
+                                if "barcode_ids" in product._fields:
                                     array_all_barcode = [
                                         {
                                             "barcode": barcode.name,
@@ -240,7 +203,7 @@ class TransaccionDataPacking(http.Controller):
                                             "cantidad": 1,
                                             "product_id": product.id,
                                         }
-                                        for barcode in product.barcode_ids
+                                        for barcode in product_fragment(product)["barcodes"]
                                         if barcode.name  # Filtra solo los barcodes válidos
                                     ]
 
@@ -254,10 +217,10 @@ class TransaccionDataPacking(http.Controller):
                                             "id_move": move_line.id,
                                             "id_product": product.id,
                                         }
-                                        for pack in product.packaging_ids
+                                        for pack in product_fragment(product)["packagings"]
                                         if pack.barcode  # Incluye solo si barcode es válido
                                     ]
-                                    if product.packaging_ids
+                                    if product_fragment(product)["packagings"]
                                     else []
                                 )
 
@@ -391,6 +354,13 @@ class TransaccionDataPacking(http.Controller):
             if validation_error:
                 return validation_error
 
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            pedidos_filter = fields_filter.child("lista_pedidos")
+            productos_filter = pedidos_filter.child("lista_productos", exclude=catalog.line_keys)
+            paquetes_filter = pedidos_filter.child("lista_paquetes")
+            packing_filter = paquetes_filter.child("lista_productos_in_packing", exclude=catalog.line_keys)
+
             array_batch = []
 
             base_url = request.httprequest.host_url.rstrip("/")
@@ -408,7 +378,7 @@ class TransaccionDataPacking(http.Controller):
                 return allowed_warehouses  # Devolver el error directamente
 
             # ✅ Obtener la estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = get_settings().picking_strategy
 
             # ✅ Iterar sobre los almacenes permitidos y procesar cada uno
             for warehouse in allowed_warehouses:
@@ -457,51 +427,57 @@ class TransaccionDataPacking(http.Controller):
                         if productos_con_temperatura:
                             manejo_temperatura = True
 
-                        array_batch_temp = {
-                            "id": batch.id,
-                            "name": batch.name,
-                            "scheduleddate": batch.scheduled_date,
-                            "state": batch.state,
-                            "user_id": user_info["user_id"] if batch.user_id else 0,
-                            "user_name": user_info["user_name"] if batch.user_id else "",
-                            "order_by": picking_strategy.picking_priority_app if picking_strategy else "",
-                            "order_picking": picking_strategy.picking_order_app if picking_strategy else "",
-                            "picking_type_id": batch.picking_type_id.display_name if batch.picking_type_id else "N/A",
-                            "cantidad_pedidos": 0,
-                            "start_time_pack": batch.start_time_pack or "",
-                            "end_time_pack": batch.end_time_pack or "",
-                            "zona_entrega": batch.picking_ids[0].delivery_zone_id.name if batch.picking_ids and batch.picking_ids[0].delivery_zone_id else "N/A",
-                            # "zona_entrega_tms": batch.picking_ids[0].delivery_zone_tms if batch.picking_ids and batch.picking_ids[0].delivery_zone_tms else "N/A",
-                            "zona_entrega_tms": "",
-                            # "order_tms": batch.picking_ids[0].order_tms if batch.picking_ids and batch.picking_ids[0].order_tms else "N/A",
-                            "maneja_temperatura": manejo_temperatura,
-                            "temperatura": batch.temperature_batch if hasattr(batch, "temperature_batch") else "",
-                            "order_tms": "",
-                            "lista_pedidos": [],
-                        }
+                        array_batch_temp = fields_filter.build(
+                            {
+                                "id": batch.id,
+                                "name": batch.name,
+                                "scheduleddate": batch.scheduled_date,
+                                "state": batch.state,
+                                "user_id": lambda: user_info["user_id"] if batch.user_id else 0,
+                                "user_name": lambda: user_info["user_name"] if batch.user_id else "",
+                                "order_by": lambda: picking_strategy.picking_priority_app if picking_strategy else "",
+                                "order_picking": lambda: picking_strategy.picking_order_app if picking_strategy else "",
+                                "picking_type_id": lambda: batch.picking_type_id.display_name if batch.picking_type_id else "N/A",
+                                "cantidad_pedidos": 0,
+                                "start_time_pack": lambda: batch.start_time_pack or "",
+                                "end_time_pack": lambda: batch.end_time_pack or "",
+                                "zona_entrega": lambda: batch.picking_ids[0].delivery_zone_id.name if batch.picking_ids and batch.picking_ids[0].delivery_zone_id else "N/A",
+                                # "zona_entrega_tms": batch.picking_ids[0].delivery_zone_tms if batch.picking_ids and batch.picking_ids[0].delivery_zone_tms else "N/A",
+                                "zona_entrega_tms": "",
+                                # "order_tms": batch.picking_ids[0].order_tms if batch.picking_ids and batch.picking_ids[0].order_tms else "N/A",
+                                "maneja_temperatura": manejo_temperatura,
+                                "temperatura": lambda: batch.temperature_batch if hasattr(batch, "temperature_batch") else "",
+                                "order_tms": "",
+                                "lista_pedidos": [],
+                            },
+                            BATCH_PACKING_CONTAINERS,
+                        )
 
                         valid_pickings_found = False
 
                         for picking in batch.picking_ids:
-                            pedido = {
-                                "id": picking.id,
-                                "batch_id": batch.id,
-                                "name": picking.name,
-                                "referencia": picking.origin if picking.origin else "",
-                                "contacto": picking.partner_id.id if picking.partner_id else 0,
-                                "contacto_name": picking.partner_id.name if picking.partner_id else "N/A",
-                                "tipo_operacion": picking.picking_type_id.name if picking.picking_type_id else "N/A",
-                                "cantidad_productos": len(picking.move_line_ids.filtered(lambda ml: not ml.is_done_item_pack)),
-                                "cantidad_productos_total": len(picking.move_line_ids),
-                                "zona_entrega": picking.delivery_zone_id.name if picking.delivery_zone_id else "",
-                                # "zona_entrega_tms": picking.delivery_zone_tms if picking.delivery_zone_tms else "",
-                                # "order_tms": picking.order_tms if picking.order_tms else "",
-                                "zona_entrega_tms": "",
-                                "order_tms": "",
-                                "numero_paquetes": len(picking.move_line_ids.mapped("package_id")),
-                                "lista_productos": [],
-                                "lista_paquetes": [],
-                            }
+                            pedido = pedidos_filter.build(
+                                {
+                                    "id": picking.id,
+                                    "batch_id": batch.id,
+                                    "name": picking.name,
+                                    "referencia": lambda: picking.origin if picking.origin else "",
+                                    "contacto": lambda: picking.partner_id.id if picking.partner_id else 0,
+                                    "contacto_name": lambda: picking.partner_id.name if picking.partner_id else "N/A",
+                                    "tipo_operacion": lambda: picking.picking_type_id.name if picking.picking_type_id else "N/A",
+                                    "cantidad_productos": lambda: len(picking.move_line_ids.filtered(lambda ml: not ml.is_done_item_pack)),
+                                    "cantidad_productos_total": lambda: len(picking.move_line_ids),
+                                    "zona_entrega": lambda: picking.delivery_zone_id.name if picking.delivery_zone_id else "",
+                                    # "zona_entrega_tms": picking.delivery_zone_tms if picking.delivery_zone_tms else "",
+                                    # "order_tms": picking.order_tms if picking.order_tms else "",
+                                    "zona_entrega_tms": "",
+                                    "order_tms": "",
+                                    "numero_paquetes": lambda: len(picking.move_line_ids.mapped("package_id")),
+                                    "lista_productos": [],
+                                    "lista_paquetes": [],
+                                },
+                                BATCH_PACKING_CONTAINERS["lista_pedidos"],
+                            )
 
                             # ✅ Procesar líneas de movimiento
                             for move_line in picking.move_line_ids:
@@ -513,7 +489,7 @@ class TransaccionDataPacking(http.Controller):
 
                                 # ✅ Verificar dinámicamente la existencia de `barcode_ids`
                                 array_all_barcode = []
-                                if "barcode_ids" in product.fields_get():
+                                if productos_filter.wants("other_barcode") and "barcode_ids" in product._fields:
                                     array_all_barcode = [
                                         {
                                             "barcode": barcode.name,
@@ -523,7 +499,7 @@ class TransaccionDataPacking(http.Controller):
                                             "cantidad": 1,
                                             "product_id": product.id,
                                         }
-                                        for barcode in product.barcode_ids
+                                        for barcode in product_fragment(product)["barcodes"]
                                         if barcode.name  # Filtra solo los barcodes válidos
                                     ]
 
@@ -537,41 +513,44 @@ class TransaccionDataPacking(http.Controller):
                                             "id_move": move_line.id,
                                             "id_product": product.id,
                                         }
-                                        for pack in product.packaging_ids
+                                        for pack in product_fragment(product)["packagings"]
                                         if pack.barcode  # Incluye solo si barcode es válido
                                     ]
-                                    if product.packaging_ids
+                                    if productos_filter.wants("product_packing") and product_fragment(product)["packagings"]
                                     else []
                                 )
 
                                 if move_line.is_done_item_pack == False:
-                                    productos = {
-                                        "id_move": move_line.id,
-                                        "product_id": [product.id, product.display_name],
-                                        "batch_id": batch.id,
-                                        "pedido_id": picking.id,
-                                        "id_product": product.id if product else 0,
-                                        "picking_id": picking.id,
-                                        "lote_id": lot.id if lot else "",
-                                        "lot_id": [lot.id, lot.name if lot else ""] if lot else [],
-                                        "expire_date": lot.expiration_date or "",
-                                        "location_id": [location.id, location.display_name if location else ""],
-                                        "barcode_location": location.barcode if location else "",
-                                        "location_dest_id": [location_dest.id, location_dest.name if location_dest else ""],
-                                        "barcode_location_dest": location_dest.barcode if location_dest else "",
-                                        "other_barcode": array_all_barcode,
-                                        "quantity": move_line.quantity,
-                                        "tracking": product.tracking if product else "",
-                                        "barcode": product.barcode if product else "",
-                                        "product_packing": array_packing,
-                                        "weight": product.weight if product else 0,
-                                        "unidades": product.uom_id.name if product.uom_id else "UND",
-                                        # "rimoval_priority": location.priority_picking,
-                                        "rimoval_priority": location.priority_picking_desplay if location else 0,
-                                        "maneja_temperatura": product.temperature_control if hasattr(product, "temperature_control") else False,
-                                        "temperatura": move_line.temperature if hasattr(move_line, "temperature") else 0,
-                                        # "imagen": move_line.imagen if (hasattr(move_line, "imagen") and move_line.imagen) else "",
-                                    }
+                                    catalog.add(product)
+                                    productos = productos_filter.build(
+                                        {
+                                            "id_move": move_line.id,
+                                            "product_id": lambda: [product.id, product.display_name],
+                                            "batch_id": batch.id,
+                                            "pedido_id": picking.id,
+                                            "id_product": lambda: product.id if product else 0,
+                                            "picking_id": picking.id,
+                                            "lote_id": lambda: lot.id if lot else "",
+                                            "lot_id": lambda: [lot.id, lot.name if lot else ""] if lot else [],
+                                            "expire_date": lambda: lot.expiration_date or "",
+                                            "location_id": lambda: [location.id, location.display_name if location else ""],
+                                            "barcode_location": lambda: location.barcode if location else "",
+                                            "location_dest_id": lambda: [location_dest.id, location_dest.name if location_dest else ""],
+                                            "barcode_location_dest": lambda: location_dest.barcode if location_dest else "",
+                                            "other_barcode": array_all_barcode,
+                                            "quantity": move_line.quantity,
+                                            "tracking": lambda: product.tracking if product else "",
+                                            "barcode": lambda: product.barcode if product else "",
+                                            "product_packing": array_packing,
+                                            "weight": lambda: product.weight if product else 0,
+                                            "unidades": lambda: product.uom_id.name if product.uom_id else "UND",
+                                            # "rimoval_priority": location.priority_picking,
+                                            "rimoval_priority": lambda: location.priority_picking_desplay if location else 0,
+                                            "maneja_temperatura": lambda: product.temperature_control if hasattr(product, "temperature_control") else False,
+                                            "temperatura": lambda: move_line.temperature if hasattr(move_line, "temperature") else 0,
+                                            # "imagen": move_line.imagen if (hasattr(move_line, "imagen") and move_line.imagen) else "",
+                                        }
+                                    )
 
                                     pedido["lista_productos"].append(productos)
 
@@ -597,52 +576,58 @@ class TransaccionDataPacking(http.Controller):
                                 if line_with_observation:
                                     image_novedad_url = f"{base_url}/api/view_imagen_observation/{line_with_observation.id}"
 
-                                package = {
-                                    "name": pack.name,
-                                    "id": pack.id,
-                                    "batch_id": batch.id,
-                                    "pedido_id": picking.id,
-                                    "cantidad_productos": cantidad_productos,
-                                    "lista_productos_in_packing": [],
-                                    "is_sticker": pack.is_sticker,
-                                    "is_certificate": pack.is_certificate,
-                                    "fecha_creacion": pack.create_date.strftime("%Y-%m-%d") if pack.create_date else "",
-                                    "fecha_actualizacion": pack.write_date.strftime("%Y-%m-%d") if pack.write_date else "",
-                                    "consecutivo": getattr(move_lines_in_package[0], "faber_box_number", "") if move_lines_in_package else "",
-                                }
+                                package = paquetes_filter.build(
+                                    {
+                                        "name": pack.name,
+                                        "id": pack.id,
+                                        "batch_id": batch.id,
+                                        "pedido_id": picking.id,
+                                        "cantidad_productos": cantidad_productos,
+                                        "lista_productos_in_packing": [],
+                                        "is_sticker": pack.is_sticker,
+                                        "is_certificate": pack.is_certificate,
+                                        "fecha_creacion": lambda: pack.create_date.strftime("%Y-%m-%d") if pack.create_date else "",
+                                        "fecha_actualizacion": lambda: pack.write_date.strftime("%Y-%m-%d") if pack.write_date else "",
+                                        "consecutivo": lambda: getattr(move_lines_in_package[0], "faber_box_number", "") if move_lines_in_package else "",
+                                    },
+                                    BATCH_PACKING_CONTAINERS["lista_pedidos"]["lista_paquetes"],
+                                )
                                 pedido["lista_paquetes"].append(package)
 
                                 for move_line in move_lines_in_package:
                                     product = move_line.product_id
                                     lot = move_line.lot_id
 
-                                    product_in_packing = {
-                                        "id_move": move_line.id,
-                                        "pedido_id": picking.id,
-                                        "batch_id": batch.id,
-                                        "package_name": pack.name,
-                                        "quantity_separate": move_line.quantity,
-                                        "id_product": product.id if product else 0,
-                                        "product_id": [product.id, product.display_name],
-                                        "name_packing": pack.name,
-                                        "cantidad_enviada": move_line.quantity,
-                                        "unidades": product.uom_id.name if product.uom_id else "UND",
-                                        "peso": product.weight if product else 0,
-                                        "lote_id": [lot.id, lot.name if lot else ""] if lot else [],
-                                        "observation": move_line.new_observation_packing,
-                                        "weight": product.weight if product else 0,
-                                        "is_sticker": pack.is_sticker,
-                                        "is_certificate": pack.is_certificate,
-                                        "id_package": pack.id,
-                                        "quantity": move_line.quantity,
-                                        "tracking": product.tracking if product else "",
-                                        "maneja_temperatura": product.temperature_control if hasattr(product, "temperature_control") else False,
-                                        "temperatura": move_line.temperature if hasattr(move_line, "temperature") else 0,
-                                        "image": f"{base_url}/api/view_imagen_linea_recepcion/{move_line.id}" if getattr(move_line, "imagen", False) else "",
-                                        "image_novedad": f"{base_url}/api/view_imagen_observation/{move_line.id}" if getattr(move_line, "imagen_observation", False) else "",
-                                        "time_separate": move_line.time_packing if move_line.time_packing else 0,
-                                        "package_consecutivo": move_line.faber_box_number if hasattr(move_line, "faber_box_number") else "",
-                                    }
+                                    catalog.add(product)
+                                    product_in_packing = packing_filter.build(
+                                        {
+                                            "id_move": move_line.id,
+                                            "pedido_id": picking.id,
+                                            "batch_id": batch.id,
+                                            "package_name": pack.name,
+                                            "quantity_separate": move_line.quantity,
+                                            "id_product": lambda: product.id if product else 0,
+                                            "product_id": lambda: [product.id, product.display_name],
+                                            "name_packing": pack.name,
+                                            "cantidad_enviada": move_line.quantity,
+                                            "unidades": lambda: product.uom_id.name if product.uom_id else "UND",
+                                            "peso": lambda: product.weight if product else 0,
+                                            "lote_id": lambda: [lot.id, lot.name if lot else ""] if lot else [],
+                                            "observation": move_line.new_observation_packing,
+                                            "weight": lambda: product.weight if product else 0,
+                                            "is_sticker": pack.is_sticker,
+                                            "is_certificate": pack.is_certificate,
+                                            "id_package": pack.id,
+                                            "quantity": move_line.quantity,
+                                            "tracking": lambda: product.tracking if product else "",
+                                            "maneja_temperatura": lambda: product.temperature_control if hasattr(product, "temperature_control") else False,
+                                            "temperatura": lambda: move_line.temperature if hasattr(move_line, "temperature") else 0,
+                                            "image": lambda: f"{base_url}/api/view_imagen_linea_recepcion/{move_line.id}" if getattr(move_line, "imagen", False) else "",
+                                            "image_novedad": lambda: f"{base_url}/api/view_imagen_observation/{move_line.id}" if getattr(move_line, "imagen_observation", False) else "",
+                                            "time_separate": lambda: move_line.time_packing if move_line.time_packing else 0,
+                                            "package_consecutivo": lambda: move_line.faber_box_number if hasattr(move_line, "faber_box_number") else "",
+                                        }
+                                    )
 
                                     package["lista_productos_in_packing"].append(product_in_packing)
                             if pedido["lista_productos"]:
@@ -654,7 +639,7 @@ class TransaccionDataPacking(http.Controller):
                             array_batch_temp["cantidad_pedidos"] = len(array_batch_temp["lista_pedidos"])
                             array_batch.append(array_batch_temp)
 
-            return {"code": 200, "result": array_batch}
+            return {"code": 200, "result": fields_filter.prune(array_batch, BATCH_PACKING_CONTAINERS), **catalog.meta()}
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
@@ -697,86 +682,132 @@ class TransaccionDataPacking(http.Controller):
             return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
     @http.route("/api/send_packing", auth="user", type="json", methods=["POST"])
+    @retry_on_concurrency
+    @idempotent
     def send_packing(self, **auth):
         try:
-            # ✅ Validar autenticación
-            user = request.env.user
-            if not user:
-                return {"code": 401, "msg": "Usuario no autenticado"}
+            # ✅ Usar savepoint para revertir el paquete y las líneas si falla alguna escritura
+            with request.env.cr.savepoint():
+                # ✅ Validar autenticación
+                user = request.env.user
+                if not user:
+                    return {"code": 401, "msg": "Usuario no autenticado"}
+
+                id_batch = auth.get("id_batch")
+                list_item = auth.get("list_item", [])
+                is_sticker = auth.get("is_sticker", False)
+                is_certificate = auth.get("is_certificate", False)
+                peso_total_paquete = auth.get("peso_total_paquete", 0)
+
+                array_msg = []
+                nuevas_lineas_creadas = []
+
+                # ✅ Validar si el id_batch existe
+                batch = request.env["stock.picking.batch"].sudo().browse(id_batch)
+                if not batch.exists():
+                    return {"code": 400, "msg": f"El id_batch {id_batch} no existe"}
+
+                # ✅ Crear el paquete manualmente
+                pack = (
+                    request.env["stock.quant.package"]
+                    .sudo()
+                    .create(
+                        {
+                            "is_sticker": is_sticker,
+                            "is_certificate": is_certificate,
+                        }
+                    )
+                )
 
-            id_batch = auth.get("id_batch")
-            list_item = auth.get("list_item", [])
-            is_sticker = auth.get("is_sticker", False)
-            is_certificate = auth.get("is_certificate", False)
-            peso_total_paquete = auth.get("peso_total_paquete", 0)
+                pickings_procesados = set()
 
-            array_msg = []
-            nuevas_lineas_creadas = []
+                for move in list_item:
+                    product_id = move.get("product_id")
+                    location_id = move.get("location_id")
+                    lote = move.get("lote", None)
+                    cantidad_separada = move.get("cantidad_separada", 0)
+                    id_move = move.get("id_move")
+                    observacion = move.get("observacion", "")
+                    id_operario = move.get("id_operario", 0)
+                    fecha_transaccion = move.get("fecha_transaccion", "")
+                    time = move.get("time_line", 0)
 
-            # ✅ Validar si el id_batch existe
-            batch = request.env["stock.picking.batch"].sudo().browse(id_batch)
-            if not batch.exists():
-                return {"code": 400, "msg": f"El id_batch {id_batch} no existe"}
+                    # poner la observacion en minuscula
 
-            # ✅ Crear el paquete manualmente
-            pack = (
-                request.env["stock.quant.package"]
-                .sudo()
-                .create(
-                    {
-                        "is_sticker": is_sticker,
-                        "is_certificate": is_certificate,
-                    }
-                )
-            )
+                    move_line = request.env["stock.move.line"].sudo().browse(id_move)
 
-            pickings_procesados = set()
+                    if move_line.exists():
+                        if move_line.quantity >= cantidad_separada:
+                            pickings_procesados.add(move_line.picking_id)
 
-            for move in list_item:
-                product_id = move.get("product_id")
-                location_id = move.get("location_id")
-                lote = move.get("lote", None)
-                cantidad_separada = move.get("cantidad_separada", 0)
-                id_move = move.get("id_move")
-                observacion = move.get("observacion", "")
-                id_operario = move.get("id_operario", 0)
-                fecha_transaccion = move.get("fecha_transaccion", "")
-                time = move.get("time_line", 0)
+                            if observacion.lower() != "sin novedad":
+                                move_line.write(
+                                    {
+                                        "result_package_id": pack.id,
+                                        "quantity": cantidad_separada,
+                                        "new_observation_packing": observacion,
+                                        "user_operator_id": id_operario,
+                                        "date_transaction_packing": procesar_fecha_naive(fecha_transaccion, "America/Bogota") if fecha_transaccion else datetime.now(pytz.utc),
+                                        "is_done_item_pack": True,
+                                        "time_packing": time,
+                                    }
+                                )
+                            if cantidad_separada < move_line.quantity:
+                                cantidad_original = move_line.quantity
 
-                # poner la observacion en minuscula
+                                # ✅ 1. Restar a la original
+                                move_line.write({"quantity": cantidad_original - cantidad_separada})
 
-                move_line = request.env["stock.move.line"].sudo().browse(id_move)
+                                # ✅ 2. Copiar la línea original
+                                new_line_vals = move_line.copy_data()[0]
 
-                if move_line.exists():
-                    if move_line.quantity >= cantidad_separada:
-                        pickings_procesados.add(move_line.picking_id)
+                                # ✅ 3. Actualizar los datos ANTES de crearla
+                                new_line_vals.update(
+                                    {
+                                        "quantity": cantidad_separada,
+                                        "result_package_id": pack.id,
+                                        "new_observation_packing": observacion,
+                                        "user_operator_id": id_operario,
+                                        "date_transaction_packing": procesar_fecha_naive(fecha_transaccion, "America/Bogota") if fecha_transaccion else datetime.now(pytz.utc),
+                                        "is_done_item_pack": True,
+                                        "time_packing": time,
+                                    }
+                                )
 
-                        if observacion.lower() != "sin novedad":
-                            move_line.write(
-                                {
-                                    "result_package_id": pack.id,
-                                    "quantity": cantidad_separada,
-                                    "new_observation_packing": observacion,
-                                    "user_operator_id": id_operario,
-                                    "date_transaction_packing": procesar_fecha_naive(fecha_transaccion, "America/Bogota") if fecha_transaccion else datetime.now(pytz.utc),
-                                    "is_done_item_pack": True,
-                                    "time_packing": time,
-                                }
-                            )
-                        if cantidad_separada < move_line.quantity:
-                            cantidad_original = move_line.quantity
+                                # ✅ 4. Crear la línea nueva con los valores actualizados
+                                new_line = request.env["stock.move.line"].sudo().create(new_line_vals)
 
-                            # ✅ 1. Restar a la original
-                            move_line.write({"quantity": cantidad_original - cantidad_separada})
+                                new_line.write({"is_done_item_pack": True})
 
-                            # ✅ 2. Copiar la línea original
-                            new_line_vals = move_line.copy_data()[0]
+                                nuevas_lineas_creadas.append(
+                                    {
+                                        "id_move_original": id_move,
+                                        "id_move_procesada": new_line.id,
+                                        "cantidad_procesada": cantidad_separada,
+                                        "cantidad_restante": cantidad_original - cantidad_separada,
+                                        "new_line_obj": new_line,  # Para obtener consecutivo después
+                                    }
+                                )
 
-                            # ✅ 3. Actualizar los datos ANTES de crearla
-                            new_line_vals.update(
+                            else:
+                                # ✅ Asignar directamente al paquete si no hay división
+                                move_line.write(
+                                    {
+                                        "result_package_id": pack.id,
+                                        "quantity": cantidad_separada,
+                                        "new_observation_packing": observacion,
+                                        "user_operator_id": id_operario,
+                                        "date_transaction_packing": procesar_fecha_naive(fecha_transaccion, "America/Bogota") if fecha_transaccion else datetime.now(pytz.utc),
+                                        "is_done_item_pack": True,
+                                        "time_packing": time,
+                                    }
+                                )
+                        elif cantidad_separada == move_line.quantity:
+                            # ✅ Asignar directamente al paquete si la cantidad es igual
+                            move_line.write(
                                 {
-                                    "quantity": cantidad_separada,
                                     "result_package_id": pack.id,
+                                    "quantity": cantidad_separada,
                                     "new_observation_packing": observacion,
                                     "user_operator_id": id_operario,
                                     "date_transaction_packing": procesar_fecha_naive(fecha_transaccion, "America/Bogota") if fecha_transaccion else datetime.now(pytz.utc),
@@ -784,108 +815,68 @@ class TransaccionDataPacking(http.Controller):
                                     "time_packing": time,
                                 }
                             )
-
-                            # ✅ 4. Crear la línea nueva con los valores actualizados
-                            new_line = request.env["stock.move.line"].sudo().create(new_line_vals)
-
-                            new_line.write({"is_done_item_pack": True})
-
-                            nuevas_lineas_creadas.append(
-                                {
-                                    "id_move_original": id_move,
-                                    "id_move_procesada": new_line.id,
-                                    "cantidad_procesada": cantidad_separada,
-                                    "cantidad_restante": cantidad_original - cantidad_separada,
-                                    "new_line_obj": new_line,  # Para obtener consecutivo después
-                                }
-                            )
-
                         else:
-                            # ✅ Asignar directamente al paquete si no hay división
-                            move_line.write(
+                            array_msg.append(
                                 {
-                                    "result_package_id": pack.id,
-                                    "quantity": cantidad_separada,
-                                    "new_observation_packing": observacion,
-                                    "user_operator_id": id_operario,
-                                    "date_transaction_packing": procesar_fecha_naive(fecha_transaccion, "America/Bogota") if fecha_transaccion else datetime.now(pytz.utc),
-                                    "is_done_item_pack": True,
-                                    "time_packing": time,
+                                    "code": 400,
+                                    "msg": f"La cantidad separada {cantidad_separada} es mayor a la cantidad disponible {move_line.quantity}",
                                 }
                             )
-                    elif cantidad_separada == move_line.quantity:
-                        # ✅ Asignar directamente al paquete si la cantidad es igual
-                        move_line.write(
-                            {
-                                "result_package_id": pack.id,
-                                "quantity": cantidad_separada,
-                                "new_observation_packing": observacion,
-                                "user_operator_id": id_operario,
-                                "date_transaction_packing": procesar_fecha_naive(fecha_transaccion, "America/Bogota") if fecha_transaccion else datetime.now(pytz.utc),
-                                "is_done_item_pack": True,
-                                "time_packing": time,
-                            }
-                        )
+                            continue
                     else:
                         array_msg.append(
                             {
                                 "code": 400,
-                                "msg": f"La cantidad separada {cantidad_separada} es mayor a la cantidad disponible {move_line.quantity}",
+                                "msg": f"Error al actualizar el paquete en stock.move.line {id_move}",
                             }
                         )
-                        continue
-                else:
-                    array_msg.append(
-                        {
-                            "code": 400,
-                            "msg": f"Error al actualizar el paquete en stock.move.line {id_move}",
-                        }
-                    )
 
-            # ✅ CORREGIDO: Generar números de caja para TODOS los pickings únicos procesados
-            batch.action_generate_box_numbers()
-
-            # ✅ CORREGIDO: Obtener el consecutivo del primer picking que contenga líneas del paquete
-            consecutivo = "Caja1"  # valor por defecto
-            primera_linea_del_paquete = None
-
-            for picking in pickings_procesados:
-                lineas_del_paquete = picking.move_line_ids.filtered(lambda l: l.result_package_id and l.result_package_id.id == pack.id)
-                if lineas_del_paquete:
-                    primera_linea_del_paquete = lineas_del_paquete[0]
-                    consecutivo = primera_linea_del_paquete.faber_box_number or "Caja1"
-                    break  # Tomar el consecutivo del primer picking que tenga líneas del paquete
-
-            # ✅ NUEVO: Actualizar consecutivo en las nuevas líneas creadas
-            for nueva_linea in nuevas_lineas_creadas:
-                if "new_line_obj" in nueva_linea:
-                    line_obj = nueva_linea["new_line_obj"]
-                    nueva_linea["consecutivo"] = line_obj.faber_box_number or consecutivo
-                    # Remover el objeto de la respuesta
-                    del nueva_linea["new_line_obj"]
-
-            array_msg.append(
-                {
-                    "id_paquete": pack.id,
-                    "name_paquete": pack.name,
-                    "id_batch": batch.id,
-                    "cantidad_productos_en_el_paquete": len(list_item),
-                    "is_sticker": is_sticker,
-                    "is_certificate": is_certificate,
-                    "peso": peso_total_paquete,
-                    "consecutivo": consecutivo,  # ✅ NUEVO: Consecutivo correcto
-                    "list_item": list_item,
-                }
-            )
+                # ✅ CORREGIDO: Generar números de caja para TODOS los pickings únicos procesados
+                batch.action_generate_box_numbers()
+
+                # ✅ CORREGIDO: Obtener el consecutivo del primer picking que contenga líneas del paquete
+                consecutivo = "Caja1"  # valor por defecto
+                primera_linea_del_paquete = None
+
+                for picking in pickings_procesados:
+                    lineas_del_paquete = picking.move_line_ids.filtered(lambda l: l.result_package_id and l.result_package_id.id == pack.id)
+                    if lineas_del_paquete:
+                        primera_linea_del_paquete = lineas_del_paquete[0]
+                        consecutivo = primera_linea_del_paquete.faber_box_number or "Caja1"
+                        break  # Tomar el consecutivo del primer picking que tenga líneas del paquete
+
+                # ✅ NUEVO: Actualizar consecutivo en las nuevas líneas creadas
+                for nueva_linea in nuevas_lineas_creadas:
+                    if "new_line_obj" in nueva_linea:
+                        line_obj = nueva_linea["new_line_obj"]
+                        nueva_linea["consecutivo"] = line_obj.faber_box_number or consecutivo
+                        # Remover el objeto de la respuesta
+                        del nueva_linea["new_line_obj"]
+
+                array_msg.append(
+                    {
+                        "id_paquete": pack.id,
+                        "name_paquete": pack.name,
+                        "id_batch": batch.id,
+                        "cantidad_productos_en_el_paquete": len(list_item),
+                        "is_sticker": is_sticker,
+                        "is_certificate": is_certificate,
+                        "peso": peso_total_paquete,
+                        "consecutivo": consecutivo,  # ✅ NUEVO: Consecutivo correcto
+                        "list_item": list_item,
+                    }
+                )
 
-            return {"code": 200, "result": array_msg}
+                return {"code": 200, "result": array_msg}
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
         except ValidationError as e:
             return {"code": 400, "msg": f"Error de validación: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
+            return not_stored({"code": 400, "msg": f"Error inesperado: {str(err)}"})
 
     ### POST Transacciones para desempacar paquete en packing
     @http.route("/api/unpacking", auth="user", type="json", methods=["POST"])
@@ -1008,7 +999,7 @@ class TransaccionDataPacking(http.Controller):
             if not user:
                 return request.make_json_response({"code": 400, "msg": "Usuario no encontrado"})
 
-            show_photo_temperature = request.env["appwms.temperature"].sudo().search([], limit=1)
+            show_photo_temperature = get_settings().temperature
             show_photo_required = show_photo_temperature.show_photo_temperature if show_photo_temperature else False
 
             id_linea_recepcion = post.get("move_line_id")
@@ -1369,21 +1360,7 @@ class TransaccionDataPacking(http.Controller):
 
             version_app = kwargs.get("version_app")
 
-            # 1. Validación de versión (igual que el original)
-            response_version = self.get_last_version()
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
             if not user:
@@ -1394,17 +1371,25 @@ class TransaccionDataPacking(http.Controller):
             if validation_error:
                 return validation_error
 
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            pedidos_filter = fields_filter.child("lista_pedidos")
+            productos_filter = pedidos_filter.child("lista_productos", exclude=catalog.line_keys)
+            paquetes_filter = pedidos_filter.child("lista_paquetes")
+            packing_filter = paquetes_filter.child("lista_productos_in_packing", exclude=catalog.line_keys)
+
             array_batch = []
             base_url = request.httprequest.host_url.rstrip("/")
 
             # Obtener configuración y almacenes
-            config_picking = request.env["packing.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.packing_config
             allowed_warehouses = obtener_almacenes_usuario(user)
 
             if isinstance(allowed_warehouses, dict) and "code" in allowed_warehouses:
                 return allowed_warehouses
 
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # Iterar sobre almacenes permitidos
             for warehouse in allowed_warehouses:
@@ -1463,56 +1448,62 @@ class TransaccionDataPacking(http.Controller):
                         origin_details = origins_list if origins_list else []
 
                         # Estructura base del batch
-                        array_batch_temp = {
-                            "id": batch.id,
-                            "name": batch.name,
-                            "scheduleddate": batch.scheduled_date,
-                            "state": batch.state,
-                            "user_id": user_info["user_id"] if batch.user_id else 0,
-                            "user_name": user_info["user_name"] if batch.user_id else "",
-                            "order_by": picking_strategy.picking_priority_app if picking_strategy else "",
-                            "order_picking": picking_strategy.picking_order_app if picking_strategy else "",
-                            "picking_type_id": batch.picking_type_id.display_name if batch.picking_type_id else "N/A",
-                            "cantidad_pedidos": 0,
-                            "start_time_pack": batch.start_time_pack or "",
-                            "end_time_pack": batch.end_time_pack or "",
-                            "zona_entrega": batch.picking_ids[0].delivery_zone_id.name if batch.picking_ids and batch.picking_ids[0].delivery_zone_id else "N/A",
-                            "zona_entrega_tms": "",
-                            "order_tms": "",
-                            "temperatura": batch.temperature_batch if hasattr(batch, "temperature_batch") else "",
-                            "manejo_temperatura": manejo_temperatura,
-                            "origin": origin_details,
-                            "lista_pedidos": [],
-                            # Campos específicos para unificado
-                            "is_unified": True,
-                            "total_unified_lines": len(batch.move_line_unified_pack_ids),
-                            "button_get_value_batch_pack": batch.button_get_value_batch_pack,
-                            "button_is_set_value_batch_pack_done": batch.button_is_set_value_batch_pack_done,
-                        }
+                        array_batch_temp = fields_filter.build(
+                            {
+                                "id": batch.id,
+                                "name": batch.name,
+                                "scheduleddate": batch.scheduled_date,
+                                "state": batch.state,
+                                "user_id": lambda: user_info["user_id"] if batch.user_id else 0,
+                                "user_name": lambda: user_info["user_name"] if batch.user_id else "",
+                                "order_by": lambda: picking_strategy.picking_priority_app if picking_strategy else "",
+                                "order_picking": lambda: picking_strategy.picking_order_app if picking_strategy else "",
+                                "picking_type_id": lambda: batch.picking_type_id.display_name if batch.picking_type_id else "N/A",
+                                "cantidad_pedidos": 0,
+                                "start_time_pack": lambda: batch.start_time_pack or "",
+                                "end_time_pack": lambda: batch.end_time_pack or "",
+                                "zona_entrega": lambda: batch.picking_ids[0].delivery_zone_id.name if batch.picking_ids and batch.picking_ids[0].delivery_zone_id else "N/A",
+                                "zona_entrega_tms": "",
+                                "order_tms": "",
+                                "temperatura": lambda: batch.temperature_batch if hasattr(batch, "temperature_batch") else "",
+                                "manejo_temperatura": manejo_temperatura,
+                                "origin": origin_details,
+                                "lista_pedidos": [],
+                                # Campos específicos para unificado
+                                "is_unified": True,
+                                "total_unified_lines": lambda: len(batch.move_line_unified_pack_ids),
+                                "button_get_value_batch_pack": batch.button_get_value_batch_pack,
+                                "button_is_set_value_batch_pack_done": batch.button_is_set_value_batch_pack_done,
+                            },
+                            BATCH_PACKING_CONTAINERS,
+                        )
 
                         valid_pickings_found = False
 
                         # PROCESAR POR PICKING (igual que el original) pero con datos unificados
                         for picking in batch.picking_ids:
-                            pedido = {
-                                "id": picking.id,
-                                "name": picking.name,
-                                "batch_id": batch.id,
-                                "referencia": picking.origin if picking.origin else "",
-                                "contacto": picking.partner_id.id if picking.partner_id else 0,
-                                "contacto_name": picking.partner_id.name if picking.partner_id else "N/A",
-                                "tipo_operacion": picking.picking_type_id.name if picking.picking_type_id else "N/A",
-                                "cantidad_productos": len(picking.move_line_ids.filtered(lambda ml: not ml.is_done_item_pack)),
-                                "cantidad_productos_total": len(picking.move_line_ids),
-                                "zona_entrega": picking.delivery_zone_id.name if picking.delivery_zone_id else "",
-                                # "zona_entrega_tms": picking.delivery_zone_tms if picking.delivery_zone_tms else "",
-                                # "order_tms": picking.order_tms if picking.order_tms else "",
-                                "zona_entrega_tms": "",
-                                "order_tms": "",
-                                "numero_paquetes": len(picking.move_line_ids.mapped("package_id")),
-                                "lista_productos": [],
-                                "lista_paquetes": [],
-                            }
+                            pedido = pedidos_filter.build(
+                                {
+                                    "id": picking.id,
+                                    "name": picking.name,
+                                    "batch_id": batch.id,
+                                    "referencia": lambda: picking.origin if picking.origin else "",
+                                    "contacto": lambda: picking.partner_id.id if picking.partner_id else 0,
+                                    "contacto_name": lambda: picking.partner_id.name if picking.partner_id else "N/A",
+                                    "tipo_operacion": lambda: picking.picking_type_id.name if picking.picking_type_id else "N/A",
+                                    "cantidad_productos": lambda: len(picking.move_line_ids.filtered(lambda ml: not ml.is_done_item_pack)),
+                                    "cantidad_productos_total": lambda: len(picking.move_line_ids),
+                                    "zona_entrega": lambda: picking.delivery_zone_id.name if picking.delivery_zone_id else "",
+                                    # "zona_entrega_tms": picking.delivery_zone_tms if picking.delivery_zone_tms else "",
+                                    # "order_tms": picking.order_tms if picking.order_tms else "",
+                                    "zona_entrega_tms": "",
+                                    "order_tms": "",
+                                    "numero_paquetes": lambda: len(picking.move_line_ids.mapped("package_id")),
+                                    "lista_productos": [],
+                                    "lista_paquetes": [],
+                                },
+                                BATCH_PACKING_CONTAINERS["lista_pedidos"],
+                            )
 
                             # Buscar líneas unificadas que correspondan a este picking
                             # (basándose en las líneas originales que generaron la unificación)
@@ -1541,7 +1532,7 @@ class TransaccionDataPacking(http.Controller):
 
                                 # Códigos de barras del producto (igual que original)
                                 array_all_barcode = []
-                                if "barcode_ids" in product.fields_get():
+                                if productos_filter.wants("other_barcode") and "barcode_ids" in product._fields:
                                     array_all_barcode = [
                                         {
                                             "barcode": barcode.name,
@@ -1551,7 +1542,7 @@ class TransaccionDataPacking(http.Controller):
                                             "cantidad": 1,
                                             "product_id": product.id
                                         }
-                                        for barcode in product.barcode_ids
+                                        for barcode in product_fragment(product)["barcodes"]
                                         if barcode.name  # Filtra solo los barcodes válidos
                                     ]
 
@@ -1566,48 +1557,51 @@ class TransaccionDataPacking(http.Controller):
                                             "id_move": unified_line.id,
                                             "id_product": product.id,
                                         }
-                                        for pack in product.packaging_ids
+                                        for pack in product_fragment(product)["packagings"]
                                         if pack.barcode
                                     ]
-                                    if product.packaging_ids
+                                    if productos_filter.wants("product_packing") and product_fragment(product)["packagings"]
                                     else []
                                 )
 
                                 # Solo agregar si NO está marcado como hecho (igual que original)
                                 if unified_line.is_done_item == False:
-                                    productos = {
-                                        "id_move": unified_line.id,
-                                        "product_id": [product.id, product.display_name],
-                                        "batch_id": batch.id,
-                                        "pedido_id": picking.id,
-                                        "id_product": product.id if product else 0,
-                                        "product_code": product.default_code if product else "",
-                                        "picking_id": picking.id,
-                                        "lote_id": lot.id if lot else "",
-                                        "lot_id": [lot.id, lot.name if lot else ""] if lot else [],
-                                        "expire_date": lot.expiration_date or "",
-                                        "location_id": [location.id, location.display_name if location else ""],
-                                        "barcode_location": location.barcode if location else "",
-                                        "location_dest_id": [location_dest.id, location_dest.name if location_dest else ""],
-                                        "barcode_location_dest": location_dest.barcode if location_dest else "",
-                                        "other_barcode": array_all_barcode,
-                                        # "quantity": unified_line.qty_done,  # Usar qty_done (cantidad editada)
-                                        "quantity": unified_line.product_uom_qty,  # Usar qty_done (cantidad editada)
-                                        "tracking": product.tracking if product else "",
-                                        "barcode": product.barcode if product else "",
-                                        "product_packing": array_packing,
-                                        "weight": product.weight if product else 0,
-                                        "unidades": product.uom_id.name if product.uom_id else "UND",
-                                        "rimoval_priority": location.priority_picking_desplay if location else 0,
-                                        "maneja_temperatura": product.temperature_control if hasattr(product, "temperature_control") else False,
-                                        "temperatura": unified_line.temperature if hasattr(unified_line, "temperature") else 0,
-                                        # Campos adicionales específicos de unificado
-                                        "product_uom_qty_original": unified_line.product_uom_qty,
-                                        "qty_done_unified": unified_line.qty_done,
-                                        "result_package_id": unified_line.result_package_id.id if unified_line.result_package_id else None,
-                                        "package_name": unified_line.result_package_id.name if unified_line.result_package_id else "",
-                                        "is_unified_line": True,
-                                    }
+                                    catalog.add(product)
+                                    productos = productos_filter.build(
+                                        {
+                                            "id_move": unified_line.id,
+                                            "product_id": lambda: [product.id, product.display_name],
+                                            "batch_id": batch.id,
+                                            "pedido_id": picking.id,
+                                            "id_product": lambda: product.id if product else 0,
+                                            "product_code": lambda: product.default_code if product else "",
+                                            "picking_id": picking.id,
+                                            "lote_id": lambda: lot.id if lot else "",
+                                            "lot_id": lambda: [lot.id, lot.name if lot else ""] if lot else [],
+                                            "expire_date": lambda: lot.expiration_date or "",
+                                            "location_id": lambda: [location.id, location.display_name if location else ""],
+                                            "barcode_location": lambda: location.barcode if location else "",
+                                            "location_dest_id": lambda: [location_dest.id, location_dest.name if location_dest else ""],
+                                            "barcode_location_dest": lambda: location_dest.barcode if location_dest else "",
+                                            "other_barcode": array_all_barcode,
+                                            # "quantity": unified_line.qty_done,  # Usar qty_done (cantidad editada)
+                                            "quantity": unified_line.product_uom_qty,  # Usar qty_done (cantidad editada)
+                                            "tracking": lambda: product.tracking if product else "",
+                                            "barcode": lambda: product.barcode if product else "",
+                                            "product_packing": array_packing,
+                                            "weight": lambda: product.weight if product else 0,
+                                            "unidades": lambda: product.uom_id.name if product.uom_id else "UND",
+                                            "rimoval_priority": lambda: location.priority_picking_desplay if location else 0,
+                                            "maneja_temperatura": lambda: product.temperature_control if hasattr(product, "temperature_control") else False,
+                                            "temperatura": lambda: unified_line.temperature if hasattr(unified_line, "temperature") else 0,
+                                            # Campos adicionales específicos de unificado
+                                            "product_uom_qty_original": unified_line.product_uom_qty,
+                                            "qty_done_unified": unified_line.qty_done,
+                                            "result_package_id": lambda: unified_line.result_package_id.id if unified_line.result_package_id else None,
+                                            "package_name": lambda: unified_line.result_package_id.name if unified_line.result_package_id else "",
+                                            "is_unified_line": True,
+                                        }
+                                    )
 
                                     pedido["lista_productos"].append(productos)
 
@@ -1640,51 +1634,57 @@ class TransaccionDataPacking(http.Controller):
 
                                 cantidad_productos = len(unified_lines_in_package)
 
-                                package = {
-                                    "name": pack.name,
-                                    "id": pack.id,
-                                    "batch_id": batch.id,
-                                    "pedido_id": picking.id,
-                                    "cantidad_productos": cantidad_productos,
-                                    "lista_productos_in_packing": [],
-                                    "is_sticker": pack.is_sticker if hasattr(pack, "is_sticker") else False,
-                                    "is_certificate": pack.is_certificate if hasattr(pack, "is_certificate") else False,
-                                    "fecha_creacion": pack.create_date.strftime("%Y-%m-%d") if pack.create_date else "",
-                                    "fecha_actualizacion": pack.write_date.strftime("%Y-%m-%d") if pack.write_date else "",
-                                    "consecutivo": getattr(unified_lines_in_package[0], "faber_box_number", "") if unified_lines_in_package else "",
-                                }
+                                package = paquetes_filter.build(
+                                    {
+                                        "name": pack.name,
+                                        "id": pack.id,
+                                        "batch_id": batch.id,
+                                        "pedido_id": picking.id,
+                                        "cantidad_productos": cantidad_productos,
+                                        "lista_productos_in_packing": [],
+                                        "is_sticker": lambda: pack.is_sticker if hasattr(pack, "is_sticker") else False,
+                                        "is_certificate": lambda: pack.is_certificate if hasattr(pack, "is_certificate") else False,
+                                        "fecha_creacion": lambda: pack.create_date.strftime("%Y-%m-%d") if pack.create_date else "",
+                                        "fecha_actualizacion": lambda: pack.write_date.strftime("%Y-%m-%d") if pack.write_date else "",
+                                        "consecutivo": lambda: getattr(unified_lines_in_package[0], "faber_box_number", "") if unified_lines_in_package else "",
+                                    },
+                                    BATCH_PACKING_CONTAINERS["lista_pedidos"]["lista_paquetes"],
+                                )
 
                                 for unified_line in unified_lines_in_package:
                                     product = unified_line.product_id
                                     lot = unified_line.lot_id
 
-                                    product_in_packing = {
-                                        "id_move": unified_line.id,
-                                        "pedido_id": picking.id,
-                                        "batch_id": batch.id,
-                                        "package_name": pack.name,
-                                        "quantity_separate": unified_line.qty_done,
-                                        "id_product": product.id if product else 0,
-                                        "product_id": [product.id, product.display_name],
-                                        "name_packing": pack.name,
-                                        "cantidad_enviada": unified_line.qty_done,
-                                        "unidades": product.uom_id.name if product.uom_id else "UND",
-                                        "peso": product.weight if product else 0,
-                                        "lote_id": [lot.id, lot.name if lot else ""] if lot else [],
-                                        "observation": unified_line.new_observation,
-                                        "weight": product.weight if product else 0,
-                                        "is_sticker": pack.is_sticker if hasattr(pack, "is_sticker") else False,
-                                        "is_certificate": pack.is_certificate if hasattr(pack, "is_certificate") else False,
-                                        "id_package": pack.id,
-                                        "quantity": unified_line.qty_done,
-                                        "tracking": product.tracking if product else "",
-                                        "maneja_temperatura": product.temperature_control if hasattr(product, "temperature_control") else False,
-                                        "temperatura": unified_line.temperature if hasattr(unified_line, "temperature") else 0,
-                                        "time_separate": unified_line.time if unified_line.time else 0,
-                                        # Campos específicos de línea unificada
-                                        "is_unified_line": True,
-                                        "product_uom_qty_original": unified_line.product_uom_qty,
-                                    }
+                                    catalog.add(product)
+                                    product_in_packing = packing_filter.build(
+                                        {
+                                            "id_move": unified_line.id,
+                                            "pedido_id": picking.id,
+                                            "batch_id": batch.id,
+                                            "package_name": pack.name,
+                                            "quantity_separate": unified_line.qty_done,
+                                            "id_product": lambda: product.id if product else 0,
+                                            "product_id": lambda: [product.id, product.display_name],
+                                            "name_packing": pack.name,
+                                            "cantidad_enviada": unified_line.qty_done,
+                                            "unidades": lambda: product.uom_id.name if product.uom_id else "UND",
+                                            "peso": lambda: product.weight if product else 0,
+                                            "lote_id": lambda: [lot.id, lot.name if lot else ""] if lot else [],
+                                            "observation": unified_line.new_observation,
+                                            "weight": lambda: product.weight if product else 0,
+                                            "is_sticker": lambda: pack.is_sticker if hasattr(pack, "is_sticker") else False,
+                                            "is_certificate": lambda: pack.is_certificate if hasattr(pack, "is_certificate") else False,
+                                            "id_package": pack.id,
+                                            "quantity": unified_line.qty_done,
+                                            "tracking": lambda: product.tracking if product else "",
+                                            "maneja_temperatura": lambda: product.temperature_control if hasattr(product, "temperature_control") else False,
+                                            "temperatura": lambda: unified_line.temperature if hasattr(unified_line, "temperature") else 0,
+                                            "time_separate": lambda: unified_line.time if unified_line.time else 0,
+                                            # Campos específicos de línea unificada
+                                            "is_unified_line": True,
+                                            "product_uom_qty_original": unified_line.product_uom_qty,
+                                        }
+                                    )
 
                                     package["lista_productos_in_packing"].append(product_in_packing)
 
@@ -1700,7 +1700,7 @@ class TransaccionDataPacking(http.Controller):
                             array_batch_temp["cantidad_pedidos"] = len(array_batch_temp["lista_pedidos"])
                             array_batch.append(array_batch_temp)
 
-            return {"code": 200, "update_version": update_required, "result": array_batch}
+            return {"code": 200, "update_version": update_required, "result": fields_filter.prune(array_batch, BATCH_PACKING_CONTAINERS), **catalog.meta()}
 
         except AccessError as e:
             return {"code": 403, "update_version": update_required, "msg": f"Acceso denegado: {str(e)}"}
@@ -1716,21 +1716,7 @@ class TransaccionDataPacking(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Validación de versión (igual que el original)
-            response_version = self.get_last_version()
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
             if not user:
@@ -1745,13 +1731,14 @@ class TransaccionDataPacking(http.Controller):
             base_url = request.httprequest.host_url.rstrip("/")
 
             # Obtener configuración y almacenes
-            config_picking = request.env["packing.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.packing_config
             allowed_warehouses = obtener_almacenes_usuario(user)
 
             if isinstance(allowed_warehouses, dict) and "code" in allowed_warehouses:
                 return allowed_warehouses
 
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # Iterar sobre almacenes permitidos
             for warehouse in allowed_warehouses:
@@ -1879,7 +1866,7 @@ class TransaccionDataPacking(http.Controller):
 
                             # Códigos de barras del producto
                             array_all_barcode = []
-                            if "barcode_ids" in product.fields_get():
+                            if "barcode_ids" in product._fields:
                                 array_all_barcode = [
                                     {
                                         "barcode": barcode.name,
@@ -1889,7 +1876,7 @@ class TransaccionDataPacking(http.Controller):
                                         "cantidad": 1,
                                         "product_id": product.id
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name  # Filtra solo los barcodes válidos
                                 ]
 
@@ -1904,10 +1891,10 @@ class TransaccionDataPacking(http.Controller):
                                         "id_move": unified_line.id,
                                         "id_product": product.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
-                                if product.packaging_ids
+                                if product_fragment(product)["packagings"]
                                 else []
                             )
 
@@ -2508,6 +2495,9 @@ class TransaccionDataPacking(http.Controller):
     #         return request.make_json_response({"code": 500, "msg": "Error interno del servidor"})
 
 
+register_journal_operation("send_packing", TransaccionDataPacking, "send_packing", "stock.picking.batch", "id_batch")
+
+
 def procesar_fecha_naive(fecha_transaccion, zona_horaria_cliente):
     if fecha_transaccion:
         # Convertir la fecha enviada a datetime y agregar la zona horaria del cliente
@@ -2541,23 +2531,3 @@ def obtener_almacenes_usuario(user):
         return {"code": 400, "msg": "El usuario no tiene acceso a ningún almacén"}
 
     return allowed_warehouses
-
-
-def validate_pda(device_id):
-    """
-    Solo valida que la PDA existe y está autorizada
-    Returns: dict con error si hay problema, None si todo está OK
-    """
-    if not device_id:
-        return {"code": 400, "msg": "Device ID no proporcionado, por favor actualizar a la ultima version de la app"}
-
-    pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)])
-
-    if not pda:
-        return {"code": 404, "msg": "PDA no encontrado"}
-
-    if pda.is_authorized == "no":
-        return {"code": 403, "msg": "PDA no autorizado"}
-
-    # Si llegamos aquí, todo está bien
-    return None
@@ -4,99 +4,63 @@ from odoo.http import request
 from odoo.exceptions import AccessError
 from datetime import datetime, timedelta
 import pytz
-import hashlib
-import json
-from datetime import datetime, timedelta
 from collections import defaultdict
 
-
-# Cache global simple
-_cache = {}
-_cache_timestamps = {}
-CACHE_TTL = 300  # 5 minutos
+from . import app_version
+from .db_retry import CONCURRENCY_ERRORS, retry_on_concurrency
+from .idempotency import idempotent, not_stored
+from .offline_journal import register_journal_operation
+from .delta_sync import parse_sync_params
+from .pda_auth import validate_pda
+from .response_cache import ResponseCache, generate_cache_key
+from .settings_snapshot import get_settings
+from .stock_availability import check_stock_availability
+from .user_locations import get_user_zone_locations
+from .utils import prefetch_products, product_fragment
 
 
-def generate_cache_key(user_id, params=None):
-    """Generar clave de caché única"""
-    cache_data = {"user_id": user_id}
-    if params:
-        cache_data.update(params)
-    cache_string = json.dumps(cache_data, sort_keys=True)
-    return hashlib.md5(cache_string.encode()).hexdigest()
+# Caché de las listas de batches; se invalida por batch al enviar líneas y
+# la clave incluye la huella de los batches (ver _batches_stamp)
+CACHE_TTL = 60  # segundos
+batch_cache = ResponseCache("batchs", max_size=256, ttl=CACHE_TTL)
 
 
-def get_from_cache(cache_key):
-    """Obtener datos del cache si están válidos"""
-    if cache_key in _cache and cache_key in _cache_timestamps:
-        cache_age = datetime.now() - _cache_timestamps[cache_key]
-        if cache_age < timedelta(seconds=CACHE_TTL):
-            return _cache[cache_key]
-    return None
-
+def _batches_stamp():
+    """
+    Huella de los batches (write_date máximo y conteo) en una consulta agrupada
 
-def set_cache(cache_key, data):
-    """Almacenar datos en cache"""
-    _cache[cache_key] = data
-    _cache_timestamps[cache_key] = datetime.now()
+    Asignar o quitar el responsable de un batch, crearlo, eliminarlo o
+    cambiar su estado (desde el backend o desde la API) cambia la huella y
+    con ella la clave de caché: la PDA ve la asignación de inmediato.
+    """
+    [(max_write_date, count)] = request.env["stock.picking.batch"].sudo()._read_group([], aggregates=["write_date:max", "__count"])
+    return [str(max_write_date), count]
+
+# Campos de move.line.unified que usan las listas de batches
+MOVE_UNIFIED_BATCH_FIELDS = [
+    "stock_picking_batch_id",
+    "product_id",
+    "lot_id",
+    "location_id",
+    "location_dest_id",
+    "product_uom_qty",
+    "qty_done",
+    "is_done_item",
+    "new_observation",
+    "time",
+    "date_transaction_picking",
+    "user_operator_id",
+]
 
 
 class TransaccionDataPicking(http.Controller):
 
-    def get_last_version(self):
-        try:
-            # Obtener la última versión
-            last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
-
-            if not last_version:
-                return {"code": 404, "msg": "No se encontró ninguna versión"}
-
-            # Convertir el texto JSON a una lista Python
-            notes_list = []
-            if last_version.notes:
-                try:
-                    notes_list = json.loads(last_version.notes)
-                except:
-                    notes_list = ["Error al procesar las notas"]
-
-            return {
-                "code": 200,
-                "result": {
-                    "id": last_version.id,
-                    "version": last_version.version,
-                    "release_date": str(last_version.release_date),
-                    "notes": notes_list,  # Ahora devuelve la lista en lugar del string JSON
-                    "url_download": last_version.url_download,
-                },
-            }
-
-        except AccessError as e:
-            return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
-        except Exception as err:
-            return {"code": 400, "msg": "Error inesperado: {}".format(str(err))}
-
     @http.route("/api/batchs", auth="user", type="json", methods=["GET"])
     def get_batches(self, **kwargs):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -110,55 +74,29 @@ class TransaccionDataPicking(http.Controller):
                 return validation_error
 
             # obtener la configuracion picking de la app
-            config_picking = request.env["picking.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.picking_config
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # ✅ Validar usuario WMS y sus zonas asignadas
             user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
 
-            if not user_wms or not user_wms.zone_ids:
-                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
+            # ✅ Obtener zonas y ubicaciones asignadas (en caché por usuario)
+            zone_ids, location_ids = get_user_zone_locations(user_wms)
 
-            # ✅ Obtener ubicaciones de las zonas asignadas
-            all_location_ids = list(
-                {
-                    loc_id
-                    for zone in user_wms.zone_ids.sudo().read(["location_ids"])
-                    for loc_id in zone["location_ids"]
-                }
-            )
+            if not zone_ids:
+                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
 
-            if not all_location_ids:
+            if not location_ids:
                 return {
                     "code": 400,
                     "update_version": update_required,
                     "msg": "El usuario no tiene ubicaciones asociadas",
                 }
 
-            # ✅ Obtener ubicaciones en bloques
-            chunk_size = 100
-            locations = []
-            for i in range(0, len(all_location_ids), chunk_size):
-                chunk = all_location_ids[i : i + chunk_size]
-                locations.extend(
-                    request.env["stock.location"]
-                    .sudo()
-                    .browse(chunk)
-                    .read(
-                        [
-                            "id",
-                            "name",
-                            "complete_name",
-                            "priority_picking",
-                            "barcode",
-                            "priority_picking_desplay",
-                        ]
-                    )
-                )
-
-            user_location_ids = [location["id"] for location in locations]
+            user_location_ids = list(location_ids)
 
             search_domain = [
                 ("state", "=", "in_progress"),
@@ -254,6 +192,7 @@ class TransaccionDataPicking(http.Controller):
                 products = {
                     prod.id: prod for prod in request.env["product.product"].sudo().browse(product_ids)
                 }
+                prefetch_products(request.env["product.product"].sudo().browse(product_ids))
 
                 location_ids = {move["location_id"][0] for move in stock_moves}
                 locations_dict = {
@@ -279,10 +218,10 @@ class TransaccionDataPicking(http.Controller):
                                 "cantidad": 1,
                                 "id_product": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for barcode in product.barcode_ids
+                            for barcode in product_fragment(product)["barcodes"]
                             if barcode.name  # Filtra solo los barcodes válidos
                         ]
-                        if product.barcode_ids
+                        if product_fragment(product)["barcodes"]
                         else []
                     )
 
@@ -296,10 +235,10 @@ class TransaccionDataPicking(http.Controller):
                                 "id_move": move["id"],
                                 "product_id": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for pack in product.packaging_ids
+                            for pack in product_fragment(product)["packagings"]
                             if pack.barcode
                         ]
-                        if product.packaging_ids
+                        if product_fragment(product)["packagings"]
                         else []
                     )
 
@@ -428,52 +367,44 @@ class TransaccionDataPicking(http.Controller):
             if validation_error:
                 return validation_error
 
+            sync = parse_sync_params(kwargs)
+            if isinstance(sync, dict):
+                return sync
+
+            cache_key = generate_cache_key(
+                user.id,
+                {
+                    "route": "/api/batchs/v2",
+                    "limit": kwargs.get("limit"),
+                    "cursor": kwargs.get("cursor"),
+                    "since": kwargs.get("since"),
+                    "batches": _batches_stamp(),
+                },
+            )
+            cached_response = batch_cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
+
             # obtener la configuracion picking de la app
-            config_picking = request.env["picking.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.picking_config
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # ✅ Validar usuario WMS y sus zonas asignadas
             user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
 
-            if not user_wms or not user_wms.zone_ids:
-                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
+            # ✅ Obtener zonas y ubicaciones asignadas (en caché por usuario)
+            zone_ids, location_ids = get_user_zone_locations(user_wms)
 
-            # ✅ Obtener ubicaciones de las zonas asignadas
-            all_location_ids = list(
-                {
-                    loc_id
-                    for zone in user_wms.zone_ids.sudo().read(["location_ids"])
-                    for loc_id in zone["location_ids"]
-                }
-            )
+            if not zone_ids:
+                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
 
-            if not all_location_ids:
+            if not location_ids:
                 return {"code": 400, "msg": "El usuario no tiene ubicaciones asociadas"}
 
-            # ✅ Obtener ubicaciones en bloques
-            chunk_size = 100
-            locations = []
-            for i in range(0, len(all_location_ids), chunk_size):
-                chunk = all_location_ids[i : i + chunk_size]
-                locations.extend(
-                    request.env["stock.location"]
-                    .sudo()
-                    .browse(chunk)
-                    .read(
-                        [
-                            "id",
-                            "name",
-                            "complete_name",
-                            "priority_picking",
-                            "barcode",
-                            "priority_picking_desplay",
-                        ]
-                    )
-                )
-
-            user_location_ids = [location["id"] for location in locations]
+            user_location_ids = list(location_ids)
 
             search_domain = [("state", "=", "in_progress"), ("picking_type_code", "=", "internal")]
 
@@ -482,29 +413,67 @@ class TransaccionDataPicking(http.Controller):
                 search_domain.append(("user_id", "=", user.id))  # Agregar filtro por usuario responsable
 
             # ✅ Obtener lotes (batches)
-            batchs = request.env["stock.picking.batch"].sudo().search(search_domain)
+            batchs = sync.search(
+                0,
+                request.env["stock.picking.batch"].sudo(),
+                search_domain,
+                volatile_fields=("state", "user_id"),
+                # Las líneas que se serializan son las de move.line.unified
+                lines=(request.env["move.line.unified"].sudo(), "stock_picking_batch_id"),
+            )
 
             # ✅ Verificar si no hay lotes encontrados
             if not batchs:
-                return {"code": 200, "msg": "No tienes batches asignados"}
+                return {"code": 200, "msg": "No tienes batches asignados", **sync.meta([])}
+
+            # ✅ Obtener en una sola consulta los movimientos unificados de todos los batches
+            stock_moves_all = (
+                request.env["move.line.unified"]
+                .sudo()
+                .search_read(
+                    [("stock_picking_batch_id", "in", batchs.ids), ("location_id", "in", user_location_ids)],
+                    MOVE_UNIFIED_BATCH_FIELDS,
+                )
+            )
+
+            moves_by_batch = defaultdict(list)
+            for move in stock_moves_all:
+                moves_by_batch[move["stock_picking_batch_id"][0]].append(move)
+
+            # ✅ Precargar productos, ubicaciones, lotes y el picking principal de cada batch
+            products = {
+                prod.id: prod
+                for prod in request.env["product.product"]
+                .sudo()
+                .browse({move["product_id"][0] for move in stock_moves_all})
+            }
+
+            location_ids = {move["location_id"][0] for move in stock_moves_all} | {
+                move["location_dest_id"][0] for move in stock_moves_all if move["location_dest_id"]
+            }
+            locations_dict = {loc.id: loc for loc in request.env["stock.location"].sudo().browse(location_ids)}
+
+            lot_ids = {move["lot_id"][0] for move in stock_moves_all if move["lot_id"]}
+            lots_expiration = {
+                lot["id"]: lot["expiration_date"]
+                for lot in request.env["stock.lot"].sudo().browse(lot_ids).read(["expiration_date"])
+            }
+
+            # Mismo orden que search(..., limit=1) por batch: el primero según el orden del modelo
+            first_picking_by_batch = {}
+            for picking in request.env["stock.picking"].sudo().search([("batch_id", "in", list(moves_by_batch))]):
+                first_picking_by_batch.setdefault(picking.batch_id.id, picking)
 
             array_batch = []
             for batch in batchs:
-                # ✅ Obtener movimientos unificados
-                move_unified_ids = (
-                    request.env["move.line.unified"]
-                    .sudo()
-                    .search(
-                        [("stock_picking_batch_id", "=", batch.id), ("location_id", "in", user_location_ids)]
-                    )
-                )
+                stock_moves = moves_by_batch.get(batch.id)
 
-                if not move_unified_ids:
+                if not stock_moves:
                     continue
 
                 # ✅ NUEVO: Verificar si todos los items están completados
-                total_items = len(move_unified_ids)
-                completed_items = len(move_unified_ids.filtered(lambda m: m.is_done_item))
+                total_items = len(stock_moves)
+                completed_items = len([move for move in stock_moves if move["is_done_item"]])
 
                 # Si todos los items están completados, saltar este batch
                 if total_items > 0 and completed_items == total_items:
@@ -523,9 +492,6 @@ class TransaccionDataPicking(http.Controller):
                             )
                 origin_details = origins_list if origins_list else []
 
-                # stock_moves = move_unified_ids.read(["product_id", "lot_id", "location_id", "location_dest_id", "product_uom_qty", "is_done_item"])
-                stock_moves = move_unified_ids.read()
-
                 array_batch_temp = {
                     "id": batch.id,
                     "name": batch.name or "",
@@ -561,16 +527,6 @@ class TransaccionDataPicking(http.Controller):
                     "list_items": [],
                 }
 
-                product_ids = {move["product_id"][0] for move in stock_moves}
-                products = {
-                    prod.id: prod for prod in request.env["product.product"].sudo().browse(product_ids)
-                }
-
-                location_ids = {move["location_id"][0] for move in stock_moves}
-                locations_dict = {
-                    loc.id: loc for loc in request.env["stock.location"].sudo().browse(location_ids)
-                }
-
                 for move in stock_moves:
                     product = products.get(move["product_id"][0])
                     location = locations_dict.get(move["location_id"][0])
@@ -590,10 +546,10 @@ class TransaccionDataPicking(http.Controller):
                                 "cantidad": 1,
                                 "id_product": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for barcode in product.barcode_ids
+                            for barcode in product_fragment(product)["barcodes"]
                             if barcode.name  # Filtra solo los barcodes válidos
                         ]
-                        if product.barcode_ids
+                        if product_fragment(product)["barcodes"]
                         else []
                     )
 
@@ -607,17 +563,15 @@ class TransaccionDataPicking(http.Controller):
                                 "id_move": move["id"],
                                 "product_id": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for pack in product.packaging_ids
+                            for pack in product_fragment(product)["packagings"]
                             if pack.barcode
                         ]
-                        if product.packaging_ids
+                        if product_fragment(product)["packagings"]
                         else []
                     )
 
-                    # ✅ Buscar el picking_id desde stock.move
-                    picking = (
-                        request.env["stock.picking"].sudo().search([("batch_id", "=", batch.id)], limit=1)
-                    )  # Obtiene un picking asociado al batch
+                    # ✅ Picking asociado al batch (precargado)
+                    picking = first_picking_by_batch.get(batch.id, request.env["stock.picking"])
                     picking_id = picking.id if picking else 0
 
                     # ✅ Obtener el nombre del pedido
@@ -672,11 +626,7 @@ class TransaccionDataPicking(http.Controller):
                                     else move["lot_id"] if isinstance(move["lot_id"], str) else ""
                                 ),
                             ],
-                            "expire_date": (
-                                request.env["stock.lot"].sudo().browse(move["lot_id"][0]).expiration_date
-                                if move["lot_id"]
-                                else ""
-                            ),
+                            "expire_date": lots_expiration.get(move["lot_id"][0]) if move["lot_id"] else "",
                             "location_id": move["location_id"],
                             "rimoval_priority": location.priority_picking_desplay,
                             "barcode_location": location.barcode if location else "",
@@ -711,7 +661,9 @@ class TransaccionDataPicking(http.Controller):
                 if array_batch_temp["list_items"]:
                     array_batch.append(array_batch_temp)
 
-            return {"code": 200, "result": array_batch}
+            response = {"code": 200, "result": array_batch, **sync.meta(batch_data["id"] for batch_data in array_batch)}
+            batch_cache.set(cache_key, response, tags=[("batch", batch_data["id"]) for batch_data in array_batch])
+            return response
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
@@ -736,51 +688,25 @@ class TransaccionDataPicking(http.Controller):
                 return validation_error
 
             # obtener la configuracion picking de la app
-            config_picking = request.env["picking.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.picking_config
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # ✅ Validar usuario WMS y sus zonas asignadas
             user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
 
-            if not user_wms or not user_wms.zone_ids:
-                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
+            # ✅ Obtener zonas y ubicaciones asignadas (en caché por usuario)
+            zone_ids, location_ids = get_user_zone_locations(user_wms)
 
-            # ✅ Obtener ubicaciones de las zonas asignadas
-            all_location_ids = list(
-                {
-                    loc_id
-                    for zone in user_wms.zone_ids.sudo().read(["location_ids"])
-                    for loc_id in zone["location_ids"]
-                }
-            )
+            if not zone_ids:
+                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
 
-            if not all_location_ids:
+            if not location_ids:
                 return {"code": 400, "msg": "El usuario no tiene ubicaciones asociadas"}
 
-            # ✅ Obtener ubicaciones en bloques
-            chunk_size = 100
-            locations = []
-            for i in range(0, len(all_location_ids), chunk_size):
-                chunk = all_location_ids[i : i + chunk_size]
-                locations.extend(
-                    request.env["stock.location"]
-                    .sudo()
-                    .browse(chunk)
-                    .read(
-                        [
-                            "id",
-                            "name",
-                            "complete_name",
-                            "priority_picking",
-                            "barcode",
-                            "priority_picking_desplay",
-                        ]
-                    )
-                )
-
-            user_location_ids = [location["id"] for location in locations]
+            user_location_ids = list(location_ids)
 
             search_domain = [
                 ("state", "=", "in_progress"),
@@ -869,6 +795,7 @@ class TransaccionDataPicking(http.Controller):
                 products = {
                     prod.id: prod for prod in request.env["product.product"].sudo().browse(product_ids)
                 }
+                prefetch_products(request.env["product.product"].sudo().browse(product_ids))
 
                 location_ids = {move["location_id"][0] for move in stock_moves}
                 locations_dict = {
@@ -894,10 +821,10 @@ class TransaccionDataPicking(http.Controller):
                                 "cantidad": 1,
                                 "id_product": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for barcode in product.barcode_ids
+                            for barcode in product_fragment(product)["barcodes"]
                             if barcode.name  # Filtra solo los barcodes válidos
                         ]
-                        if product.barcode_ids
+                        if product_fragment(product)["barcodes"]
                         else []
                     )
 
@@ -911,10 +838,10 @@ class TransaccionDataPicking(http.Controller):
                                 "id_move": move["id"],
                                 "product_id": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for pack in product.packaging_ids
+                            for pack in product_fragment(product)["packagings"]
                             if pack.barcode
                         ]
-                        if product.packaging_ids
+                        if product_fragment(product)["packagings"]
                         else []
                     )
 
@@ -1016,52 +943,31 @@ class TransaccionDataPicking(http.Controller):
             if validation_error:
                 return validation_error
 
+            cache_key = generate_cache_key(user.id, {"route": "/api/batchs/devs/v2", "batches": _batches_stamp()})
+            cached_response = batch_cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
+
             # obtener la configuracion picking de la app
-            config_picking = request.env["picking.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.picking_config
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # ✅ Validar usuario WMS y sus zonas asignadas
             user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
 
-            if not user_wms or not user_wms.zone_ids:
-                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
+            # ✅ Obtener zonas y ubicaciones asignadas (en caché por usuario)
+            zone_ids, location_ids = get_user_zone_locations(user_wms)
 
-            # ✅ Obtener ubicaciones de las zonas asignadas
-            all_location_ids = list(
-                {
-                    loc_id
-                    for zone in user_wms.zone_ids.sudo().read(["location_ids"])
-                    for loc_id in zone["location_ids"]
-                }
-            )
+            if not zone_ids:
+                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
 
-            if not all_location_ids:
+            if not location_ids:
                 return {"code": 400, "msg": "El usuario no tiene ubicaciones asociadas"}
 
-            # ✅ Obtener ubicaciones en bloques
-            chunk_size = 100
-            locations = []
-            for i in range(0, len(all_location_ids), chunk_size):
-                chunk = all_location_ids[i : i + chunk_size]
-                locations.extend(
-                    request.env["stock.location"]
-                    .sudo()
-                    .browse(chunk)
-                    .read(
-                        [
-                            "id",
-                            "name",
-                            "complete_name",
-                            "priority_picking",
-                            "barcode",
-                            "priority_picking_desplay",
-                        ]
-                    )
-                )
-
-            user_location_ids = [location["id"] for location in locations]
+            user_location_ids = list(location_ids)
 
             search_domain = [
                 ("state", "=", "in_progress"),
@@ -1150,6 +1056,7 @@ class TransaccionDataPicking(http.Controller):
                 products = {
                     prod.id: prod for prod in request.env["product.product"].sudo().browse(product_ids)
                 }
+                prefetch_products(request.env["product.product"].sudo().browse(product_ids))
 
                 location_ids = {move["location_id"][0] for move in stock_moves}
                 locations_dict = {
@@ -1175,10 +1082,10 @@ class TransaccionDataPicking(http.Controller):
                                 "cantidad": 1,
                                 "id_product": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for barcode in product.barcode_ids
+                            for barcode in product_fragment(product)["barcodes"]
                             if barcode.name  # Filtra solo los barcodes válidos
                         ]
-                        if product.barcode_ids
+                        if product_fragment(product)["barcodes"]
                         else []
                     )
 
@@ -1192,10 +1099,10 @@ class TransaccionDataPicking(http.Controller):
                                 "id_move": move["id"],
                                 "product_id": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for pack in product.packaging_ids
+                            for pack in product_fragment(product)["packagings"]
                             if pack.barcode
                         ]
-                        if product.packaging_ids
+                        if product_fragment(product)["packagings"]
                         else []
                     )
 
@@ -1273,7 +1180,9 @@ class TransaccionDataPicking(http.Controller):
                 if array_batch_temp["list_items"]:
                     array_batch.append(array_batch_temp)
 
-            return {"code": 200, "result": array_batch}
+            response = {"code": 200, "result": array_batch}
+            batch_cache.set(cache_key, response, tags=[("batch", batch_data["id"]) for batch_data in array_batch])
+            return response
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
@@ -1294,36 +1203,21 @@ class TransaccionDataPicking(http.Controller):
                 return {"code": 400, "msg": "Usuario no encontrado"}
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = get_settings().picking_strategy
 
             # ✅ Validar usuario WMS y sus zonas asignadas
             user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
 
-            if not user_wms or not user_wms.zone_ids:
-                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
+            # ✅ Obtener zonas y ubicaciones asignadas (en caché por usuario)
+            zone_ids, location_ids = get_user_zone_locations(user_wms)
 
-            # ✅ Obtener ubicaciones de las zonas asignadas
-            zone_locations = user_wms.zone_ids.sudo().read(["name", "warehouse_id", "location_ids"])
-
-            all_location_ids = []
-            for zone in zone_locations:
-                all_location_ids.extend(zone["location_ids"])
-
-            all_location_ids = list(set(all_location_ids))  # Eliminar duplicados
-
-            # ✅ Obtener ubicaciones por bloques para evitar sobrecarga
-            chunk_size = 100
-            locations = []
-            for i in range(0, len(all_location_ids), chunk_size):
-                chunk = all_location_ids[i : i + chunk_size]
-                locations.extend(
-                    request.env["stock.location"].sudo().browse(chunk).read(["id", "name", "complete_name"])
-                )
+            if not zone_ids:
+                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
 
-            if not locations:
+            if not location_ids:
                 return {"code": 400, "msg": "El usuario no tiene ubicaciones asociadas"}
 
-            user_location_ids = [location["id"] for location in locations]
+            user_location_ids = list(location_ids)
 
             # ✅ Obtener información del batch específico
             batch = request.env["stock.picking.batch"].sudo().browse(id_batch)
@@ -1381,8 +1275,8 @@ class TransaccionDataPicking(http.Controller):
 
                 # Obtener códigos de barras adicionales
                 array_all_barcode = []
-                if product.barcode_ids:
-                    for barcode in product.barcode_ids:
+                if product_fragment(product)["barcodes"]:
+                    for barcode in product_fragment(product)["barcodes"]:
                         if barcode.name:  # Verifica si el barcode es válido
                             array_all_barcode.append(
                                 {
@@ -1400,8 +1294,8 @@ class TransaccionDataPicking(http.Controller):
 
                 # Obtener empaques del producto
                 array_packing = []
-                if product.packaging_ids:
-                    for pack in product.packaging_ids:
+                if product_fragment(product)["packagings"]:
+                    for pack in product_fragment(product)["packagings"]:
                         if pack.barcode:  # Verifica si el barcode es válido
                             array_packing.append(
                                 {
@@ -1569,6 +1463,7 @@ class TransaccionDataPicking(http.Controller):
 
             # ✅ Actualizar tiempo total en el batch
             batch.write({"time_batch": total_time_formatted})
+            batch_cache.invalidate([("batch", batch.id)])
 
             if any("error" in result for result in array_result):
                 return {"code": 400, "result": array_result}
@@ -1577,6 +1472,8 @@ class TransaccionDataPicking(http.Controller):
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as err:
             if "unsupported XML-RPC protocol" in str(err):
                 return {"code": 400, "msg": "Indicar protocolo http o https de url_rpc"}
@@ -1584,6 +1481,8 @@ class TransaccionDataPicking(http.Controller):
     #         return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
     @http.route("/api/send_batch/2", auth="user", type="json", methods=["POST"])
+    @retry_on_concurrency
+    @idempotent
     def send_batch_2(self, **auth):
         try:
             # ✅ Usar savepoint para revertir todo si falla una validación de stock
@@ -1635,101 +1534,49 @@ class TransaccionDataPicking(http.Controller):
                         pickings_info[picking.id]["cantidad_reservada"] += ml.quantity
                     return list(pickings_info.values())
 
-                def validar_stock_disponible(
-                    product_id, location_id, cantidad_requerida, lote_id=None, allowed_pickings=None
-                ):
-                    """
-                    Valida stock.
-                    allowed_pickings: Lista de IDs de pickings del Batch actual.
-                    Si la reserva es de uno de estos pickings, se ignora (se considera disponible).
-                    """
-                    if allowed_pickings is None:
-                        allowed_pickings = []
-
-                    # 1. Stock Físico Total
-                    domain = [("product_id", "=", product_id), ("location_id", "=", location_id)]
-                    if lote_id:
-                        domain.append(("lot_id", "=", lote_id))
-
-                    quants = request.env["stock.quant"].sudo().search(domain)
-                    stock_total = sum(q.quantity for q in quants)
-
-                    # 2. Calcular Reservas
-                    domain_moves = [
-                        ("product_id", "=", product_id),
-                        ("location_id", "=", location_id),
-                        (
-                            "picking_id.state",
-                            "in",
-                            ["assigned", "confirmed", "waiting", "partially_available"],
-                        ),
-                    ]
-                    if lote_id:
-                        domain_moves.append(("lot_id", "=", lote_id))
-
-                    todas_move_lines = request.env["stock.move.line"].sudo().search(domain_moves)
-
-                    stock_reservado_mi_batch = 0
-                    stock_reservado_otros = 0
-                    ids_picking = []
-
-                    for ml in todas_move_lines:
-                        # ✅ LOGICA MAESTRA:
-                        # Si el picking dueño de la reserva está en mi lista de permitidos (mi batch),
-                        # entonces esa reserva es para mí.
-                        ids_picking.append(ml.picking_id.id)
-                        if ml.picking_id.id in allowed_pickings:
-                            stock_reservado_mi_batch += ml.quantity
-                        else:
-                            stock_reservado_otros += ml.quantity
-
-                    ids_picking = list(set(ids_picking))
-
-                    # Stock disponible = Físico - Reservas de TERCEROS
-                    # (No resto 'stock_reservado_mi_batch' porque esa reserva es justamente para consumir ahora)
-                    stock_disponible = stock_total - stock_reservado_otros
-
-                    return {
-                        "stock_disponible": stock_disponible,
-                        "stock_total": stock_total,
-                        "stock_reservado_otros": stock_reservado_otros,
-                        "stock_reservado_esta": stock_reservado_mi_batch,
-                        "es_suficiente": stock_disponible >= cantidad_requerida,
-                    }
-
                 # ==========================================
                 # PROCESAMIENTO
                 # ==========================================
 
                 array_result = []
 
-                for move_data in list_item:
-                    id_move = move_data.get("id_move")
-                    cantidad_enviada = float(move_data.get("cantidad", 0))
-                    novedad = move_data.get("novedad", "") or "Sin novedad"
-                    time_line = int(move_data.get("time_line", 0))
-                    muelle_id = move_data.get("muelle")
-                    id_operario = move_data.get("id_operario")
-                    fecha_transaccion = move_data.get("fecha_transaccion", "")
-
-                    # Buscar en modelo unificado
-                    move_unified = request.env["move.line.unified"].sudo().browse(id_move)
-                    if not move_unified.exists():
+                # ✅ Cargar todos los movimientos unificados enviados en una sola consulta
+                move_ids = [move_data.get("id_move") for move_data in list_item]
+                existing_move_ids = set(
+                    request.env["move.line.unified"]
+                    .sudo()
+                    .browse([id_move for id_move in move_ids if isinstance(id_move, int)])
+                    .exists()
+                    .ids
+                )
+                for id_move in move_ids:
+                    if id_move not in existing_move_ids:
                         return {"code": 400, "msg": f"No se encontró este id_move: {id_move}"}
 
+                moves_unified = request.env["move.line.unified"].sudo().browse(move_ids)
+
+                # --- INICIO VALIDACIÓN DE STOCK ---
+                # ✅ Todas las líneas se validan juntas; si alguna falla no se escribe ninguna
+                validaciones_stock = check_stock_availability(
+                    [
+                        {
+                            "key": index,
+                            "product_id": move_unified.product_id.id,
+                            "location_id": move_unified.location_id.id,
+                            "lot_id": move_unified.lot_id.id,
+                            "quantity": float(move_data.get("cantidad", 0)),
+                        }
+                        for index, (move_data, move_unified) in enumerate(zip(list_item, moves_unified))
+                    ],
+                    allowed_picking_ids=allowed_picking_ids,  # ✅ Enviamos la lista completa del batch
+                )
+
+                for index, move_unified in enumerate(moves_unified):
+                    validacion_stock = validaciones_stock[index]
                     location_origen = move_unified.location_id
                     product = move_unified.product_id
                     lote = move_unified.lot_id
 
-                    # --- INICIO VALIDACIÓN DE STOCK ---
-                    validacion_stock = validar_stock_disponible(
-                        product_id=product.id,
-                        location_id=location_origen.id,
-                        cantidad_requerida=cantidad_enviada,
-                        lote_id=lote.id if lote else None,
-                        allowed_pickings=allowed_picking_ids,  # ✅ Enviamos la lista completa del batch
-                    )
-
                     if not validacion_stock["es_suficiente"]:
                         transferencias_con_reservas = obtener_transferencias_con_reservas(
                             product_id=product.id,
@@ -1747,7 +1594,7 @@ class TransaccionDataPicking(http.Controller):
                         mensaje_error += (
                             f"Ubicación: {location_origen.complete_name or location_origen.display_name}\n"
                         )
-                        mensaje_error += f"Estado de Stock (Req. {cantidad_enviada})\n\n"
+                        mensaje_error += f"Estado de Stock (Req. {validacion_stock['cantidad_acumulada']})\n\n"
 
                         mensaje_error += f"Disponible: {validacion_stock['stock_disponible']}\n"
                         mensaje_error += f"* Inventario Teórico: {validacion_stock['stock_total']}\n"
@@ -1779,7 +1626,19 @@ class TransaccionDataPicking(http.Controller):
                             "tipo": "STOCK_INSUFICIENTE",
                             "msg": mensaje_error,
                         }
-                    # --- FIN VALIDACIÓN DE STOCK ---
+                # --- FIN VALIDACIÓN DE STOCK ---
+
+                for index, move_data in enumerate(list_item):
+                    id_move = move_data.get("id_move")
+                    cantidad_enviada = float(move_data.get("cantidad", 0))
+                    novedad = move_data.get("novedad", "") or "Sin novedad"
+                    time_line = int(move_data.get("time_line", 0))
+                    muelle_id = move_data.get("muelle")
+                    id_operario = move_data.get("id_operario")
+                    fecha_transaccion = move_data.get("fecha_transaccion", "")
+
+                    move_unified = moves_unified[index]
+                    product = move_unified.product_id
 
                     # Cálculos de tiempo
                     total_time += time_line
@@ -1827,13 +1686,16 @@ class TransaccionDataPicking(http.Controller):
                 total_time_float = total_hours + (total_minutes / 60) + (total_seconds / 3600)
 
                 batch.write({"time_batch": total_time_float})
+                batch_cache.invalidate([("batch", batch.id)])
 
                 return {"code": 200, "result": array_result}
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
+            return not_stored({"code": 400, "msg": f"Error inesperado: {str(err)}"})
 
     @http.route("/api/send_batch/componentes", auth="user", type="json", methods=["POST"])
     def send_batch_componentes(self, **auth):
@@ -1887,101 +1749,49 @@ class TransaccionDataPicking(http.Controller):
                         pickings_info[picking.id]["cantidad_reservada"] += ml.quantity
                     return list(pickings_info.values())
 
-                def validar_stock_disponible(
-                    product_id, location_id, cantidad_requerida, lote_id=None, allowed_pickings=None
-                ):
-                    """
-                    Valida stock.
-                    allowed_pickings: Lista de IDs de pickings del Batch actual.
-                    Si la reserva es de uno de estos pickings, se ignora (se considera disponible).
-                    """
-                    if allowed_pickings is None:
-                        allowed_pickings = []
-
-                    # 1. Stock Físico Total
-                    domain = [("product_id", "=", product_id), ("location_id", "=", location_id)]
-                    if lote_id:
-                        domain.append(("lot_id", "=", lote_id))
-
-                    quants = request.env["stock.quant"].sudo().search(domain)
-                    stock_total = sum(q.quantity for q in quants)
-
-                    # 2. Calcular Reservas
-                    domain_moves = [
-                        ("product_id", "=", product_id),
-                        ("location_id", "=", location_id),
-                        (
-                            "picking_id.state",
-                            "in",
-                            ["assigned", "confirmed", "waiting", "partially_available"],
-                        ),
-                    ]
-                    if lote_id:
-                        domain_moves.append(("lot_id", "=", lote_id))
-
-                    todas_move_lines = request.env["stock.move.line"].sudo().search(domain_moves)
-
-                    stock_reservado_mi_batch = 0
-                    stock_reservado_otros = 0
-                    ids_picking = []
-
-                    for ml in todas_move_lines:
-                        # ✅ LOGICA MAESTRA:
-                        # Si el picking dueño de la reserva está en mi lista de permitidos (mi batch),
-                        # entonces esa reserva es para mí.
-                        ids_picking.append(ml.picking_id.id)
-                        if ml.picking_id.id in allowed_pickings:
-                            stock_reservado_mi_batch += ml.quantity
-                        else:
-                            stock_reservado_otros += ml.quantity
-
-                    ids_picking = list(set(ids_picking))
-
-                    # Stock disponible = Físico - Reservas de TERCEROS
-                    # (No resto 'stock_reservado_mi_batch' porque esa reserva es justamente para consumir ahora)
-                    stock_disponible = stock_total - stock_reservado_otros
-
-                    return {
-                        "stock_disponible": stock_disponible,
-                        "stock_total": stock_total,
-                        "stock_reservado_otros": stock_reservado_otros,
-                        "stock_reservado_esta": stock_reservado_mi_batch,
-                        "es_suficiente": stock_disponible >= cantidad_requerida,
-                    }
-
                 # ==========================================
                 # PROCESAMIENTO
                 # ==========================================
 
                 array_result = []
 
-                for move_data in list_item:
-                    id_move = move_data.get("id_move")
-                    cantidad_enviada = float(move_data.get("cantidad", 0))
-                    novedad = move_data.get("novedad", "") or "Sin novedad"
-                    time_line = int(move_data.get("time_line", 0))
-                    muelle_id = move_data.get("muelle")
-                    id_operario = move_data.get("id_operario")
-                    fecha_transaccion = move_data.get("fecha_transaccion", "")
-
-                    # Buscar en modelo unificado
-                    move_unified = request.env["move.line.unified"].sudo().browse(id_move)
-                    if not move_unified.exists():
+                # ✅ Cargar todos los movimientos unificados enviados en una sola consulta
+                move_ids = [move_data.get("id_move") for move_data in list_item]
+                existing_move_ids = set(
+                    request.env["move.line.unified"]
+                    .sudo()
+                    .browse([id_move for id_move in move_ids if isinstance(id_move, int)])
+                    .exists()
+                    .ids
+                )
+                for id_move in move_ids:
+                    if id_move not in existing_move_ids:
                         return {"code": 400, "msg": f"No se encontró este id_move: {id_move}"}
 
+                moves_unified = request.env["move.line.unified"].sudo().browse(move_ids)
+
+                # --- INICIO VALIDACIÓN DE STOCK ---
+                # ✅ Todas las líneas se validan juntas; si alguna falla no se escribe ninguna
+                validaciones_stock = check_stock_availability(
+                    [
+                        {
+                            "key": index,
+                            "product_id": move_unified.product_id.id,
+                            "location_id": move_unified.location_id.id,
+                            "lot_id": move_unified.lot_id.id,
+                            "quantity": float(move_data.get("cantidad", 0)),
+                        }
+                        for index, (move_data, move_unified) in enumerate(zip(list_item, moves_unified))
+                    ],
+                    allowed_picking_ids=allowed_picking_ids,  # ✅ Enviamos la lista completa del batch
+                )
+
+                for index, move_unified in enumerate(moves_unified):
+                    validacion_stock = validaciones_stock[index]
                     location_origen = move_unified.location_id
                     product = move_unified.product_id
                     lote = move_unified.lot_id
 
-                    # --- INICIO VALIDACIÓN DE STOCK ---
-                    validacion_stock = validar_stock_disponible(
-                        product_id=product.id,
-                        location_id=location_origen.id,
-                        cantidad_requerida=cantidad_enviada,
-                        lote_id=lote.id if lote else None,
-                        allowed_pickings=allowed_picking_ids,  # ✅ Enviamos la lista completa del batch
-                    )
-
                     if not validacion_stock["es_suficiente"]:
                         transferencias_con_reservas = obtener_transferencias_con_reservas(
                             product_id=product.id,
@@ -1999,7 +1809,7 @@ class TransaccionDataPicking(http.Controller):
                         mensaje_error += (
                             f"Ubicación: {location_origen.complete_name or location_origen.display_name}\n"
                         )
-                        mensaje_error += f"Estado de Stock (Req. {cantidad_enviada})\n\n"
+                        mensaje_error += f"Estado de Stock (Req. {validacion_stock['cantidad_acumulada']})\n\n"
 
                         mensaje_error += f"Disponible: {validacion_stock['stock_disponible']}\n"
                         mensaje_error += f"* Inventario Teórico: {validacion_stock['stock_total']}\n"
@@ -2031,7 +1841,19 @@ class TransaccionDataPicking(http.Controller):
                             "tipo": "STOCK_INSUFICIENTE",
                             "msg": mensaje_error,
                         }
-                    # --- FIN VALIDACIÓN DE STOCK ---
+                # --- FIN VALIDACIÓN DE STOCK ---
+
+                for index, move_data in enumerate(list_item):
+                    id_move = move_data.get("id_move")
+                    cantidad_enviada = float(move_data.get("cantidad", 0))
+                    novedad = move_data.get("novedad", "") or "Sin novedad"
+                    time_line = int(move_data.get("time_line", 0))
+                    muelle_id = move_data.get("muelle")
+                    id_operario = move_data.get("id_operario")
+                    fecha_transaccion = move_data.get("fecha_transaccion", "")
+
+                    move_unified = moves_unified[index]
+                    product = move_unified.product_id
 
                     # Cálculos de tiempo
                     total_time += time_line
@@ -2079,6 +1901,7 @@ class TransaccionDataPicking(http.Controller):
                 total_time_float = total_hours + (total_minutes / 60) + (total_seconds / 3600)
 
                 batch.write({"time_batch": total_time_float})
+                batch_cache.invalidate([("batch", batch.id)])
 
                 return {"code": 200, "result": array_result}
 
@@ -2087,6 +1910,14 @@ class TransaccionDataPicking(http.Controller):
         except Exception as err:
             return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
+    ## GET Estadísticas de la caché de batches
+    @http.route("/api/batchs/cache_stats", auth="user", type="json", methods=["GET"])
+    def get_batches_cache_stats(self, **kwargs):
+        if not request.env.user.has_group("base.group_system"):
+            return {"code": 403, "msg": "Permisos insuficientes"}
+
+        return {"code": 200, "result": batch_cache.stats()}
+
     ## GET Transacciones batchs realizadas por usuario
     @http.route("/api/batchs_done", auth="user", type="json", methods=["GET"])
     def get_batches_done(self, **auth):
@@ -2102,48 +1933,21 @@ class TransaccionDataPicking(http.Controller):
             print(fecha_batch)
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = get_settings().picking_strategy
 
             # ✅ Validar usuario WMS y sus zonas asignadas
             user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
 
-            if not user_wms or not user_wms.zone_ids:
-                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
+            # ✅ Obtener zonas y ubicaciones asignadas (en caché por usuario)
+            zone_ids, location_ids = get_user_zone_locations(user_wms)
 
-            # ✅ Obtener ubicaciones de las zonas asignadas
-            all_location_ids = list(
-                {
-                    loc_id
-                    for zone in user_wms.zone_ids.sudo().read(["location_ids"])
-                    for loc_id in zone["location_ids"]
-                }
-            )
+            if not zone_ids:
+                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
 
-            if not all_location_ids:
+            if not location_ids:
                 return {"code": 400, "msg": "El usuario no tiene ubicaciones asociadas"}
 
-            # ✅ Obtener ubicaciones en bloques
-            chunk_size = 100
-            locations = []
-            for i in range(0, len(all_location_ids), chunk_size):
-                chunk = all_location_ids[i : i + chunk_size]
-                locations.extend(
-                    request.env["stock.location"]
-                    .sudo()
-                    .browse(chunk)
-                    .read(
-                        [
-                            "id",
-                            "name",
-                            "complete_name",
-                            "priority_picking",
-                            "barcode",
-                            "priority_picking_desplay",
-                        ]
-                    )
-                )
-
-            user_location_ids = [location["id"] for location in locations]
+            user_location_ids = list(location_ids)
 
             state_batch = ["done", "in_progress"]
 
@@ -2216,6 +2020,10 @@ class TransaccionDataPicking(http.Controller):
             return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
 
+register_journal_operation("send_batch", TransaccionDataPicking, "send_batch", "stock.picking.batch", "id_batch")
+register_journal_operation("send_batch_2", TransaccionDataPicking, "send_batch_2", "stock.picking.batch", "id_batch")
+
+
 def procesar_fecha_naive(fecha_transaccion, zona_horaria_cliente):
     if fecha_transaccion:
         # Convertir la fecha enviada a datetime y agregar la zona horaria del cliente
@@ -2231,26 +2039,3 @@ def procesar_fecha_naive(fecha_transaccion, zona_horaria_cliente):
     else:
         # Usar la fecha actual del servidor como naive datetime
         return datetime.now().replace(tzinfo=None)
-
-
-def validate_pda(device_id):
-    """
-    Solo valida que la PDA existe y está autorizada
-    Returns: dict con error si hay problema, None si todo está OK
-    """
-    if not device_id:
-        return {
-            "code": 400,
-            "msg": "Device ID no proporcionado, por favor actualizar a la ultima version de la app",
-        }
-
-    pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)])
-
-    if not pda:
-        return {"code": 404, "msg": "PDA no encontrado"}
-
-    if pda.is_authorized == "no":
-        return {"code": 403, "msg": "PDA no autorizado"}
-
-    # Si llegamos aquí, todo está bien
-    return None
@@ -5,65 +5,21 @@ from odoo import http
 from odoo.exceptions import AccessError
 from odoo.http import request
 
-from .utils import get_barcodes, get_packagings
+from . import app_version
+from .delta_sync import parse_sync_params
+from .pda_auth import validate_pda
+from .settings_snapshot import get_settings
+from .user_locations import get_user_zone_locations
+from .utils import get_barcodes, get_packagings, prefetch_products, product_fragment
 
 
 class TransaccionProduccionController(http.Controller):
-    def get_last_version(self):
-        try:
-            # Obtener la última versión
-            last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
-
-            if not last_version:
-                return {"code": 404, "msg": "No se encontró ninguna versión"}
-
-            # Convertir el texto JSON a una lista Python
-            notes_list = []
-            if last_version.notes:
-                try:
-                    notes_list = json.loads(last_version.notes)
-                except:
-                    notes_list = ["Error al procesar las notas"]
-
-            return {
-                "code": 200,
-                "result": {
-                    "id": last_version.id,
-                    "version": last_version.version,
-                    "release_date": str(last_version.release_date),
-                    "notes": notes_list,  # Ahora devuelve la lista en lugar del string JSON
-                    "url_download": last_version.url_download,
-                },
-            }
-
-        except AccessError as e:
-            return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
-        except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
-
     @http.route("/api/picking/componentes", auth="user", type="json", methods=["GET"])
     def get_componentes(self, **kwargs):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -75,7 +31,7 @@ class TransaccionProduccionController(http.Controller):
             if validation_error:
                 return validation_error
 
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = get_settings().picking_strategy
 
             array_transferencias = []
 
@@ -195,7 +151,7 @@ class TransaccionProduccionController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "id_product": product.id or 0,
                                 }
-                                for barcode in product.barcode_ids
+                                for barcode in product_fragment(product)["barcodes"]
                                 if barcode.name
                             ]
                             if hasattr(product, "barcode_ids")
@@ -212,10 +168,10 @@ class TransaccionProduccionController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "product_id": move["product_id"][0] if move["product_id"] else 0,
                                 }
-                                for pack in product.packaging_ids
+                                for pack in product_fragment(product)["packagings"]
                                 if pack.barcode
                             ]
-                            if product.packaging_ids
+                            if product_fragment(product)["packagings"]
                             else []
                         )
 
@@ -243,11 +199,11 @@ class TransaccionProduccionController(http.Controller):
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                 ],
                                 "quantity": quantity_done,
                                 "quantity_to_transfer": quantity_ordered,
@@ -326,11 +282,11 @@ class TransaccionProduccionController(http.Controller):
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -409,7 +365,11 @@ class TransaccionProduccionController(http.Controller):
             if validation_error:
                 return validation_error
 
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            sync = parse_sync_params(kwargs)
+            if isinstance(sync, dict):
+                return sync
+
+            picking_strategy = get_settings().picking_strategy
 
             array_transferencias = []
 
@@ -418,18 +378,18 @@ class TransaccionProduccionController(http.Controller):
                 return allowed_warehouses
 
             for warehouse in allowed_warehouses:
-                transferencias_pendientes = (
-                    request.env["stock.picking"]
-                    .sudo()
-                    .search(
-                        [
-                            ("state", "in", ["assigned", "confirmed"]),
-                            ("picking_type_code", "=", "internal"),
-                            ("picking_type_id.warehouse_id", "=", warehouse.id),
-                            ("picking_type_id.sequence_code", "in", ["PC"]),
-                            ("responsable_id", "in", [user.id, False]),
-                        ]
-                    )
+                transferencias_pendientes = sync.search(
+                    warehouse.id,
+                    request.env["stock.picking"].sudo(),
+                    [
+                        ("state", "in", ["assigned", "confirmed"]),
+                        ("picking_type_code", "=", "internal"),
+                        ("picking_type_id.warehouse_id", "=", warehouse.id),
+                        ("picking_type_id.sequence_code", "in", ["PC"]),
+                        ("responsable_id", "in", [user.id, False]),
+                    ],
+                    lines_field="move_line_ids",
+                    volatile_fields=("state", "responsable_id"),
                 )
 
                 for picking in transferencias_pendientes:
@@ -522,7 +482,7 @@ class TransaccionProduccionController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "id_product": product.id or 0,
                                 }
-                                for barcode in product.barcode_ids
+                                for barcode in product_fragment(product)["barcodes"]
                                 if barcode.name
                             ]
                             if hasattr(product, "barcode_ids")
@@ -539,10 +499,10 @@ class TransaccionProduccionController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "product_id": move["product_id"][0] if move["product_id"] else 0,
                                 }
-                                for pack in product.packaging_ids
+                                for pack in product_fragment(product)["packagings"]
                                 if pack.barcode
                             ]
-                            if product.packaging_ids
+                            if product_fragment(product)["packagings"]
                             else []
                         )
 
@@ -567,11 +527,11 @@ class TransaccionProduccionController(http.Controller):
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                 ],
                                 "quantity": quantity_done,
                                 "quantity_to_transfer": quantity_ordered,
@@ -649,11 +609,11 @@ class TransaccionProduccionController(http.Controller):
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -710,7 +670,7 @@ class TransaccionProduccionController(http.Controller):
                     if transferencia_info["lineas_transferencia"]:
                         array_transferencias.append(transferencia_info)
 
-            return {"code": 200, "result": array_transferencias}
+            return {"code": 200, "result": array_transferencias, **sync.meta(item["id"] for item in array_transferencias)}
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
@@ -722,24 +682,7 @@ class TransaccionProduccionController(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -848,11 +791,11 @@ class TransaccionProduccionController(http.Controller):
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                 ],
                                 "quantity_ordered": quantity_ordered,
                                 "quantity_to_transfer": quantity_ordered,
@@ -922,11 +865,11 @@ class TransaccionProduccionController(http.Controller):
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity_ordered": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -1090,11 +1033,11 @@ class TransaccionProduccionController(http.Controller):
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                 ],
                                 "quantity_ordered": quantity_ordered,
                                 "quantity_to_transfer": quantity_ordered,
@@ -1164,11 +1107,11 @@ class TransaccionProduccionController(http.Controller):
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity_ordered": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -1325,24 +1268,7 @@ class TransaccionProduccionController(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -1356,55 +1282,29 @@ class TransaccionProduccionController(http.Controller):
                 return validation_error
 
             # obtener la configuracion picking de la app
-            config_picking = request.env["picking.config.general"].sudo().browse(1)
+            settings = get_settings()
+            config_picking = settings.picking_config
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = settings.picking_strategy
 
             # ✅ Validar usuario WMS y sus zonas asignadas
             user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
 
-            if not user_wms or not user_wms.zone_ids:
-                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
+            # ✅ Obtener zonas y ubicaciones asignadas (en caché por usuario)
+            zone_ids, location_ids = get_user_zone_locations(user_wms)
 
-            # ✅ Obtener ubicaciones de las zonas asignadas
-            all_location_ids = list(
-                {
-                    loc_id
-                    for zone in user_wms.zone_ids.sudo().read(["location_ids"])
-                    for loc_id in zone["location_ids"]
-                }
-            )
+            if not zone_ids:
+                return {"code": 400, "msg": "El usuario no tiene zonas asignadas"}
 
-            if not all_location_ids:
+            if not location_ids:
                 return {
                     "code": 400,
                     "update_version": update_required,
                     "msg": "El usuario no tiene ubicaciones asociadas",
                 }
 
-            # ✅ Obtener ubicaciones en bloques
-            chunk_size = 100
-            locations = []
-            for i in range(0, len(all_location_ids), chunk_size):
-                chunk = all_location_ids[i : i + chunk_size]
-                locations.extend(
-                    request.env["stock.location"]
-                    .sudo()
-                    .browse(chunk)
-                    .read(
-                        [
-                            "id",
-                            "name",
-                            "complete_name",
-                            "priority_picking",
-                            "barcode",
-                            "priority_picking_desplay",
-                        ]
-                    )
-                )
-
-            user_location_ids = [location["id"] for location in locations]
+            user_location_ids = list(location_ids)
 
             search_domain = [
                 ("state", "=", "in_progress"),
@@ -1500,6 +1400,7 @@ class TransaccionProduccionController(http.Controller):
                 products = {
                     prod.id: prod for prod in request.env["product.product"].sudo().browse(product_ids)
                 }
+                prefetch_products(request.env["product.product"].sudo().browse(product_ids))
 
                 location_ids = {move["location_id"][0] for move in stock_moves}
                 locations_dict = {
@@ -1525,10 +1426,10 @@ class TransaccionProduccionController(http.Controller):
                                 "cantidad": 1,
                                 "id_product": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for barcode in product.barcode_ids
+                            for barcode in product_fragment(product)["barcodes"]
                             if barcode.name  # Filtra solo los barcodes válidos
                         ]
-                        if product.barcode_ids
+                        if product_fragment(product)["barcodes"]
                         else []
                     )
 
@@ -1542,10 +1443,10 @@ class TransaccionProduccionController(http.Controller):
                                 "id_move": move["id"],
                                 "product_id": move["product_id"][0] if move["product_id"] else 0,
                             }
-                            for pack in product.packaging_ids
+                            for pack in product_fragment(product)["packagings"]
                             if pack.barcode
                         ]
-                        if product.packaging_ids
+                        if product_fragment(product)["packagings"]
                         else []
                     )
 
@@ -1678,26 +1579,3 @@ def obtener_almacenes_usuario(user):
         return {"code": 400, "msg": "El usuario no tiene acceso a ningún almacén"}
 
     return allowed_warehouses
-
-
-def validate_pda(device_id):
-    """
-    Solo valida que la PDA existe y está autorizada
-    Returns: dict con error si hay problema, None si todo está OK
-    """
-    if not device_id:
-        return {
-            "code": 400,
-            "msg": "Device ID no proporcionado, por favor actualizar a la ultima version de la app",
-        }
-
-    pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)])
-
-    if not pda:
-        return {"code": 404, "msg": "PDA no encontrado"}
-
-    if pda.is_authorized == "no":
-        return {"code": 403, "msg": "PDA no autorizado"}
-
-    # Si llegamos aquí, todo está bien
-    return None
@@ -7,68 +7,31 @@ import pytz
 from datetime import date
 import base64
 import logging
-from .utils import get_barcodes, get_packagings
+from . import app_version
+from .db_retry import CONCURRENCY_ERRORS
+from .delta_sync import parse_sync_params
+from .etag import check_etag
+from .idempotency import idempotent, not_stored
+from .offline_journal import register_journal_operation
+from .ndjson_stream import iter_records, ndjson_response
+from .pda_auth import validate_pda
+from .settings_snapshot import get_settings
+from .utils import FieldSelector, ProductCatalog, get_barcodes, get_packagings, prefetch_products, product_fragment
+from .validation_jobs import async_requested, enqueue_validation, register_job_handler
 
 
+# Listas anidadas de los serializadores con selección de campos (fields=)
+RECEPCION_V2_CONTAINERS = {"lineas_recepcion": {}, "lineas_recepcion_enviadas": {}}
 
-class TransaccionRecepcionController(http.Controller):
-
-    def get_last_version(self):
-        try:
-            # Obtener la última versión
-            last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
-
-            if not last_version:
-                return {"code": 404, "msg": "No se encontró ninguna versión"}
-
-            # Convertir el texto JSON a una lista Python
-            notes_list = []
-            if last_version.notes:
-                try:
-                    notes_list = json.loads(last_version.notes)
-                except:
-                    notes_list = ["Error al procesar las notas"]
-
-            return {
-                "code": 200,
-                "result": {
-                    "id": last_version.id,
-                    "version": last_version.version,
-                    "release_date": str(last_version.release_date),
-                    "notes": notes_list,  # Ahora devuelve la lista en lugar del string JSON
-                    "url_download": last_version.url_download,
-                },
-            }
 
-        except AccessError as e:
-            return {"code": 403, "msg": "Acceso denegado: {}".format(str(e))}
-        except Exception as err:
-            return {"code": 400, "msg": "Error inesperado: {}".format(str(err))}
+class TransaccionRecepcionController(http.Controller):
 
-    # GET OBTENER LAS RECEPCIONES PENDIENTES
     @http.route("/api/recepciones", auth="user", type="json", methods=["GET"])
     def get_recepciones(self, **kwargs):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -101,28 +64,36 @@ class TransaccionRecepcionController(http.Controller):
             # consigna_habilitada = config.group_stock_tracking_owner
             consigna_habilitada = user.has_group('stock.group_tracking_owner')
 
-            # ✅ Obtener recepciones pendientes directamente de los almacenes permitidos
-            for warehouse in allowed_warehouses:
-                # Buscar todas las recepciones pendientes (no completadas ni canceladas) para este almacén
-                recepciones_pendientes = (
-                    request.env["stock.picking"]
-                    .sudo()
-                    .search(
-                        [
-                            ("state", "in", ["assigned", "confirmed"]),
-                            ("picking_type_code", "=", "incoming"),
-                            ("picking_type_id.warehouse_id", "=", warehouse.id),
-                            ("picking_type_id.sequence_code", "in", ["IN", "EE", "TRE"]),
-                            # ("is_return_picking", "=", False),
-                            # ("user_id", "in", [user.id, False]),  # Asignadas al usuario o sin asignar
-                            (
-                                "responsable_id",
-                                "in",
-                                [user.id, False],
-                            ),  # Asignadas al usuario o sin asignar
-                        ]
-                    )
+            # ✅ Obtener recepciones pendientes de todos los almacenes permitidos con una sola búsqueda
+            # (no completadas ni canceladas)
+            recepciones_pendientes = (
+                request.env["stock.picking"]
+                .sudo()
+                .search(
+                    [
+                        ("state", "in", ["assigned", "confirmed"]),
+                        ("picking_type_code", "=", "incoming"),
+                        ("picking_type_id.warehouse_id", "in", allowed_warehouses.ids),
+                        ("picking_type_id.sequence_code", "in", ["IN", "EE", "TRE"]),
+                        # ("is_return_picking", "=", False),
+                        # ("user_id", "in", [user.id, False]),  # Asignadas al usuario o sin asignar
+                        (
+                            "responsable_id",
+                            "in",
+                            [user.id, False],
+                        ),  # Asignadas al usuario o sin asignar
+                    ]
                 )
+            )
+            recepciones_por_almacen = agrupar_por_almacen(recepciones_pendientes)
+
+            # Datos que antes se consultaban recepción por recepción, cargados en lote
+            ordenes_compra = ordenes_compra_por_origen(recepciones_pendientes)
+            vencimientos = vencimientos_por_producto(recepciones_pendientes.move_ids.product_id)
+            prefetch_products(recepciones_pendientes.move_ids.product_id)
+
+            for warehouse in allowed_warehouses:
+                recepciones_pendientes = recepciones_por_almacen.get(warehouse.id, [])
 
                 for picking in recepciones_pendientes:
                     # Verificar si hay movimientos pendientes
@@ -142,12 +113,7 @@ class TransaccionRecepcionController(http.Controller):
                     )
 
                     # Obtener la orden de compra relacionada (si existe)
-                    purchase_order = picking.purchase_id or (
-                        picking.origin
-                        and request.env["purchase.order"]
-                        .sudo()
-                        .search([("name", "=", picking.origin)], limit=1)
-                    )
+                    purchase_order = picking.purchase_id or ordenes_compra.get(picking.origin)
 
                     # Calcular peso total - cambiando product_qty por product_uom_qty
                     peso_total = sum(
@@ -171,10 +137,7 @@ class TransaccionRecepcionController(http.Controller):
                     owner_id = picking.owner_id.id if hasattr(picking, "owner_id") and picking.owner_id else 0
 
                     # Obtener el nombre del propietario (si existe el ID)
-                    propietario_nombre = ""
-                    if owner_id:
-                        partner = request.env["res.partner"].sudo().browse(owner_id)
-                        propietario_nombre = partner.name if partner else ""
+                    propietario_nombre = (picking.owner_id.name or "") if owner_id else ""
 
                     recepcion_info = {
                         "id": picking.id,
@@ -269,7 +232,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name
                                 ]
 
@@ -284,20 +247,12 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
 
                             # obtener la fecha de vencimiento del producto pero la que esta mas cerca a vencer
-                            fecha_vencimiento = ""
-                            if product.tracking == "lot":
-                                lot = request.env["stock.lot"].search(
-                                    [("product_id", "=", product.id)],
-                                    order="expiration_date asc",
-                                    limit=1,
-                                )
-                                if lot and hasattr(lot, "expiration_date"):
-                                    fecha_vencimiento = lot.expiration_date
+                            fecha_vencimiento = vencimientos.get(product.id, "")
 
                             # Generar información de la línea de recepción
                             linea_info = {
@@ -351,7 +306,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name
                                 ]
 
@@ -366,20 +321,12 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
 
                             # obtener la fecha de vencimiento del producto pero la que esta mas cerca a vencer
-                            fecha_vencimiento = ""
-                            if product.tracking == "lot":
-                                lot = request.env["stock.lot"].search(
-                                    [("product_id", "=", product.id)],
-                                    order="expiration_date asc",
-                                    limit=1,
-                                )
-                                if lot and hasattr(lot, "expiration_date"):
-                                    fecha_vencimiento = lot.expiration_date
+                            fecha_vencimiento = vencimientos.get(product.id, "")
 
                             # Generar información de la línea de recepción
                             linea_info = {
@@ -563,6 +510,15 @@ class TransaccionRecepcionController(http.Controller):
             if validation_error:
                 return validation_error
 
+            sync = parse_sync_params(kwargs)
+            if isinstance(sync, dict):
+                return sync
+
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            lineas_filter = fields_filter.child("lineas_recepcion", exclude=catalog.line_keys)
+            enviadas_filter = fields_filter.child("lineas_recepcion_enviadas", exclude=catalog.line_keys)
+
             array_recepciones = []
 
             base_url = request.httprequest.host_url.rstrip("/")
@@ -575,31 +531,38 @@ class TransaccionRecepcionController(http.Controller):
                 return allowed_warehouses  # Devolver el error directamente
 
             # Obtener la configuración actual
-            config = request.env["res.config.settings"].sudo().create({})
-            consigna_habilitada = config.group_stock_tracking_owner
+            consigna_habilitada = get_settings().tracking_owner
+
+            # ✅ Obtener recepciones pendientes de todos los almacenes permitidos con una sola búsqueda
+            # (no completadas ni canceladas)
+            recepciones_pendientes = sync.search(
+                0,
+                request.env["stock.picking"].sudo(),
+                [
+                    ("state", "in", ["assigned", "confirmed"]),
+                    ("picking_type_code", "=", "incoming"),
+                    ("picking_type_id.warehouse_id", "in", allowed_warehouses.ids),
+                    ("picking_type_id.sequence_code", "in", ["IN", "EE"]),
+                    # ("is_return_picking", "=", False),
+                    # ("user_id", "in", [user.id, False]),  # Asignadas al usuario o sin asignar
+                    (
+                        "responsable_id",
+                        "in",
+                        [user.id, False],
+                    ),  # Asignadas al usuario o sin asignar
+                ],
+                lines_field="move_ids",
+                volatile_fields=("state", "responsable_id"),
+            )
+            recepciones_por_almacen = agrupar_por_almacen(recepciones_pendientes)
+
+            # Datos que antes se consultaban recepción por recepción, cargados en lote
+            ordenes_compra = ordenes_compra_por_origen(recepciones_pendientes)
+            vencimientos = vencimientos_por_producto(recepciones_pendientes.move_ids.product_id)
+            prefetch_products(recepciones_pendientes.move_ids.product_id)
 
-            # ✅ Obtener recepciones pendientes directamente de los almacenes permitidos
             for warehouse in allowed_warehouses:
-                # Buscar todas las recepciones pendientes (no completadas ni canceladas) para este almacén
-                recepciones_pendientes = (
-                    request.env["stock.picking"]
-                    .sudo()
-                    .search(
-                        [
-                            ("state", "in", ["assigned", "confirmed"]),
-                            ("picking_type_code", "=", "incoming"),
-                            ("picking_type_id.warehouse_id", "=", warehouse.id),
-                            ("picking_type_id.sequence_code", "in", ["IN", "EE"]),
-                            # ("is_return_picking", "=", False),
-                            # ("user_id", "in", [user.id, False]),  # Asignadas al usuario o sin asignar
-                            (
-                                "responsable_id",
-                                "in",
-                                [user.id, False],
-                            ),  # Asignadas al usuario o sin asignar
-                        ]
-                    )
-                )
+                recepciones_pendientes = recepciones_por_almacen.get(warehouse.id, [])
 
                 for picking in recepciones_pendientes:
                     # Verificar si hay movimientos pendientes
@@ -619,12 +582,7 @@ class TransaccionRecepcionController(http.Controller):
                     )
 
                     # Obtener la orden de compra relacionada (si existe)
-                    purchase_order = picking.purchase_id or (
-                        picking.origin
-                        and request.env["purchase.order"]
-                        .sudo()
-                        .search([("name", "=", picking.origin)], limit=1)
-                    )
+                    purchase_order = picking.purchase_id or ordenes_compra.get(picking.origin)
 
                     # Calcular peso total - cambiando product_qty por product_uom_qty
                     peso_total = sum(
@@ -648,58 +606,58 @@ class TransaccionRecepcionController(http.Controller):
                     owner_id = picking.owner_id.id if hasattr(picking, "owner_id") and picking.owner_id else 0
 
                     # Obtener el nombre del propietario (si existe el ID)
-                    propietario_nombre = ""
-                    if owner_id:
-                        partner = request.env["res.partner"].sudo().browse(owner_id)
-                        propietario_nombre = partner.name if partner else ""
+                    propietario_nombre = (picking.owner_id.name or "") if owner_id else ""
 
-                    recepcion_info = {
-                        "id": picking.id,
-                        "name": picking.name,  # Nombre de la recepción
-                        "fecha_creacion": picking.create_date,  # Fecha con hora
-                        "proveedor_id": picking.partner_id.id or 0,
-                        "proveedor": picking.partner_id.name or "",
-                        "location_dest_id": picking.location_dest_id.id or "",
-                        "location_dest_name": picking.location_dest_id.display_name or "",
-                        "purchase_order_id": purchase_order.id if purchase_order else 0,
-                        "purchase_order_name": (
-                            purchase_order.name if purchase_order else ""
-                        ),  # Orden de compra
-                        "numero_entrada": picking.name or "",  # Número de entrada
-                        "peso_total": peso_total,  # Peso total
-                        "numero_lineas": len(picking.move_ids),  # Número de líneas (productos)
-                        "numero_items": numero_items,  # Número de ítems (cantidades)
-                        "state": picking.state,
-                        "create_backorder": create_backorder,
-                        "origin": picking.origin or "",
-                        "priority": picking.priority,
-                        "warehouse_id": warehouse.id,
-                        "warehouse_name": warehouse.name,
-                        "location_id": picking.location_id.id,
-                        "location_name": picking.location_id.display_name,
-                        "responsable_id": (picking.responsable_id.id if picking.responsable_id else 0),
-                        "responsable": (picking.responsable_id.name if picking.responsable_id else ""),
-                        "picking_type": picking.picking_type_id.name,
-                        "backorder_id": picking.backorder_id.id if picking.backorder_id else 0,
-                        "backorder_name": (
-                            picking.backorder_id.name if picking.backorder_id else ""
-                        ),  # Nombre del backorder
-                        # Verificar si los campos personalizados existen
-                        "start_time_reception": picking.start_time_reception or "",
-                        "end_time_reception": picking.end_time_reception or "",
-                        "picking_type_code": picking.picking_type_code,
-                        "show_check_availability": (
-                            picking.show_check_availability
-                            if hasattr(picking, "show_check_availability")
-                            else False
-                        ),
-                        "maneja_temperatura": manejo_temperatura,
-                        "temperatura": (picking.temperature if hasattr(picking, "temperature") else 0),
-                        "manejo_propetario": consigna_habilitada,
-                        "propetario": propietario_nombre,
-                        "lineas_recepcion": [],
-                        "lineas_recepcion_enviadas": [],
-                    }
+                    recepcion_info = fields_filter.build(
+                        {
+                            "id": picking.id,
+                            "name": picking.name,  # Nombre de la recepción
+                            "fecha_creacion": picking.create_date,  # Fecha con hora
+                            "proveedor_id": lambda: picking.partner_id.id or 0,
+                            "proveedor": lambda: picking.partner_id.name or "",
+                            "location_dest_id": lambda: picking.location_dest_id.id or "",
+                            "location_dest_name": lambda: picking.location_dest_id.display_name or "",
+                            "purchase_order_id": lambda: purchase_order.id if purchase_order else 0,
+                            "purchase_order_name": (
+                                lambda: purchase_order.name if purchase_order else ""
+                            ),  # Orden de compra
+                            "numero_entrada": lambda: picking.name or "",  # Número de entrada
+                            "peso_total": peso_total,  # Peso total
+                            "numero_lineas": lambda: len(picking.move_ids),  # Número de líneas (productos)
+                            "numero_items": numero_items,  # Número de ítems (cantidades)
+                            "state": picking.state,
+                            "create_backorder": create_backorder,
+                            "origin": lambda: picking.origin or "",
+                            "priority": picking.priority,
+                            "warehouse_id": warehouse.id,
+                            "warehouse_name": warehouse.name,
+                            "location_id": lambda: picking.location_id.id,
+                            "location_name": lambda: picking.location_id.display_name,
+                            "responsable_id": (lambda: picking.responsable_id.id if picking.responsable_id else 0),
+                            "responsable": (lambda: picking.responsable_id.name if picking.responsable_id else ""),
+                            "picking_type": lambda: picking.picking_type_id.name,
+                            "backorder_id": lambda: picking.backorder_id.id if picking.backorder_id else 0,
+                            "backorder_name": (
+                                lambda: picking.backorder_id.name if picking.backorder_id else ""
+                            ),  # Nombre del backorder
+                            # Verificar si los campos personalizados existen
+                            "start_time_reception": lambda: picking.start_time_reception or "",
+                            "end_time_reception": lambda: picking.end_time_reception or "",
+                            "picking_type_code": picking.picking_type_code,
+                            "show_check_availability": (
+                                lambda: picking.show_check_availability
+                                if hasattr(picking, "show_check_availability")
+                                else False
+                            ),
+                            "maneja_temperatura": manejo_temperatura,
+                            "temperatura": (lambda: picking.temperature if hasattr(picking, "temperature") else 0),
+                            "manejo_propetario": consigna_habilitada,
+                            "propetario": propietario_nombre,
+                            "lineas_recepcion": [],
+                            "lineas_recepcion_enviadas": [],
+                        },
+                        RECEPCION_V2_CONTAINERS,
+                    )
 
                     # ✅ Procesar solo las líneas pendientes
                     for move in movimientos_pendientes:
@@ -746,13 +704,13 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name
                                 ]
 
                             # Obtener empaques del producto
                             array_packing = []
-                            if hasattr(product, "packaging_ids"):
+                            if lineas_filter.wants("product_packing") and hasattr(product, "packaging_ids"):
                                 array_packing = [
                                     {
                                         "barcode": pack.barcode,
@@ -761,208 +719,204 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
 
                             # obtener la fecha de vencimiento del producto pero la que esta mas cerca a vencer
-                            fecha_vencimiento = ""
-                            if product.tracking == "lot":
-                                lot = request.env["stock.lot"].search(
-                                    [("product_id", "=", product.id)],
-                                    order="expiration_date asc",
-                                    limit=1,
-                                )
-                                if lot and hasattr(lot, "expiration_date"):
-                                    fecha_vencimiento = lot.expiration_date
-
-                            # Generar información de la línea de recepción
-                            linea_info = {
-                                "id": move.id,
-                                "id_move": move.id,
-                                "id_recepcion": picking.id,
-                                "state": move.state,
-                                "product_id": product.id,
-                                "product_name": product.display_name,
-                                "product_code": product.default_code or "",
-                                "product_barcode": product.barcode or "",
-                                "product_tracking": product.tracking or "",
-                                "fecha_vencimiento": fecha_vencimiento or "",
-                                "dias_vencimiento": (
-                                    product.expiration_time if hasattr(product, "expiration_time") else ""
-                                ),
-                                "other_barcodes": get_barcodes(product, move.id, picking.id),
-                                "product_packing": array_packing,
-                                "quantity_ordered": (
-                                    purchase_line.product_uom_qty if purchase_line else move.product_uom_qty
-                                ),
-                                "quantity_to_receive": move.product_uom_qty,
-                                # "quantity_done": move.quantity,
-                                "uom": move.product_uom.name if move.product_uom else "UND",
-                                "location_dest_id": move.location_dest_id.id or 0,
-                                "location_dest_name": move.location_dest_id.display_name or "",
-                                "location_dest_barcode": move.location_dest_id.barcode or "",
-                                "location_id": move.location_id.id or 0,
-                                "location_name": move.location_id.display_name or "",
-                                "location_barcode": move.location_id.barcode or "",
-                                "weight": product.weight or 0,
-                                "cantidad_faltante": cantidad_faltante,
-                                "maneja_temperatura": maneja_temperatura,
-                                "temperatura": temperatura,
-                                # "imagen": imagen,
-                            }
+                            fecha_vencimiento = vencimientos.get(product.id, "")
 
-                            recepcion_info["lineas_recepcion"].append(linea_info)
-
-                        # necesito que se valide que si en move_line_ids no hay novedades diferentes a Sin novedad o diferente a vacio. Por ejemplo si la novedad es diferente a "Sin novedad" o está vacía, entonces se debe considerar como una línea pendiente.
-                        elif cantidad_faltante > 0 and not novedad_bloqueante:
-                            # Obtener códigos de barras adicionales
-                            array_barcodes = []
-                            if hasattr(product, "barcode_ids"):
-                                array_barcodes = [
-                                    {
-                                        "barcode": barcode.name,
-                                        "id_move": move.id,
-                                        "id_product": product.id,
-                                        "batch_id": picking.id,
-                                    }
-                                    for barcode in product.barcode_ids
-                                    if barcode.name
-                                ]
-
-                            # Obtener empaques del producto
-                            array_packing = []
-                            if hasattr(product, "packaging_ids"):
-                                array_packing = [
-                                    {
-                                        "barcode": pack.barcode,
-                                        "cantidad": pack.qty,
-                                        "id_move": move.id,
-                                        "id_product": product.id,
-                                        "batch_id": picking.id,
-                                    }
-                                    for pack in product.packaging_ids
-                                    if pack.barcode
-                                ]
-
-                            # obtener la fecha de vencimiento del producto pero la que esta mas cerca a vencer
-                            fecha_vencimiento = ""
-                            if product.tracking == "lot":
-                                lot = request.env["stock.lot"].search(
-                                    [("product_id", "=", product.id)],
-                                    order="expiration_date asc",
-                                    limit=1,
-                                )
-                                if lot and hasattr(lot, "expiration_date"):
-                                    fecha_vencimiento = lot.expiration_date
+                            catalog.add(product)
 
                             # Generar información de la línea de recepción
-                            linea_info = {
-                                "id": move.id,
-                                "id_move": move.id,
-                                "id_recepcion": picking.id,
-                                "state": move.state,
-                                "product_id": product.id,
-                                "product_name": product.display_name,
-                                "product_code": product.default_code or "",
-                                "product_barcode": product.barcode or "",
-                                "product_tracking": product.tracking or "",
-                                "fecha_vencimiento": fecha_vencimiento or "",
-                                "dias_vencimiento": (
-                                    product.expiration_time if hasattr(product, "expiration_time") else ""
-                                ),
-                                "other_barcodes": get_barcodes(product, move.id, picking.id),
-                                "product_packing": array_packing,
-                                "quantity_ordered": (
-                                    purchase_line.product_uom_qty if purchase_line else move.product_uom_qty
-                                ),
-                                "quantity_to_receive": move.product_uom_qty,
-                                # "quantity_done": move.quantity,
-                                "uom": move.product_uom.name if move.product_uom else "UND",
-                                "location_dest_id": move.location_dest_id.id or 0,
-                                "location_dest_name": move.location_dest_id.display_name or "",
-                                "location_dest_barcode": move.location_dest_id.barcode or "",
-                                "location_id": move.location_id.id or 0,
-                                "location_name": move.location_id.display_name or "",
-                                "location_barcode": move.location_id.barcode or "",
-                                "weight": product.weight or 0,
-                                "cantidad_faltante": cantidad_faltante,
-                                "maneja_temperatura": maneja_temperatura,
-                                "temperatura": temperatura,
-                                # "imagen": imagen,
-                            }
-
-                            recepcion_info["lineas_recepcion"].append(linea_info)
-
-                        # ✅ Agregar las líneas de move_line que tengan is_done_item en True
-                        # Verificación para campos personalizados
-
-                        move_lines_done = move.move_line_ids.filtered(lambda ml: ml.is_done_item)
-                        for move_line in move_lines_done:
-                            cantidad_faltante = move.product_uom_qty - move_line.quantity
-
-                            # Crear información de la línea enviada
-                            linea_enviada_info = {
-                                "id": move_line.id,
-                                "id_move_line": move_line.id,
-                                "id_move": move_line.id,
-                                # "id_move": move.id,
-                                "state": move_line.state,
-                                "id_recepcion": picking.id,
-                                "product_id": product.id,
-                                "product_name": product.display_name,
-                                "product_code": product.default_code or "",
-                                "product_barcode": product.barcode or "",
-                                "product_tracking": product.tracking or "",
-                                "quantity_ordered": (
-                                    purchase_line.product_uom_qty if purchase_line else move.product_uom_qty
-                                ),
-                                "quantity_to_receive": move.product_uom_qty,
-                                "quantity_done": move_line.quantity,
-                                "cantidad_faltante": cantidad_faltante,
-                                "uom": (move_line.product_uom_id.name if move_line.product_uom_id else "UND"),
-                                "location_dest_id": move_line.location_dest_id.id or 0,
-                                "location_dest_name": move_line.location_dest_id.display_name or "",
-                                "location_dest_barcode": move_line.location_dest_id.barcode or "",
-                                "location_id": move_line.location_id.id or 0,
-                                "location_name": move_line.location_id.display_name or "",
-                                "location_barcode": move_line.location_id.barcode or "",
-                                # Campos personalizados con manejo de fallback
-                                "is_done_item": (
-                                    move_line.is_done_item
-                                    if hasattr(move_line, "is_done_item")
-                                    else (move_line.quantity > 0)
-                                ),
-                                "date_transaction": (
-                                    move_line.date_transaction
-                                    if hasattr(move_line, "date_transaction")
-                                    else ""
-                                ),
-                                "observation": (
-                                    move_line.new_observation if hasattr(move_line, "new_observation") else ""
-                                ),
-                                "time": move_line.time if hasattr(move_line, "time") else "",
-                                "user_operator_id": (
-                                    move_line.user_operator_id.id
-                                    if hasattr(move_line, "user_operator_id") and move_line.user_operator_id
-                                    else 0
-                                ),
-                                "maneja_temperatura": maneja_temperatura,
-                                "temperatura": (
-                                    move_line.temperature if hasattr(move_line, "temperature") else 0
-                                ),
-                                "image": (
-                                    f"{base_url}/api/view_imagen_linea_recepcion/{move_line.id}"
-                                    if hasattr(move_line, "imagen") and move_line.imagen
-                                    else ""
-                                ),
-                                "image_novedad": (
-                                    f"{base_url}/api/view_imagen_observation/{move_line.id}"
-                                    if hasattr(move_line, "imagen_observation")
-                                    and move_line.imagen_observation
-                                    else ""
-                                ),
-                            }
+                            linea_info = lineas_filter.build(
+                                {
+                                    "id": move.id,
+                                    "id_move": move.id,
+                                    "id_recepcion": picking.id,
+                                    "state": move.state,
+                                    "product_id": product.id,
+                                    "product_name": product.display_name,
+                                    "product_code": lambda: product.default_code or "",
+                                    "product_barcode": lambda: product.barcode or "",
+                                    "product_tracking": lambda: product.tracking or "",
+                                    "fecha_vencimiento": lambda: fecha_vencimiento or "",
+                                    "dias_vencimiento": (
+                                        lambda: product.expiration_time if hasattr(product, "expiration_time") else ""
+                                    ),
+                                    "other_barcodes": lambda: get_barcodes(product, move.id, picking.id),
+                                    "product_packing": array_packing,
+                                    "quantity_ordered": (
+                                        lambda: purchase_line.product_uom_qty if purchase_line else move.product_uom_qty
+                                    ),
+                                    "quantity_to_receive": move.product_uom_qty,
+                                    # "quantity_done": move.quantity,
+                                    "uom": lambda: move.product_uom.name if move.product_uom else "UND",
+                                    "location_dest_id": lambda: move.location_dest_id.id or 0,
+                                    "location_dest_name": lambda: move.location_dest_id.display_name or "",
+                                    "location_dest_barcode": lambda: move.location_dest_id.barcode or "",
+                                    "location_id": lambda: move.location_id.id or 0,
+                                    "location_name": lambda: move.location_id.display_name or "",
+                                    "location_barcode": lambda: move.location_id.barcode or "",
+                                    "weight": lambda: product.weight or 0,
+                                    "cantidad_faltante": cantidad_faltante,
+                                    "maneja_temperatura": maneja_temperatura,
+                                    "temperatura": temperatura,
+                                    # "imagen": imagen,
+                                }
+                            )
+
+                            recepcion_info["lineas_recepcion"].append(linea_info)
+
+                        # necesito que se valide que si en move_line_ids no hay novedades diferentes a Sin novedad o diferente a vacio. Por ejemplo si la novedad es diferente a "Sin novedad" o está vacía, entonces se debe considerar como una línea pendiente.
+                        elif cantidad_faltante > 0 and not novedad_bloqueante:
+                            # Obtener códigos de barras adicionales
+                            array_barcodes = []
+                            if hasattr(product, "barcode_ids"):
+                                array_barcodes = [
+                                    {
+                                        "barcode": barcode.name,
+                                        "id_move": move.id,
+                                        "id_product": product.id,
+                                        "batch_id": picking.id,
+                                    }
+                                    for barcode in product_fragment(product)["barcodes"]
+                                    if barcode.name
+                                ]
+
+                            # Obtener empaques del producto
+                            array_packing = []
+                            if lineas_filter.wants("product_packing") and hasattr(product, "packaging_ids"):
+                                array_packing = [
+                                    {
+                                        "barcode": pack.barcode,
+                                        "cantidad": pack.qty,
+                                        "id_move": move.id,
+                                        "id_product": product.id,
+                                        "batch_id": picking.id,
+                                    }
+                                    for pack in product_fragment(product)["packagings"]
+                                    if pack.barcode
+                                ]
+
+                            # obtener la fecha de vencimiento del producto pero la que esta mas cerca a vencer
+                            fecha_vencimiento = vencimientos.get(product.id, "")
+
+                            catalog.add(product)
+
+                            # Generar información de la línea de recepción
+                            linea_info = lineas_filter.build(
+                                {
+                                    "id": move.id,
+                                    "id_move": move.id,
+                                    "id_recepcion": picking.id,
+                                    "state": move.state,
+                                    "product_id": product.id,
+                                    "product_name": product.display_name,
+                                    "product_code": lambda: product.default_code or "",
+                                    "product_barcode": lambda: product.barcode or "",
+                                    "product_tracking": lambda: product.tracking or "",
+                                    "fecha_vencimiento": lambda: fecha_vencimiento or "",
+                                    "dias_vencimiento": (
+                                        lambda: product.expiration_time if hasattr(product, "expiration_time") else ""
+                                    ),
+                                    "other_barcodes": lambda: get_barcodes(product, move.id, picking.id),
+                                    "product_packing": array_packing,
+                                    "quantity_ordered": (
+                                        lambda: purchase_line.product_uom_qty if purchase_line else move.product_uom_qty
+                                    ),
+                                    "quantity_to_receive": move.product_uom_qty,
+                                    # "quantity_done": move.quantity,
+                                    "uom": lambda: move.product_uom.name if move.product_uom else "UND",
+                                    "location_dest_id": lambda: move.location_dest_id.id or 0,
+                                    "location_dest_name": lambda: move.location_dest_id.display_name or "",
+                                    "location_dest_barcode": lambda: move.location_dest_id.barcode or "",
+                                    "location_id": lambda: move.location_id.id or 0,
+                                    "location_name": lambda: move.location_id.display_name or "",
+                                    "location_barcode": lambda: move.location_id.barcode or "",
+                                    "weight": lambda: product.weight or 0,
+                                    "cantidad_faltante": cantidad_faltante,
+                                    "maneja_temperatura": maneja_temperatura,
+                                    "temperatura": temperatura,
+                                    # "imagen": imagen,
+                                }
+                            )
+
+                            recepcion_info["lineas_recepcion"].append(linea_info)
+
+                        # ✅ Agregar las líneas de move_line que tengan is_done_item en True
+                        # Verificación para campos personalizados
+
+                        move_lines_done = move.move_line_ids.filtered(lambda ml: ml.is_done_item)
+                        for move_line in move_lines_done:
+                            cantidad_faltante = move.product_uom_qty - move_line.quantity
+
+                            catalog.add(product)
+
+                            # Crear información de la línea enviada
+                            linea_enviada_info = enviadas_filter.build(
+                                {
+                                    "id": move_line.id,
+                                    "id_move_line": move_line.id,
+                                    "id_move": move_line.id,
+                                    # "id_move": move.id,
+                                    "state": move_line.state,
+                                    "id_recepcion": picking.id,
+                                    "product_id": product.id,
+                                    "product_name": product.display_name,
+                                    "product_code": lambda: product.default_code or "",
+                                    "product_barcode": lambda: product.barcode or "",
+                                    "product_tracking": lambda: product.tracking or "",
+                                    "quantity_ordered": (
+                                        lambda: purchase_line.product_uom_qty if purchase_line else move.product_uom_qty
+                                    ),
+                                    "quantity_to_receive": move.product_uom_qty,
+                                    "quantity_done": move_line.quantity,
+                                    "cantidad_faltante": cantidad_faltante,
+                                    "uom": (lambda: move_line.product_uom_id.name if move_line.product_uom_id else "UND"),
+                                    "location_dest_id": lambda: move_line.location_dest_id.id or 0,
+                                    "location_dest_name": lambda: move_line.location_dest_id.display_name or "",
+                                    "location_dest_barcode": lambda: move_line.location_dest_id.barcode or "",
+                                    "location_id": lambda: move_line.location_id.id or 0,
+                                    "location_name": lambda: move_line.location_id.display_name or "",
+                                    "location_barcode": lambda: move_line.location_id.barcode or "",
+                                    # Campos personalizados con manejo de fallback
+                                    "is_done_item": (
+                                        lambda: move_line.is_done_item
+                                        if hasattr(move_line, "is_done_item")
+                                        else (move_line.quantity > 0)
+                                    ),
+                                    "date_transaction": (
+                                        lambda: move_line.date_transaction
+                                        if hasattr(move_line, "date_transaction")
+                                        else ""
+                                    ),
+                                    "observation": (
+                                        lambda: move_line.new_observation if hasattr(move_line, "new_observation") else ""
+                                    ),
+                                    "time": lambda: move_line.time if hasattr(move_line, "time") else "",
+                                    "user_operator_id": (
+                                        lambda: move_line.user_operator_id.id
+                                        if hasattr(move_line, "user_operator_id") and move_line.user_operator_id
+                                        else 0
+                                    ),
+                                    "maneja_temperatura": maneja_temperatura,
+                                    "temperatura": (
+                                        lambda: move_line.temperature if hasattr(move_line, "temperature") else 0
+                                    ),
+                                    "image": (
+                                        lambda: f"{base_url}/api/view_imagen_linea_recepcion/{move_line.id}"
+                                        if hasattr(move_line, "imagen") and move_line.imagen
+                                        else ""
+                                    ),
+                                    "image_novedad": (
+                                        lambda: f"{base_url}/api/view_imagen_observation/{move_line.id}"
+                                        if hasattr(move_line, "imagen_observation")
+                                        and move_line.imagen_observation
+                                        else ""
+                                    ),
+                                }
+                            )
 
                             # Agregar información del lote si existe
                             if move_line.lot_id:
@@ -993,7 +947,7 @@ class TransaccionRecepcionController(http.Controller):
 
                     array_recepciones.append(recepcion_info)
 
-            return {"code": 200, "result": array_recepciones}
+            return {"code": 200, "result": fields_filter.prune(array_recepciones, RECEPCION_V2_CONTAINERS), **catalog.meta(), **sync.meta(item["id"] for item in array_recepciones)}
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
@@ -1006,24 +960,7 @@ class TransaccionRecepcionController(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -1197,7 +1134,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name
                                 ]
 
@@ -1212,7 +1149,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
 
@@ -1278,7 +1215,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name
                                 ]
 
@@ -1293,7 +1230,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
 
@@ -1621,7 +1558,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name
                                 ]
 
@@ -1636,7 +1573,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
 
@@ -1697,7 +1634,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for barcode in product.barcode_ids
+                                    for barcode in product_fragment(product)["barcodes"]
                                     if barcode.name
                                 ]
 
@@ -1712,7 +1649,7 @@ class TransaccionRecepcionController(http.Controller):
                                         "id_product": product.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ]
 
@@ -1857,24 +1794,7 @@ class TransaccionRecepcionController(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -1888,7 +1808,7 @@ class TransaccionRecepcionController(http.Controller):
                 return validation_error
 
             # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = get_settings().picking_strategy
 
             # ✅ Criterios de búsqueda para los lotes
             search_domain = [
@@ -2013,6 +1933,7 @@ class TransaccionRecepcionController(http.Controller):
                 products = {
                     prod.id: prod for prod in request.env["product.product"].sudo().browse(product_ids)
                 }
+                prefetch_products(request.env["product.product"].sudo().browse(product_ids))
 
                 location_ids = {move["location_id"][0] for move in stock_moves}
                 location_ids.update({move["location_dest_id"][0] for move in stock_moves})
@@ -2028,7 +1949,7 @@ class TransaccionRecepcionController(http.Controller):
 
                     # ✅ Obtener códigos de barras adicionales
                     array_barcodes = []
-                    if hasattr(product, "barcode_ids") and product.barcode_ids:
+                    if hasattr(product, "barcode_ids") and product_fragment(product)["barcodes"]:
                         array_barcodes = [
                             {
                                 "barcode": barcode.name,
@@ -2036,13 +1957,13 @@ class TransaccionRecepcionController(http.Controller):
                                 "id_product": product.id,
                                 "batch_id": batch.id,
                             }
-                            for barcode in product.barcode_ids
+                            for barcode in product_fragment(product)["barcodes"]
                             if barcode.name
                         ]
 
                     # ✅ Obtener empaques del producto
                     array_packing = []
-                    if hasattr(product, "packaging_ids") and product.packaging_ids:
+                    if hasattr(product, "packaging_ids") and product_fragment(product)["packagings"]:
                         array_packing = [
                             {
                                 "barcode": pack.barcode,
@@ -2051,7 +1972,7 @@ class TransaccionRecepcionController(http.Controller):
                                 "id_product": product.id,
                                 "batch_id": batch.id,
                             }
-                            for pack in product.packaging_ids
+                            for pack in product_fragment(product)["packagings"]
                             if pack.barcode
                         ]
 
@@ -2263,376 +2184,428 @@ class TransaccionRecepcionController(http.Controller):
                 "msg": f"Error inesperado: {str(err)}",
             }
 
-    @http.route("/api/recepciones/batchs/v2", auth="user", type="json", methods=["GET"])
-    def get_recepciones_batch_v2(self, **kwargs):
-        try:
-            user = request.env.user
+    def _prepare_recepciones_batch_v2(self, kwargs):
+        """
+        Valida usuario y PDA, y busca los batches de recepción del usuario
 
-            # ✅ Validar usuario
-            if not user:
-                return {"code": 400, "msg": "Usuario no encontrado"}
+        Returns:
+            Tupla (error, batchs); error es el diccionario a devolver, o None
+            si la petición es válida
+        """
+        user = request.env.user
 
-            device_id = kwargs.get("device_id") or request.params.get("device_id")
-            validation_error = validate_pda(device_id)
-            if validation_error:
-                return validation_error
+        # ✅ Validar usuario
+        if not user:
+            return {"code": 400, "msg": "Usuario no encontrado"}, None
 
-            # ✅ Obtener estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+        device_id = kwargs.get("device_id") or request.params.get("device_id")
+        validation_error = validate_pda(device_id)
+        if validation_error:
+            return validation_error, None
 
-            # ✅ Criterios de búsqueda para los lotes
-            search_domain = [
-                ("state", "=", "in_progress"),
-                ("picking_type_code", "=", "incoming"),
-                ("user_id", "in", [user.id, False]),
-            ]
+        # ✅ Criterios de búsqueda para los lotes
+        search_domain = [
+            ("state", "=", "in_progress"),
+            ("picking_type_code", "=", "incoming"),
+            ("user_id", "in", [user.id, False]),
+        ]
 
-            # ✅ Obtener lotes (batches)
-            batchs = request.env["stock.picking.batch"].sudo().search(search_domain)
+        # ✅ Obtener lotes (batches)
+        return None, request.env["stock.picking.batch"].sudo().search(search_domain)
+
+    @http.route("/api/recepciones/batchs/v2", auth="user", type="json", methods=["GET"])
+    def get_recepciones_batch_v2(self, **kwargs):
+        try:
+            error, batchs = self._prepare_recepciones_batch_v2(kwargs)
+            if error:
+                return error
 
             # ✅ Verificar si no hay lotes encontrados
             if not batchs:
                 return {"code": 200, "msg": "No tienes batches asignados", "result": []}
 
-            array_batch = []
-            for batch in batchs:
-                # ✅ Obtener movimientos de línea de stock en vez de move.line.unified
-                # Cambio 1: Usar stock.move.line en lugar de move.line.unified
-                move_line_ids = (
-                    request.env["stock.move.line"]
-                    .sudo()
-                    .search(
-                        [
-                            (
-                                "picking_id.batch_id",
-                                "=",
-                                batch.id,
-                            ),  # Cambio 2: Referencia a batch a través de picking_id
-                            # ("location_id", "in", user_location_ids),
-                            (
-                                "is_done_item_pack",
-                                "=",
-                                False,
-                            ),  # Cambio 3: Usar el campo personalizado is_done_item_pack
-                        ]
-                    )
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            array_batch = list(self._iter_recepciones_batch_v2(request.env, batchs, fields_filter, catalog))
+
+            return {"code": 200, "result": array_batch, **catalog.meta()}
+
+        except Exception as err:
+            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
+
+    ## GET Batchs de recepción en streaming (NDJSON, un batch por línea)
+    @http.route("/api/recepciones/batchs/v2/stream", auth="user", type="http", methods=["GET"], csrf=False)
+    def get_recepciones_batch_v2_stream(self, **kwargs):
+        try:
+            error, batchs = self._prepare_recepciones_batch_v2(kwargs)
+            if error:
+                return request.make_json_response(error)
+
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            return ndjson_response(
+                lambda env: self._iter_recepciones_batch_v2(env, batchs, fields_filter, catalog),
+                trailer=lambda emitted_ids: catalog.meta(),
+            )
+
+        except Exception as err:
+            return request.make_json_response({"code": 400, "msg": f"Error inesperado: {str(err)}"})
+
+    def _iter_recepciones_batch_v2(self, env, batchs, fields_filter, catalog):
+        """Genera uno a uno los batches de recepción, ya filtrados por fields"""
+        user = env.user
+        lineas_filter = fields_filter.child("lineas_recepcion", exclude=catalog.line_keys)
+        enviadas_filter = fields_filter.child("lineas_recepcion_enviadas", exclude=catalog.line_keys)
+
+        # ✅ Obtener estrategia de picking
+        picking_strategy = get_settings(env).picking_strategy
+
+        for batch in iter_records(batchs.with_env(env)):
+            # ✅ Obtener movimientos de línea de stock en vez de move.line.unified
+            # Cambio 1: Usar stock.move.line en lugar de move.line.unified
+            move_line_ids = (
+                env["stock.move.line"]
+                .sudo()
+                .search(
+                    [
+                        (
+                            "picking_id.batch_id",
+                            "=",
+                            batch.id,
+                        ),  # Cambio 2: Referencia a batch a través de picking_id
+                        # ("location_id", "in", user_location_ids),
+                        (
+                            "is_done_item_pack",
+                            "=",
+                            False,
+                        ),  # Cambio 3: Usar el campo personalizado is_done_item_pack
+                    ]
                 )
+            )
 
-                if not move_line_ids:
-                    continue
+            if not move_line_ids:
+                continue
 
-                # Verificar si hay pickings y obtener orígenes
-                origins_list = []
-                if batch.picking_ids:
-                    for picking in batch.picking_ids:
-                        if picking.origin:
-                            origins_list.append(
-                                {
-                                    "name": picking.origin,
-                                    "id": picking.id,
-                                    "id_batch": batch.id,
-                                }
-                            )
+            # Verificar si hay pickings y obtener orígenes
+            origins_list = []
+            if batch.picking_ids:
+                for picking in batch.picking_ids:
+                    if picking.origin:
+                        origins_list.append(
+                            {
+                                "name": picking.origin,
+                                "id": picking.id,
+                                "id_batch": batch.id,
+                            }
+                        )
 
-                # ✅ Leer detalles de los movimientos
-                stock_moves = move_line_ids.read()
+            # ✅ Leer detalles de los movimientos
+            stock_moves = move_line_ids.read()
 
-                # ✅ Crear la información básica del batch
-                batch_info = {
+            # ✅ Crear la información básica del batch
+            batch_info = fields_filter.build(
+                {
                     "id": batch.id,
-                    "name": batch.name or "",
+                    "name": lambda: batch.name or "",
                     "user_name": user.name,
                     "user_id": user.id,
                     "order_by": picking_strategy.picking_priority_app,
                     "order_picking": picking_strategy.picking_order_app,
-                    "fecha_creacion": batch.create_date or "",
-                    "state": batch.state or "",
-                    "picking_type_id": batch.picking_type_id.id if batch.picking_type_id else 0,
-                    "picking_type": (batch.picking_type_id.display_name if batch.picking_type_id else "N/A"),
+                    "fecha_creacion": lambda: batch.create_date or "",
+                    "state": lambda: batch.state or "",
+                    "picking_type_id": lambda: batch.picking_type_id.id if batch.picking_type_id else 0,
+                    "picking_type": (lambda: batch.picking_type_id.display_name if batch.picking_type_id else "N/A"),
                     "picking_type_code": "incoming",  # Similar al endpoint de recepciones
                     "observation": "",
                     "is_wave": batch.is_wave,
-                    "location_id": batch.location_id.id if batch.location_id else 0,
-                    "location_name": (batch.location_id.display_name if batch.location_id else "SIN-MUELLE"),
-                    "location_barcode": batch.location_id.barcode or "",
+                    "location_id": lambda: batch.location_id.id if batch.location_id else 0,
+                    "location_name": (lambda: batch.location_id.display_name if batch.location_id else "SIN-MUELLE"),
+                    "location_barcode": lambda: batch.location_id.barcode or "",
                     "warehouse_id": (
-                        batch.picking_type_id.warehouse_id.id
+                        lambda: batch.picking_type_id.warehouse_id.id
                         if batch.picking_type_id and batch.picking_type_id.warehouse_id
                         else 0
                     ),
                     "warehouse_name": (
-                        batch.picking_type_id.warehouse_id.name
+                        lambda: batch.picking_type_id.warehouse_id.name
                         if batch.picking_type_id and batch.picking_type_id.warehouse_id
                         else ""
                     ),
-                    "numero_lineas": len(stock_moves),
-                    "numero_items": sum(move["quantity"] for move in stock_moves),
-                    "start_time_reception": batch.start_time_pick or "",
-                    "end_time_reception": batch.end_time_pick or "",
-                    "priority": batch.priority if hasattr(batch, "priority") else "",
+                    "numero_lineas": lambda: len(stock_moves),
+                    "numero_items": lambda: sum(move["quantity"] for move in stock_moves),
+                    "start_time_reception": lambda: batch.start_time_pick or "",
+                    "end_time_reception": lambda: batch.end_time_pick or "",
+                    "priority": lambda: batch.priority if hasattr(batch, "priority") else "",
                     "zona_entrega": (
-                        batch.picking_ids[0].delivery_zone_id.name
+                        lambda: batch.picking_ids[0].delivery_zone_id.name
                         if batch.picking_ids and batch.picking_ids[0].delivery_zone_id
                         else "SIN-ZONA"
                     ),
                     "origin": origins_list,
-                    "responsable_id": batch.user_id.id or 0,
-                    "responsable": batch.user_id.name or "",
-                    "proveedor_id": batch.picking_ids[0].partner_id.id or 0,
-                    "proveedor": batch.picking_ids[0].partner_id.name or "",
-                    "location_dest_id": batch.picking_ids[0].location_dest_id.id or 0,
-                    "location_dest_name": batch.picking_ids[0].location_dest_id.display_name or "",
+                    "responsable_id": lambda: batch.user_id.id or 0,
+                    "responsable": lambda: batch.user_id.name or "",
+                    "proveedor_id": lambda: batch.picking_ids[0].partner_id.id or 0,
+                    "proveedor": lambda: batch.picking_ids[0].partner_id.name or "",
+                    "location_dest_id": lambda: batch.picking_ids[0].location_dest_id.id or 0,
+                    "location_dest_name": lambda: batch.picking_ids[0].location_dest_id.display_name or "",
                     "backorder_id": 0,
                     "backorder_name": "",
-                    "purchase_order_id": batch.picking_ids[0].purchase_id.id or 0,
-                    "purchase_order_name": batch.picking_ids[0].purchase_id.name or "",
+                    "purchase_order_id": lambda: batch.picking_ids[0].purchase_id.id or 0,
+                    "purchase_order_name": lambda: batch.picking_ids[0].purchase_id.name or "",
                     "show_check_availability": (
-                        batch.show_check_availability if hasattr(batch, "show_check_availability") else False
+                        lambda: batch.show_check_availability if hasattr(batch, "show_check_availability") else False
                     ),
                     "lineas_recepcion": [],  # Similar a lineas_recepcion
                     "lineas_recepcion_enviadas": [],  # Similar a lineas_recepcion_enviadas
-                }
-
-                # ✅ Precarga de productos y ubicaciones para optimizar
-                product_ids = {move["product_id"][0] for move in stock_moves}
-                products = {
-                    prod.id: prod for prod in request.env["product.product"].sudo().browse(product_ids)
-                }
-
-                location_ids = {move["location_id"][0] for move in stock_moves}
-                location_ids.update({move["location_dest_id"][0] for move in stock_moves})
-                locations_dict = {
-                    loc.id: loc for loc in request.env["stock.location"].sudo().browse(location_ids)
-                }
-
-                # ✅ Procesar cada movimiento
-                for move in stock_moves:
-                    product = products.get(move["product_id"][0])
-                    location = locations_dict.get(move["location_id"][0])
-                    location_dest = locations_dict.get(move["location_dest_id"][0])
+                },
+                RECEPCION_V2_CONTAINERS,
+            )
 
-                    # ✅ Obtener códigos de barras adicionales
-                    array_barcodes = []
-                    if hasattr(product, "barcode_ids") and product.barcode_ids:
-                        array_barcodes = [
-                            {
-                                "barcode": barcode.name,
-                                "id_move": move["id"],
-                                "id_product": product.id,
-                                "batch_id": batch.id,
-                            }
-                            for barcode in product.barcode_ids
-                            if barcode.name
-                        ]
+            # ✅ Precarga de productos y ubicaciones para optimizar
+            product_ids = {move["product_id"][0] for move in stock_moves}
+            products = {
+                prod.id: prod for prod in env["product.product"].sudo().browse(product_ids)
+            }
+            prefetch_products(env["product.product"].sudo().browse(product_ids))
 
-                    # ✅ Obtener empaques del producto
-                    array_packing = []
-                    if hasattr(product, "packaging_ids") and product.packaging_ids:
-                        array_packing = [
-                            {
-                                "barcode": pack.barcode,
-                                "cantidad": pack.qty,
-                                "id_move": move["id"],
-                                "id_product": product.id,
-                                "batch_id": batch.id,
-                            }
-                            for pack in product.packaging_ids
-                            if pack.barcode
-                        ]
+            location_ids = {move["location_id"][0] for move in stock_moves}
+            location_ids.update({move["location_dest_id"][0] for move in stock_moves})
+            locations_dict = {
+                loc.id: loc for loc in env["stock.location"].sudo().browse(location_ids)
+            }
 
-                    # Cambio 5: En stock.move.line, el picking está directamente relacionado
-                    picking = (
-                        request.env["stock.picking"].sudo().browse(move["picking_id"][0])
-                        if move.get("picking_id")
-                        else None
-                    )
-                    picking_id = picking.id if picking else 0
+            # ✅ Procesar cada movimiento
+            for move in stock_moves:
+                product = products.get(move["product_id"][0])
+                location = locations_dict.get(move["location_id"][0])
+                location_dest = locations_dict.get(move["location_dest_id"][0])
 
-                    # ✅ Obtener información de zona de entrega
-                    delivery_zone_id = (
-                        picking.delivery_zone_id.id if picking and picking.delivery_zone_id else 0
-                    )
-                    delivery_zone_name = (
-                        picking.delivery_zone_id.display_name
-                        if picking and picking.delivery_zone_id
-                        else "SIN-ZONA"
-                    )
+                # ✅ Obtener códigos de barras adicionales
+                array_barcodes = []
+                if hasattr(product, "barcode_ids") and product_fragment(product)["barcodes"]:
+                    array_barcodes = [
+                        {
+                            "barcode": barcode.name,
+                            "id_move": move["id"],
+                            "id_product": product.id,
+                            "batch_id": batch.id,
+                        }
+                        for barcode in product_fragment(product)["barcodes"]
+                        if barcode.name
+                    ]
 
-                    # ✅ Obtener información de lote y fecha de vencimiento
-                    lot_id = move["lot_id"][0] if move["lot_id"] else 0
-                    lot_name = move["lot_id"][1] if move["lot_id"] and len(move["lot_id"]) > 1 else ""
-                    expiration_date = ""
-                    if lot_id:
-                        lot = request.env["stock.lot"].sudo().browse(lot_id)
-                        if hasattr(lot, "expiration_date"):
-                            expiration_date = lot.expiration_date
+                # ✅ Obtener empaques del producto
+                array_packing = []
+                if lineas_filter.wants("product_packing") and hasattr(product, "packaging_ids") and product_fragment(product)["packagings"]:
+                    array_packing = [
+                        {
+                            "barcode": pack.barcode,
+                            "cantidad": pack.qty,
+                            "id_move": move["id"],
+                            "id_product": product.id,
+                            "batch_id": batch.id,
+                        }
+                        for pack in product_fragment(product)["packagings"]
+                        if pack.barcode
+                    ]
 
-                    move_line_obj = request.env["stock.move.line"].sudo().browse(move["id"])
+                # Cambio 5: En stock.move.line, el picking está directamente relacionado
+                picking = (
+                    env["stock.picking"].sudo().browse(move["picking_id"][0])
+                    if move.get("picking_id")
+                    else None
+                )
+                picking_id = picking.id if picking else 0
 
-                    # Buscar líneas completadas relacionadas con el mismo move_id
-                    if hasattr(move_line_obj, "move_id") and move_line_obj.move_id:
-                        completed_lines = (
-                            request.env["stock.move.line"]
-                            .sudo()
-                            .search(
-                                [
-                                    ("move_id", "=", move_line_obj.move_id.id),
-                                    ("is_done_item_pack", "=", True),
-                                ]
-                            )
+                # ✅ Obtener información de zona de entrega
+                delivery_zone_id = (
+                    picking.delivery_zone_id.id if picking and picking.delivery_zone_id else 0
+                )
+                delivery_zone_name = (
+                    picking.delivery_zone_id.display_name
+                    if picking and picking.delivery_zone_id
+                    else "SIN-ZONA"
+                )
+
+                # ✅ Obtener información de lote y fecha de vencimiento
+                lot_id = move["lot_id"][0] if move["lot_id"] else 0
+                lot_name = move["lot_id"][1] if move["lot_id"] and len(move["lot_id"]) > 1 else ""
+                expiration_date = ""
+                if lot_id:
+                    lot = env["stock.lot"].sudo().browse(lot_id)
+                    if hasattr(lot, "expiration_date"):
+                        expiration_date = lot.expiration_date
+
+                move_line_obj = env["stock.move.line"].sudo().browse(move["id"])
+
+                # Buscar líneas completadas relacionadas con el mismo move_id
+                if hasattr(move_line_obj, "move_id") and move_line_obj.move_id:
+                    completed_lines = (
+                        env["stock.move.line"]
+                        .sudo()
+                        .search(
+                            [
+                                ("move_id", "=", move_line_obj.move_id.id),
+                                ("is_done_item_pack", "=", True),
+                            ]
                         )
-                        # Sumar la cantidad de las líneas completadas
-                        completed_quantity = sum(line.quantity for line in completed_lines)
-                        cantidad_faltante = move.get("quantity_demanded", 0) - completed_quantity
-                    else:
-                        # Si no hay move_id, usar el campo quantity directamente
-                        cantidad_faltante = move.get("quantity_demanded", 0) - move.get("quantity", 0)
+                    )
+                    # Sumar la cantidad de las líneas completadas
+                    completed_quantity = sum(line.quantity for line in completed_lines)
+                    cantidad_faltante = move.get("quantity_demanded", 0) - completed_quantity
+                else:
+                    # Si no hay move_id, usar el campo quantity directamente
+                    cantidad_faltante = move.get("quantity_demanded", 0) - move.get("quantity", 0)
 
-                    # ✅ Crear la línea del batch (similar a linea_recepcion)
-                    batch_info["lineas_recepcion"].append(
+                catalog.add(product)
+
+                # ✅ Crear la línea del batch (similar a linea_recepcion)
+                batch_info["lineas_recepcion"].append(
+                    lineas_filter.build(
                         {
-                            "id": move["id"],
-                            "id_move": move["id"],
+                            "id": lambda: move["id"],
+                            "id_move": lambda: move["id"],
                             "id_batch": batch.id,
                             "id_recepcion": batch.id,
                             # Cambio 7: Usar el state del move o del picking relacionado
-                            "state": move.get("state", "assigned"),
-                            "product_id": product.id or 0,
-                            "product_name": product.display_name or "",
-                            "product_code": product.default_code if product else "",
-                            "product_barcode": product.barcode or "",
-                            "product_tracking": product.tracking if product else "",
+                            "state": lambda: move.get("state", "assigned"),
+                            "product_id": lambda: product.id or 0,
+                            "product_name": lambda: product.display_name or "",
+                            "product_code": lambda: product.default_code if product else "",
+                            "product_barcode": lambda: product.barcode or "",
+                            "product_tracking": lambda: product.tracking if product else "",
                             "fecha_vencimiento": expiration_date,
                             "dias_vencimiento": (
-                                product.expiration_time if hasattr(product, "expiration_time") else ""
+                                lambda: product.expiration_time if hasattr(product, "expiration_time") else ""
                             ),
-                            "other_barcodes": get_barcodes(product, move["id"], picking_id),
+                            "other_barcodes": lambda: get_barcodes(product, move["id"], picking_id),
                             "product_packing": array_packing,
                             # Cambio 8: Usando quantity en lugar de product_uom_qty
-                            "quantity_ordered": move["quantity"],
+                            "quantity_ordered": lambda: move["quantity"],
                             "cantidad_faltante": cantidad_faltante,
-                            "quantity_to_receive": move["quantity"],
-                            "uom": product.uom_id.name if product and product.uom_id else "UND",
-                            "location_dest_id": move["location_dest_id"][0],
-                            "location_dest_name": location_dest.display_name or "",
-                            "location_dest_barcode": location_dest.barcode or "",
-                            "location_id": move["location_id"][0],
-                            "location_name": location.display_name if location else "",
-                            "location_barcode": location.barcode or "",
-                            "weight": product.weight if product else 0,
-                            "rimoval_priority": (location.priority_picking_desplay if location else ""),
+                            "quantity_to_receive": lambda: move["quantity"],
+                            "uom": lambda: product.uom_id.name if product and product.uom_id else "UND",
+                            "location_dest_id": lambda: move["location_dest_id"][0],
+                            "location_dest_name": lambda: location_dest.display_name or "",
+                            "location_dest_barcode": lambda: location_dest.barcode or "",
+                            "location_id": lambda: move["location_id"][0],
+                            "location_name": lambda: location.display_name if location else "",
+                            "location_barcode": lambda: location.barcode or "",
+                            "weight": lambda: product.weight if product else 0,
+                            "rimoval_priority": (lambda: location.priority_picking_desplay if location else ""),
                             "lot_id": lot_id,
                             "lot_name": lot_name,
                             "zona_entrega": delivery_zone_name,
                             "id_zona_entrega": delivery_zone_id,
                             "picking_id": picking_id,
-                            "picking_name": picking.display_name if picking else "",
-                            "origin": picking.origin or "" if picking else "",
+                            "picking_name": lambda: picking.display_name if picking else "",
+                            "origin": lambda: picking.origin or "" if picking else "",
                         }
                     )
+                )
 
-                # ✅ Buscar movimientos ya procesados (is_done_item_pack = True)
-                # Cambio 9: Buscar stock.move.line completados usando campo personalizado
-                done_move_line_ids = (
-                    request.env["stock.move.line"]
-                    .sudo()
-                    .search([("picking_id.batch_id", "=", batch.id), ("is_done_item_pack", "=", True)])
-                )  # Usando el campo personalizado is_done_item_pack
+            # ✅ Buscar movimientos ya procesados (is_done_item_pack = True)
+            # Cambio 9: Buscar stock.move.line completados usando campo personalizado
+            done_move_line_ids = (
+                env["stock.move.line"]
+                .sudo()
+                .search([("picking_id.batch_id", "=", batch.id), ("is_done_item_pack", "=", True)])
+            )  # Usando el campo personalizado is_done_item_pack
 
-                # ✅ Procesar movimientos ya completados
-                if done_move_line_ids:
-                    done_stock_moves = done_move_line_ids.read()
+            # ✅ Procesar movimientos ya completados
+            if done_move_line_ids:
+                done_stock_moves = done_move_line_ids.read()
 
-                    for done_move in done_stock_moves:
-                        product = (
-                            products.get(done_move["product_id"][0]) if done_move["product_id"] else None
-                        )
+                for done_move in done_stock_moves:
+                    product = (
+                        products.get(done_move["product_id"][0]) if done_move["product_id"] else None
+                    )
 
-                        product = (
-                            obtener_info_producto(done_move["product_id"][0])
-                            if done_move.get("product_id")
-                            else None
-                        )
-                        # location = locations_dict.get(done_move["location_id"][0]) if done_move["location_id"] else None
-                        # location_dest = locations_dict.get(done_move["location_dest_id"][0]) if done_move["location_dest_id"] else None
+                    product = (
+                        obtener_info_producto(done_move["product_id"][0], env)
+                        if done_move.get("product_id")
+                        else None
+                    )
+                    # location = locations_dict.get(done_move["location_id"][0]) if done_move["location_id"] else None
+                    # location_dest = locations_dict.get(done_move["location_dest_id"][0]) if done_move["location_dest_id"] else None
 
-                        # location_dest = request.env["stock.location"].sudo().browse(done_move["location_dest_id"][0]) if done_move.get("location_dest_id") else None
+                    # location_dest = env["stock.location"].sudo().browse(done_move["location_dest_id"][0]) if done_move.get("location_dest_id") else None
 
-                        location_dest = (
-                            obtener_info_ubicacion(done_move["location_dest_id"][0])
-                            if done_move.get("location_dest_id")
-                            else None
-                        )
-                        location = (
-                            obtener_info_ubicacion(done_move["location_id"][0])
-                            if done_move.get("location_id")
-                            else None
-                        )
+                    location_dest = (
+                        obtener_info_ubicacion(done_move["location_dest_id"][0], env)
+                        if done_move.get("location_dest_id")
+                        else None
+                    )
+                    location = (
+                        obtener_info_ubicacion(done_move["location_id"][0], env)
+                        if done_move.get("location_id")
+                        else None
+                    )
 
-                        # Información del lote
-                        lot_id = done_move["lot_id"][0] if done_move.get("lot_id") else 0
-                        lot_name = (
-                            done_move["lot_id"][1]
-                            if done_move.get("lot_id") and len(done_move["lot_id"]) > 1
-                            else ""
-                        )
-                        expiration_date = ""
+                    # Información del lote
+                    lot_id = done_move["lot_id"][0] if done_move.get("lot_id") else 0
+                    lot_name = (
+                        done_move["lot_id"][1]
+                        if done_move.get("lot_id") and len(done_move["lot_id"]) > 1
+                        else ""
+                    )
+                    expiration_date = ""
 
-                        if lot_id:
-                            lot = request.env["stock.lot"].sudo().browse(lot_id)
-                            if hasattr(lot, "expiration_date"):
-                                expiration_date = lot.expiration_date
+                    if lot_id:
+                        lot = env["stock.lot"].sudo().browse(lot_id)
+                        if hasattr(lot, "expiration_date"):
+                            expiration_date = lot.expiration_date
 
-                        # Obtener el picking asociado
-                        picking = (
-                            request.env["stock.picking"].sudo().browse(done_move["picking_id"][0])
-                            if done_move.get("picking_id")
-                            else None
-                        )
+                    # Obtener el picking asociado
+                    picking = (
+                        env["stock.picking"].sudo().browse(done_move["picking_id"][0])
+                        if done_move.get("picking_id")
+                        else None
+                    )
 
-                        # Cambio 10: Mapeo de campos de stock.move.line a la estructura esperada
-                        batch_info["lineas_recepcion_enviadas"].append(
+                    catalog.add(product)
+
+                    # Cambio 10: Mapeo de campos de stock.move.line a la estructura esperada
+                    batch_info["lineas_recepcion_enviadas"].append(
+                        enviadas_filter.build(
                             {
-                                "id": done_move["id"],
-                                "id_move_line": done_move["id"],
-                                "id_move": done_move["id"],
+                                "id": lambda: done_move["id"],
+                                "id_move_line": lambda: done_move["id"],
+                                "id_move": lambda: done_move["id"],
                                 "id_recepcion": batch.id,
                                 "id_batch": batch.id,
-                                "product_id": (done_move["product_id"][0] if done_move["product_id"] else 0),
-                                "product_name": product.display_name or "",
-                                "product_code": product.default_code or "",
-                                "product_barcode": product.barcode or "",
-                                "product_tracking": product.tracking or "",
-                                "quantity_ordered": done_move["quantity"],
-                                "quantity_done": done_move["quantity"],
-                                "uom": product.uom_id.name if product and product.uom_id else "UND",
-                                "location_dest_id": location_dest.id if location_dest else 0,
-                                "location_dest_name": (location_dest.display_name if location_dest else ""),
-                                "location_dest_barcode": location_dest.barcode or "",
-                                "location_id": location.id if location else 0,
-                                "location_name": location.display_name if location else "",
-                                "location_barcode": location.barcode or "",
-                                "is_done_item": done_move.get(
+                                "product_id": (lambda: done_move["product_id"][0] if done_move["product_id"] else 0),
+                                "product_name": lambda: product.display_name or "",
+                                "product_code": lambda: product.default_code or "",
+                                "product_barcode": lambda: product.barcode or "",
+                                "product_tracking": lambda: product.tracking or "",
+                                "quantity_ordered": lambda: done_move["quantity"],
+                                "quantity_done": lambda: done_move["quantity"],
+                                "uom": lambda: product.uom_id.name if product and product.uom_id else "UND",
+                                "location_dest_id": lambda: location_dest.id if location_dest else 0,
+                                "location_dest_name": (lambda: location_dest.display_name if location_dest else ""),
+                                "location_dest_barcode": lambda: location_dest.barcode or "",
+                                "location_id": lambda: location.id if location else 0,
+                                "location_name": lambda: location.display_name if location else "",
+                                "location_barcode": lambda: location.barcode or "",
+                                "is_done_item": lambda: done_move.get(
                                     "is_done_item_pack", True
                                 ),  # Usando el campo personalizado is_done_item_pack
-                                "date_transaction": done_move.get("date_transaction_packing", ""),
-                                "observation": done_move.get("new_observation_packing", ""),
-                                "time": done_move.get("time_packing", ""),
-                                "user_operator_id": done_move["user_operator_id"][0] or 0,
+                                "date_transaction": lambda: done_move.get("date_transaction_packing", ""),
+                                "observation": lambda: done_move.get("new_observation_packing", ""),
+                                "time": lambda: done_move.get("time_packing", ""),
+                                "user_operator_id": lambda: done_move["user_operator_id"][0] or 0,
                                 "lot_id": lot_id,
                                 "lot_name": lot_name,
                                 "fecha_vencimiento": expiration_date,
                             }
                         )
+                    )
 
-                # Solo añadir el batch si tiene líneas pendientes
-                if batch_info["lineas_recepcion"]:
-                    array_batch.append(batch_info)
-
-            return {"code": 200, "result": array_batch}
+            # Solo añadir el batch si tiene líneas pendientes
+            if batch_info["lineas_recepcion"]:
+                yield fields_filter.prune([batch_info], RECEPCION_V2_CONTAINERS)[0]
 
-        except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
     ## GET Transaccion Recepcion por ID
     @http.route("/api/recepciones/<int:id>", auth="user", type="json", methods=["GET"])
@@ -2736,7 +2709,7 @@ class TransaccionRecepcionController(http.Controller):
                             "id_product": product.id,
                             "batch_id": recepcion.id,
                         }
-                        for barcode in product.barcode_ids
+                        for barcode in product_fragment(product)["barcodes"]
                         if barcode.name
                     ]
 
@@ -2752,7 +2725,7 @@ class TransaccionRecepcionController(http.Controller):
                             "id_product": product.id,
                             "batch_id": recepcion.id,
                         }
-                        for pack in product.packaging_ids
+                        for pack in product_fragment(product)["packagings"]
                         if pack.barcode
                     ]
 
@@ -3092,137 +3065,150 @@ class TransaccionRecepcionController(http.Controller):
             return {"code": 500, "msg": f"Error interno: {str(e)}"}
 
     @http.route("/api/send_recepcion", auth="user", type="json", methods=["POST"], csrf=False)
+    @idempotent
     def send_recepcion(self, **auth):
         try:
-            user = request.env.user
-            if not user:
-                return {"code": 400, "msg": "Usuario no encontrado"}
+            # ✅ Usar savepoint para revertir las líneas creadas si falla alguna escritura
+            with request.env.cr.savepoint():
+                user = request.env.user
+                if not user:
+                    return {"code": 400, "msg": "Usuario no encontrado"}
 
-            id_recepcion = auth.get("id_recepcion", 0)
-            list_items = auth.get("list_items", [])
+                id_recepcion = auth.get("id_recepcion", 0)
+                list_items = auth.get("list_items", [])
 
-            recepcion = (
-                request.env["stock.picking"]
-                .sudo()
-                .search(
-                    [
-                        ("id", "=", id_recepcion),
-                        ("picking_type_code", "=", "incoming"),
-                        ("state", "!=", "done"),
-                    ],
-                    limit=1,
+                recepcion = (
+                    request.env["stock.picking"]
+                    .sudo()
+                    .search(
+                        [
+                            ("id", "=", id_recepcion),
+                            ("picking_type_code", "=", "incoming"),
+                            ("state", "!=", "done"),
+                        ],
+                        limit=1,
+                    )
                 )
-            )
-
-            if not recepcion:
-                return {
-                    "code": 400,
-                    "msg": f"Recepción no encontrada o ya completada con ID {id_recepcion}",
-                }
-
-            array_result = []
-
-            # 🧠 Control para eliminar líneas automáticas solo una vez
-            lineas_automaticas_borradas = False
-
-            for item in list_items:
-                move_id = item.get("id_move")
-                product_id = item.get("id_producto")
-                lote_id = item.get("lote_producto")
-                ubicacion_destino = item.get("ubicacion_destino")
-                cantidad = item.get("cantidad_separada")
-                fecha_transaccion = item.get("fecha_transaccion")
-                observacion = item.get("observacion")
-                id_operario = item.get("id_operario")
-                time_line = item.get("time_line")
-
-                if not product_id or not cantidad:
-                    continue
-
-                product = request.env["product.product"].sudo().browse(product_id)
-                if not product.exists():
-                    continue
 
-                move = (
-                    request.env["stock.move"].sudo().browse(move_id)
-                    if move_id
-                    else recepcion.move_ids.filtered(lambda m: m.product_id.id == product_id)
-                )
-                if not move:
+                if not recepcion:
                     return {
                         "code": 400,
-                        "msg": f"El producto {product.display_name} no está en la recepción",
+                        "msg": f"Recepción no encontrada o ya completada con ID {id_recepcion}",
                     }
 
-                stock_move = move.sudo()
+                items = [item for item in list_items if item.get("id_producto") and item.get("cantidad_separada")]
+
+                # ✅ Validar productos, movimientos y lotes con una consulta por modelo
+                products = request.env["product.product"].sudo().browse({item["id_producto"] for item in items}).exists()
+                moves = request.env["stock.move"].sudo().browse({item["id_move"] for item in items if item.get("id_move")}).exists()
+                lots = request.env["stock.lot"].sudo().browse({item["lote_producto"] for item in items if item.get("lote_producto")}).exists()
+                products_by_id = {product.id: product for product in products}
+                moves_by_id = {move.id: move for move in moves}
+                lots_by_id = {lot.id: lot for lot in lots}
+
+                # ✅ Construir todas las líneas antes de escribir: si alguna falla no se crea ninguna
+                move_line_vals_list = []
+                lineas = []
+                stock_move = None
+                for item in items:
+                    move_id = item.get("id_move")
+                    product_id = item.get("id_producto")
+                    lote_id = item.get("lote_producto")
+                    ubicacion_destino = item.get("ubicacion_destino")
+                    cantidad = item.get("cantidad_separada")
+                    fecha_transaccion = item.get("fecha_transaccion")
+
+                    product = products_by_id.get(product_id)
+                    if not product:
+                        continue
 
-                lot = None
-                if product.tracking == "lot":
-                    if not lote_id:
-                        return {
-                            "code": 400,
-                            "msg": f"El producto {product.display_name} requiere un lote",
-                        }
-                    lot = request.env["stock.lot"].sudo().browse(lote_id)
-                    if not lot.exists():
+                    move = (
+                        moves_by_id.get(move_id)
+                        if move_id
+                        else recepcion.move_ids.filtered(lambda m: m.product_id.id == product_id)[:1]
+                    )
+                    if not move:
                         return {
                             "code": 400,
-                            "msg": f"Lote no encontrado para el producto {product.display_name}",
+                            "msg": f"El producto {product.display_name} no está en la recepción",
                         }
 
-                # ✅ Eliminar líneas automáticas SOLO en la primera iteración
-                if not lineas_automaticas_borradas:
-                    lineas_auto = recepcion.move_line_ids.filtered(
-                        lambda l: not l.user_operator_id and not l.is_done_item
+                    stock_move = move
+
+                    lot = None
+                    if product.tracking == "lot":
+                        if not lote_id:
+                            return {
+                                "code": 400,
+                                "msg": f"El producto {product.display_name} requiere un lote",
+                            }
+                        lot = lots_by_id.get(lote_id)
+                        if not lot:
+                            return {
+                                "code": 400,
+                                "msg": f"Lote no encontrado para el producto {product.display_name}",
+                            }
+
+                    # ➕ Siempre crear una nueva línea con los datos del operario
+                    move_line_vals_list.append(
+                        {
+                            "picking_id": recepcion.id,
+                            "move_id": move.id,
+                            "product_id": product.id,
+                            "quantity": cantidad,
+                            "location_id": move.location_id.id,
+                            "location_dest_id": ubicacion_destino or move.location_dest_id.id,
+                            "product_uom_id": move.product_uom.id,
+                            "lot_id": lote_id if lote_id else False,
+                            "date_transaction": (
+                                procesar_fecha_naive(fecha_transaccion, "America/Bogota")
+                                if fecha_transaccion
+                                else datetime.now(pytz.utc)
+                            ),
+                            "new_observation": item.get("observacion"),
+                            "time": item.get("time_line"),
+                            "user_operator_id": item.get("id_operario"),
+                            "is_done_item": True,
+                        }
                     )
-                    lineas_auto.unlink()
-                    lineas_automaticas_borradas = True  # ¡Ya está hecho!
+                    lineas.append((product, lot, cantidad, ubicacion_destino, fecha_transaccion))
 
-                # ➕ Siempre crear una nueva línea con los datos del operario
-                move_line_vals = {
-                    "picking_id": recepcion.id,
-                    "move_id": move.id,
-                    "product_id": product.id,
-                    "quantity": cantidad,
-                    "location_id": move.location_id.id,
-                    "location_dest_id": ubicacion_destino or move.location_dest_id.id,
-                    "product_uom_id": move.product_uom.id,
-                    "lot_id": lote_id if lote_id else False,
-                    "date_transaction": (
-                        procesar_fecha_naive(fecha_transaccion, "America/Bogota")
-                        if fecha_transaccion
-                        else datetime.now(pytz.utc)
-                    ),
-                    "new_observation": observacion,
-                    "time": time_line,
-                    "user_operator_id": id_operario,
-                    "is_done_item": True,
-                }
+                if not move_line_vals_list:
+                    return {"code": 200, "result": []}
 
-                move_line = request.env["stock.move.line"].sudo().create(move_line_vals)
+                # ✅ Eliminar las líneas automáticas una sola vez
+                lineas_auto = recepcion.move_line_ids.filtered(lambda l: not l.user_operator_id and not l.is_done_item)
+                lineas_auto.unlink()
 
-                array_result.append(
-                    {
-                        "id": move_line.id,
-                        "producto": product.display_name,
-                        "cantidad": cantidad,
-                        "lote": lot.name if lot else "",
-                        "ubicacion_destino": ubicacion_destino,
-                        "fecha_transaccion": fecha_transaccion,
-                        "date_transaction": move_line.date_transaction,
-                        "new_observation": move_line.new_observation,
-                        "time": move_line.time,
-                        "user_operator_id": move_line.user_operator_id.id,
-                        "is_done_item": move_line.is_done_item,
-                    }
-                )
+                # ➕ Una sola creación multi-registro
+                move_lines = request.env["stock.move.line"].sudo().create(move_line_vals_list)
+
+                array_result = []
+                for move_line, (product, lot, cantidad, ubicacion_destino, fecha_transaccion) in zip(move_lines, lineas):
+                    array_result.append(
+                        {
+                            "id": move_line.id,
+                            "producto": product.display_name,
+                            "cantidad": cantidad,
+                            "lote": lot.name if lot else "",
+                            "ubicacion_destino": ubicacion_destino,
+                            "fecha_transaccion": fecha_transaccion,
+                            "date_transaction": move_line.date_transaction,
+                            "new_observation": move_line.new_observation,
+                            "time": move_line.time,
+                            "user_operator_id": move_line.user_operator_id.id,
+                            "is_done_item": move_line.is_done_item,
+                        }
+                    )
 
-            stock_move.sudo().write({"picked": True})
+                stock_move.sudo().write({"picked": True})
 
-            return {"code": 200, "result": array_result}
+                return {"code": 200, "result": array_result}
 
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
-            return {"code": 500, "msg": f"Error interno: {str(e)}"}
+            return not_stored({"code": 500, "msg": f"Error interno: {str(e)}"})
 
     @http.route("/api/update_recepcion", auth="user", type="json", methods=["POST"], csrf=False)
     def update_recepcion(self, **auth):
@@ -3514,7 +3500,7 @@ class TransaccionRecepcionController(http.Controller):
             if not user:
                 return request.make_json_response({"code": 400, "msg": "Usuario no encontrado"})
 
-            show_photo_temperature = request.env["appwms.temperature"].sudo().search([], limit=1)
+            show_photo_temperature = get_settings().temperature
             show_photo_required = (
                 show_photo_temperature.show_photo_temperature if show_photo_temperature else False
             )
@@ -4125,7 +4111,7 @@ class TransaccionRecepcionController(http.Controller):
 
     ## GET Obtener todas las ubicaciones
     @http.route("/api/ubicaciones", auth="user", type="json", methods=["GET"])
-    def get_ubicaciones(self):
+    def get_ubicaciones(self, **kwargs):
         try:
             user = request.env.user
             # ✅ Validar usuario
@@ -4139,6 +4125,18 @@ class TransaccionRecepcionController(http.Controller):
             if isinstance(allowed_warehouses, dict) and "code" in allowed_warehouses:
                 return allowed_warehouses  # Devolver el error directamente
 
+            location_domain = [("usage", "=", "internal"), ("warehouse_id", "in", allowed_warehouses.ids)]
+            etag, not_modified = check_etag(
+                [
+                    (request.env["stock.location"].sudo().with_context(active_test=False), location_domain),
+                    (request.env["stock.warehouse"].sudo(), [("id", "in", allowed_warehouses.ids)]),
+                ],
+                extra=("ubicaciones", allowed_warehouses.ids),
+                client_etag=kwargs.get("etag"),
+            )
+            if not_modified:
+                return not_modified
+
             array_ubicaciones = []
 
             for warehouse in allowed_warehouses:
@@ -4170,7 +4168,7 @@ class TransaccionRecepcionController(http.Controller):
                         }
                     )
 
-            return {"code": 200, "result": array_ubicaciones}
+            return {"code": 200, "result": array_ubicaciones, "etag": etag}
 
         except Exception as e:
             return {"code": 500, "msg": f"Error interno: {str(e)}"}
@@ -4178,8 +4176,13 @@ class TransaccionRecepcionController(http.Controller):
     ## POST Completar Recepcion
     @http.route("/api/complete_recepcion", auth="user", type="json", methods=["POST"], csrf=False)
     def complete_recepcion(self, **auth):
+        if async_requested(auth):
+            return enqueue_validation("complete_recepcion", auth.get("id_recepcion", 0), auth)
+        return self._complete_recepcion(request.env, **auth)
+
+    def _complete_recepcion(self, env, **auth):
         try:
-            user = request.env.user
+            user = env.user
 
             # ✅ Validar usuario
             if not user:
@@ -4192,7 +4195,7 @@ class TransaccionRecepcionController(http.Controller):
 
             # ✅ Buscar recepción por ID
             recepcion = (
-                request.env["stock.picking"]
+                env["stock.picking"]
                 .sudo()
                 .search(
                     [
@@ -4230,7 +4233,7 @@ class TransaccionRecepcionController(http.Controller):
                     }
 
                     wizard = (
-                        request.env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
+                        env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
                     )
 
                     # Procesar según la opción de crear_backorder
@@ -4253,7 +4256,7 @@ class TransaccionRecepcionController(http.Controller):
                 elif wizard_model == "stock.immediate.transfer":
                     wizard_context = result.get("context", {})
                     wizard = (
-                        request.env[wizard_model]
+                        env[wizard_model]
                         .sudo()
                         .with_context(**wizard_context)
                         .create({"pick_ids": [(4, id_recepcion)]})
@@ -4578,7 +4581,7 @@ class TransaccionRecepcionController(http.Controller):
                     continue
 
                 array_barcodes = (
-                    [{"barcode": b.name} for b in product.barcode_ids]
+                    [{"barcode": b.name} for b in product_fragment(product)["barcodes"]]
                     if hasattr(product, "barcode_ids")
                     else []
                 )
@@ -4588,10 +4591,10 @@ class TransaccionRecepcionController(http.Controller):
                             "barcode": p.barcode,
                             "cantidad": p.qty,
                             "id_move": p.id,
-                            "id_product": p.product_id.id,
+                            "id_product": p.product_id,
                             "batch_id": recepcion.id,
                         }
-                        for p in product.packaging_ids
+                        for p in product_fragment(product)["packagings"]
                     ]
                     if hasattr(product, "packaging_ids")
                     else []
@@ -4710,6 +4713,10 @@ class TransaccionRecepcionController(http.Controller):
             return {"code": 500, "msg": f"Error interno: {str(e)}"}
 
 
+register_job_handler("complete_recepcion", TransaccionRecepcionController, "_complete_recepcion")
+register_journal_operation("send_recepcion", TransaccionRecepcionController, "send_recepcion", "stock.picking", "id_recepcion")
+
+
 def procesar_fecha_naive(fecha_transaccion, zona_horaria_cliente):
     if fecha_transaccion:
         # Convertir la fecha enviada a datetime y agregar la zona horaria del cliente
@@ -4727,6 +4734,38 @@ def procesar_fecha_naive(fecha_transaccion, zona_horaria_cliente):
         return datetime.now().replace(tzinfo=None)
 
 
+def agrupar_por_almacen(pickings):
+    """Pickings por id de almacén (del tipo de operación), conservando el orden de la búsqueda"""
+    por_almacen = {}
+    for picking in pickings:
+        por_almacen.setdefault(picking.picking_type_id.warehouse_id.id, []).append(picking)
+    return por_almacen
+
+
+def ordenes_compra_por_origen(pickings):
+    """Órdenes de compra de los pickings sin purchase_id, buscadas por origin en una sola consulta"""
+    origins = {picking.origin for picking in pickings if picking.origin and not picking.purchase_id}
+    ordenes = {}
+    if origins:
+        for orden in request.env["purchase.order"].sudo().search([("name", "in", list(origins))]):
+            ordenes.setdefault(orden.name, orden)
+    return ordenes
+
+
+def vencimientos_por_producto(products):
+    """Fecha de vencimiento más próxima de los lotes de cada producto (con seguimiento por lote)"""
+    lot_products = products.filtered(lambda product: product.tracking == "lot")
+    Lot = request.env["stock.lot"]
+    if not lot_products or "expiration_date" not in Lot._fields:
+        return {}
+    groups = Lot._read_group(
+        [("product_id", "in", lot_products.ids)],
+        groupby=["product_id"],
+        aggregates=["expiration_date:min"],
+    )
+    return {product.id: expiration_date for product, expiration_date in groups if expiration_date}
+
+
 def obtener_almacenes_usuario(user):
 
     user_wms = request.env["appwms.users_wms"].sudo().search([("user_id", "=", user.id)], limit=1)
@@ -4745,8 +4784,8 @@ def obtener_almacenes_usuario(user):
     return allowed_warehouses
 
 
-def obtener_info_ubicacion(ubicacion_id):
-    ubicacion = request.env["stock.location"].sudo().browse(ubicacion_id)
+def obtener_info_ubicacion(ubicacion_id, env=None):
+    ubicacion = (env or request.env)["stock.location"].sudo().browse(ubicacion_id)
 
     if not ubicacion.exists():
         return {"code": 400, "msg": f"La ubicación con ID {ubicacion_id} no existe"}
@@ -4754,33 +4793,10 @@ def obtener_info_ubicacion(ubicacion_id):
     return ubicacion
 
 
-def obtener_info_producto(product_id):
-    producto = request.env["product.product"].sudo().browse(product_id)
+def obtener_info_producto(product_id, env=None):
+    producto = (env or request.env)["product.product"].sudo().browse(product_id)
 
     if not producto.exists():
         return {"code": 400, "msg": f"El producto con ID {product_id} no existe"}
 
     return producto
-
-
-def validate_pda(device_id):
-    """
-    Solo valida que la PDA existe y está autorizada
-    Returns: dict con error si hay problema, None si todo está OK
-    """
-    if not device_id:
-        return {
-            "code": 400,
-            "msg": "Device ID no proporcionado, por favor actualizar a la ultima version de la app",
-        }
-
-    pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)])
-
-    if not pda:
-        return {"code": 404, "msg": "PDA no encontrado"}
-
-    if pda.is_authorized == "no":
-        return {"code": 403, "msg": "PDA no autorizado"}
-
-    # Si llegamos aquí, todo está bien
-    return None
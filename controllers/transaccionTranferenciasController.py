@@ -7,66 +7,41 @@ from odoo.exceptions import AccessError, UserError, ValidationError
 from odoo.http import request
 from odoo.tools import float_compare, html2plaintext
 
-from .utils import get_barcodes, get_packagings
+from . import app_version
+from .barcode_index import (
+    BARCODE_TYPES,
+    BULK_BARCODES_LIMIT,
+    FUZZY_DEFAULT_LIMIT,
+    FUZZY_MAX_LIMIT,
+    FUZZY_MIN_LENGTH,
+    normalize_barcode,
+    resolve_barcode,
+    resolve_barcodes,
+    search_barcodes,
+)
+from .db_retry import CONCURRENCY_ERRORS, retry_on_concurrency
+from .idempotency import idempotent, not_stored
+from .offline_journal import register_journal_operation
+from .delta_sync import parse_sync_params
+from .ndjson_stream import iter_records, ndjson_response
+from .pda_auth import validate_pda
+from .settings_snapshot import get_settings
+from .utils import FieldSelector, ProductCatalog, get_barcodes, get_packagings, product_fragment
+from .validation_jobs import async_requested, enqueue_validation, job_status, register_job_handler
+
+# Listas anidadas de los serializadores con selección de campos (fields=)
+PICK_V2_CONTAINERS = {"lineas_transferencia": {}, "lineas_transferencia_enviadas": {}}
+PACK_V2_CONTAINERS = {"lista_productos": {}, "lista_paquetes": {"lista_productos_in_packing": {}}}
 
 
 class TransaccionTransferenciasController(http.Controller):
-    def get_last_version(self):
-        try:
-            # Obtener la última versión
-            last_version = request.env["app.version"].sudo().search([], order="id desc", limit=1)
-
-            if not last_version:
-                return {"code": 404, "msg": "No se encontró ninguna versión"}
-
-            # Convertir el texto JSON a una lista Python
-            notes_list = []
-            if last_version.notes:
-                try:
-                    notes_list = json.loads(last_version.notes)
-                except:
-                    notes_list = ["Error al procesar las notas"]
-
-            return {
-                "code": 200,
-                "result": {
-                    "id": last_version.id,
-                    "version": last_version.version,
-                    "release_date": str(last_version.release_date),
-                    "notes": notes_list,  # Ahora devuelve la lista en lugar del string JSON
-                    "url_download": last_version.url_download,
-                },
-            }
-
-        except AccessError as e:
-            return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
-        except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
-
     ## GET Obtener todas las transferencias
     @http.route("/api/transferencias", auth="user", type="json", methods=["GET"])
     def get_transferencias(self, **kwargs):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -178,11 +153,11 @@ class TransaccionTransferenciasController(http.Controller):
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                     if p.barcode  # Esta condición asegura que el campo 'barcode' tenga un valor.
                                 ],
                                 "quantity_ordered": quantity_ordered,
@@ -252,11 +227,11 @@ class TransaccionTransferenciasController(http.Controller):
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity_ordered": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -420,16 +395,16 @@ class TransaccionTransferenciasController(http.Controller):
                                 "product_barcode": product.barcode or "",
                                 "product_tracking": product.tracking or "",
                                 "dias_vencimiento": product.expiration_time or "",
-                                "other_barcodes": [{"barcode": b.name} for b in getattr(product, "barcode_ids", [])],
+                                "other_barcodes": [{"barcode": b.name} for b in product_fragment(product)["barcodes"]],
                                 "product_packing": [
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                 ],
                                 "quantity_ordered": quantity_ordered,
                                 "quantity_to_transfer": quantity_ordered,
@@ -490,16 +465,16 @@ class TransaccionTransferenciasController(http.Controller):
                             "product_barcode": product.barcode or "",
                             "product_tracking": product.tracking or "",
                             "dias_vencimiento": product.expiration_time or "",
-                            "other_barcodes": [{"barcode": b.name} for b in getattr(product, "barcode_ids", [])],
+                            "other_barcodes": [{"barcode": b.name} for b in product_fragment(product)["barcodes"]],
                             "product_packing": [
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity_ordered": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -557,24 +532,7 @@ class TransaccionTransferenciasController(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -590,7 +548,7 @@ class TransaccionTransferenciasController(http.Controller):
                     "msg": "Usuario no encontrado",
                 }
 
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = get_settings().picking_strategy
 
             array_transferencias = []
 
@@ -686,7 +644,7 @@ class TransaccionTransferenciasController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "id_product": product.id or 0,
                                 }
-                                for barcode in product.barcode_ids
+                                for barcode in product_fragment(product)["barcodes"]
                                 if barcode.name
                             ]
                             if hasattr(product, "barcode_ids")
@@ -703,10 +661,10 @@ class TransaccionTransferenciasController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "product_id": (move["product_id"][0] if move["product_id"] else 0),
                                 }
-                                for pack in product.packaging_ids
+                                for pack in product_fragment(product)["packagings"]
                                 if pack.barcode
                             ]
-                            if product.packaging_ids
+                            if product_fragment(product)["packagings"]
                             else []
                         )
 
@@ -734,11 +692,11 @@ class TransaccionTransferenciasController(http.Controller):
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                     if p.barcode  # Esta condición asegura que el campo 'barcode' tenga un valor.
                                 ],
                                 "quantity": quantity_done,
@@ -820,12 +778,12 @@ class TransaccionTransferenciasController(http.Controller):
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
-                                    "product_id": p.product_id.id,
+                                    "product_id": p.product_id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -916,7 +874,19 @@ class TransaccionTransferenciasController(http.Controller):
             if validation_error:
                 return validation_error
 
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            sync = parse_sync_params(kwargs)
+            if isinstance(sync, dict):
+                return sync
+
+            picking_strategy = get_settings().picking_strategy
+
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            lineas_filter = fields_filter.child("lineas_transferencia", exclude=catalog.line_keys)
+            enviadas_filter = fields_filter.child("lineas_transferencia_enviadas", exclude=catalog.line_keys)
+            # Los códigos y empaques se comparten entre ambas listas de líneas
+            barcodes_wanted = lineas_filter.wants("other_barcode") or enviadas_filter.wants("other_barcode")
+            packings_wanted = lineas_filter.wants("product_packing") or enviadas_filter.wants("product_packing")
 
             array_transferencias = []
 
@@ -925,19 +895,19 @@ class TransaccionTransferenciasController(http.Controller):
                 return allowed_warehouses
 
             for warehouse in allowed_warehouses:
-                transferencias_pendientes = (
-                    request.env["stock.picking"]
-                    .sudo()
-                    .search(
-                        [
-                            ("state", "in", ["assigned", "confirmed"]),
-                            ("picking_type_code", "=", "internal"),
-                            ("picking_type_id.warehouse_id", "=", warehouse.id),
-                            ("picking_type_id.sequence_code", "in", ["PICK"]),
-                            ("responsable_id", "in", [user.id, False]),
-                            ("batch_id", "=", False),
-                        ]
-                    )
+                transferencias_pendientes = sync.search(
+                    warehouse.id,
+                    request.env["stock.picking"].sudo(),
+                    [
+                        ("state", "in", ["assigned", "confirmed"]),
+                        ("picking_type_code", "=", "internal"),
+                        ("picking_type_id.warehouse_id", "=", warehouse.id),
+                        ("picking_type_id.sequence_code", "in", ["PICK"]),
+                        ("responsable_id", "in", [user.id, False]),
+                        ("batch_id", "=", False),
+                    ],
+                    lines_field="move_line_ids",
+                    volatile_fields=("state", "responsable_id", "batch_id"),
                 )
 
                 for picking in transferencias_pendientes:
@@ -950,45 +920,48 @@ class TransaccionTransferenciasController(http.Controller):
                     # Obtener si se maneja Crear orden parcial
                     create_backorder = picking.picking_type_id.create_backorder if hasattr(picking.picking_type_id, "create_backorder") else False
 
-                    transferencia_info = {
-                        "id": picking.id,
-                        "name": picking.name,
-                        "fecha_creacion": picking.create_date,
-                        "location_id": picking.location_id.id,
-                        "location_name": picking.location_id.display_name,
-                        "location_barcode": picking.location_id.barcode or "",
-                        "location_dest_id": picking.location_dest_id.id,
-                        "location_dest_name": picking.location_dest_id.display_name,
-                        "location_dest_barcode": picking.location_dest_id.barcode or "",
-                        "proveedor": picking.partner_id.name or "",
-                        "numero_transferencia": picking.name,
-                        "peso_total": 0,
-                        "numero_lineas": 0,
-                        "numero_items": sum(move.product_uom_qty for move in picking.move_ids),
-                        "state": picking.state,
-                        "create_backorder": create_backorder,
-                        "origin": picking.origin or "",
-                        "priority": picking.priority,
-                        "warehouse_id": warehouse.id,
-                        "warehouse_name": warehouse.name,
-                        "responsable_id": picking.responsable_id.id or 0,
-                        "responsable": picking.responsable_id.name or "",
-                        "picking_type": picking.picking_type_id.name,
-                        "start_time_transfer": picking.start_time_transfer or "",
-                        "end_time_transfer": picking.end_time_transfer or "",
-                        "backorder_id": picking.backorder_id.id or 0,
-                        "backorder_name": picking.backorder_id.name or "",
-                        "show_check_availability": picking.show_check_availability,
-                        "order_by": (picking_strategy.picking_priority_app if picking_strategy else ""),
-                        "order_picking": (picking_strategy.picking_order_app if picking_strategy else ""),
-                        "muelle": picking.location_dest_id.display_name or "",
-                        "muelle_id": picking.location_dest_id.id or 0,
-                        "id_muelle_padre": picking.location_dest_id.location_id.id or 0,
-                        "barcode_muelle": picking.location_dest_id.barcode or "",
-                        "zona_entrega": picking.delivery_zone_id.display_name or "",
-                        "lineas_transferencia": [],
-                        "lineas_transferencia_enviadas": [],
-                    }
+                    transferencia_info = fields_filter.build(
+                        {
+                            "id": picking.id,
+                            "name": picking.name,
+                            "fecha_creacion": picking.create_date,
+                            "location_id": lambda: picking.location_id.id,
+                            "location_name": lambda: picking.location_id.display_name,
+                            "location_barcode": lambda: picking.location_id.barcode or "",
+                            "location_dest_id": lambda: picking.location_dest_id.id,
+                            "location_dest_name": lambda: picking.location_dest_id.display_name,
+                            "location_dest_barcode": lambda: picking.location_dest_id.barcode or "",
+                            "proveedor": lambda: picking.partner_id.name or "",
+                            "numero_transferencia": picking.name,
+                            "peso_total": 0,
+                            "numero_lineas": 0,
+                            "numero_items": lambda: sum(move.product_uom_qty for move in picking.move_ids),
+                            "state": picking.state,
+                            "create_backorder": create_backorder,
+                            "origin": lambda: picking.origin or "",
+                            "priority": picking.priority,
+                            "warehouse_id": warehouse.id,
+                            "warehouse_name": warehouse.name,
+                            "responsable_id": lambda: picking.responsable_id.id or 0,
+                            "responsable": lambda: picking.responsable_id.name or "",
+                            "picking_type": lambda: picking.picking_type_id.name,
+                            "start_time_transfer": lambda: picking.start_time_transfer or "",
+                            "end_time_transfer": lambda: picking.end_time_transfer or "",
+                            "backorder_id": lambda: picking.backorder_id.id or 0,
+                            "backorder_name": lambda: picking.backorder_id.name or "",
+                            "show_check_availability": picking.show_check_availability,
+                            "order_by": (lambda: picking_strategy.picking_priority_app if picking_strategy else ""),
+                            "order_picking": (lambda: picking_strategy.picking_order_app if picking_strategy else ""),
+                            "muelle": lambda: picking.location_dest_id.display_name or "",
+                            "muelle_id": lambda: picking.location_dest_id.id or 0,
+                            "id_muelle_padre": lambda: picking.location_dest_id.location_id.id or 0,
+                            "barcode_muelle": lambda: picking.location_dest_id.barcode or "",
+                            "zona_entrega": lambda: picking.delivery_zone_id.display_name or "",
+                            "lineas_transferencia": [],
+                            "lineas_transferencia_enviadas": [],
+                        },
+                        PICK_V2_CONTAINERS,
+                    )
 
                     for move in movimientos_operaciones:
                         product = move.product_id
@@ -1009,10 +982,10 @@ class TransaccionTransferenciasController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "id_product": product.id or 0,
                                 }
-                                for barcode in product.barcode_ids
+                                for barcode in product_fragment(product)["barcodes"]
                                 if barcode.name
                             ]
-                            if hasattr(product, "barcode_ids")
+                            if barcodes_wanted and hasattr(product, "barcode_ids")
                             else []
                         )
 
@@ -1026,10 +999,10 @@ class TransaccionTransferenciasController(http.Controller):
                                     "id_move": move.move_id.id if move.move_id else 0,
                                     "product_id": (move["product_id"][0] if move["product_id"] else 0),
                                 }
-                                for pack in product.packaging_ids
+                                for pack in product_fragment(product)["packagings"]
                                 if pack.barcode
                             ]
-                            if product.packaging_ids
+                            if packings_wanted and product_fragment(product)["packagings"]
                             else []
                         )
 
@@ -1037,64 +1010,67 @@ class TransaccionTransferenciasController(http.Controller):
                             continue
 
                         if not move.is_done_item:
-                            linea_info = {
-                                "id": move.move_id.id if move.move_id else 0,
-                                "id_move": move.id,
-                                "id_transferencia": picking.id,
-                                "batch_id": picking.id,  # ✅
-                                "id_product": product.id,
-                                "product_id": [product.id, product.display_name],  # ✅
-                                "product_name": product.display_name,
-                                "product_code": product.default_code or "",
-                                "barcode": product.barcode or "",
-                                "product_tracking": product.tracking or "",
-                                "dias_vencimiento": product.expiration_time or "",
-                                "other_barcodes": [{"barcode": b.name} for b in getattr(product, "barcode_ids", [])],
-                                "product_packing": [
-                                    {
-                                        "barcode": p.barcode,
-                                        "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
-                                        "id_move": move.id,
-                                        "batch_id": picking.id,
-                                    }
-                                    for p in getattr(product, "packaging_ids", [])
-                                ],
-                                "quantity": quantity_done,
-                                "quantity_to_transfer": quantity_ordered,
-                                # "quantity_done": quantity_done,
-                                "cantidad_faltante": cantidad_faltante,
-                                "unidades": (move.move_id.product_uom.name if move.move_id and move.move_id.product_uom else "UND"),
-                                "location_dest_id": [
-                                    move.location_dest_id.id,
-                                    move.location_dest_id.display_name,
-                                ],  # ✅
-                                "location_dest_name": move.location_dest_id.display_name or "",
-                                "barcode_location_dest": move.location_dest_id.barcode or "",
-                                "location_id": [
-                                    move.location_id.id,
-                                    move.location_id.display_name,
-                                ],  # ✅
-                                "location_name": move.location_id.display_name or "",
-                                "barcode_location": move.location_id.barcode or "",
-                                "weight": product.weight or 0,
-                                "rimoval_priority": location.priority_picking_desplay,
-                                "zona_entrega": picking.delivery_zone_id.display_name,
-                                "other_barcode": array_all_barcode,
-                                "product_packing": array_packing,
-                                "pedido": picking.name,
-                                "pedido_id": picking.id,
-                                "origin": picking.origin or "",
-                                "lote_id": move.lot_id.id or 0,
-                                "lote": move.lot_id.name or "",
-                                "is_done_item": False,
-                                "date_transaction": "",
-                                "observation": "",
-                                "time_separate": "",
-                                "user_operator_id": 0,
-                                "expire_date": move.lot_id.expiration_date or "",
-                                "is_separate": 0,
-                            }
+                            catalog.add(product)
+                            linea_info = lineas_filter.build(
+                                {
+                                    "id": lambda: move.move_id.id if move.move_id else 0,
+                                    "id_move": move.id,
+                                    "id_transferencia": picking.id,
+                                    "batch_id": picking.id,  # ✅
+                                    "id_product": product.id,
+                                    "product_id": lambda: [product.id, product.display_name],  # ✅
+                                    "product_name": product.display_name,
+                                    "product_code": lambda: product.default_code or "",
+                                    "barcode": lambda: product.barcode or "",
+                                    "product_tracking": lambda: product.tracking or "",
+                                    "dias_vencimiento": lambda: product.expiration_time or "",
+                                    "other_barcodes": lambda: [{"barcode": b.name} for b in product_fragment(product)["barcodes"]],
+                                    "product_packing": lambda: [
+                                        {
+                                            "barcode": p.barcode,
+                                            "cantidad": p.qty,
+                                            "id_product": p.product_id,
+                                            "id_move": move.id,
+                                            "batch_id": picking.id,
+                                        }
+                                        for p in product_fragment(product)["packagings"]
+                                    ],
+                                    "quantity": quantity_done,
+                                    "quantity_to_transfer": quantity_ordered,
+                                    # "quantity_done": quantity_done,
+                                    "cantidad_faltante": cantidad_faltante,
+                                    "unidades": (lambda: move.move_id.product_uom.name if move.move_id and move.move_id.product_uom else "UND"),
+                                    "location_dest_id": lambda: [
+                                        move.location_dest_id.id,
+                                        move.location_dest_id.display_name,
+                                    ],  # ✅
+                                    "location_dest_name": lambda: move.location_dest_id.display_name or "",
+                                    "barcode_location_dest": lambda: move.location_dest_id.barcode or "",
+                                    "location_id": lambda: [
+                                        move.location_id.id,
+                                        move.location_id.display_name,
+                                    ],  # ✅
+                                    "location_name": lambda: move.location_id.display_name or "",
+                                    "barcode_location": lambda: move.location_id.barcode or "",
+                                    "weight": lambda: product.weight or 0,
+                                    "rimoval_priority": location.priority_picking_desplay,
+                                    "zona_entrega": lambda: picking.delivery_zone_id.display_name,
+                                    "other_barcode": array_all_barcode,
+                                    "product_packing": array_packing,
+                                    "pedido": picking.name,
+                                    "pedido_id": picking.id,
+                                    "origin": lambda: picking.origin or "",
+                                    "lote_id": lambda: move.lot_id.id or 0,
+                                    "lote": lambda: move.lot_id.name or "",
+                                    "is_done_item": False,
+                                    "date_transaction": "",
+                                    "observation": "",
+                                    "time_separate": "",
+                                    "user_operator_id": 0,
+                                    "expire_date": lambda: move.lot_id.expiration_date or "",
+                                    "is_separate": 0,
+                                }
+                            )
 
                             # if move.lot_id:
                             #     linea_info.update({"lote": move.lot_id.name, "lot_id": move.lot_id.id or 0})
@@ -1119,66 +1095,69 @@ class TransaccionTransferenciasController(http.Controller):
 
                         cantidad_faltante = quantity_ordered - quantity_done
 
-                        linea_info = {
-                            "id": move_line.id,
-                            "id_move": move_line.id,
-                            "id_transferencia": picking.id,
-                            "batch_id": picking.id,  # ✅
-                            "id_product": product.id,
-                            "product_id": [product.id, product.display_name],  # ✅
-                            "product_name": product.display_name,
-                            "product_code": product.default_code or "",
-                            "barcode": product.barcode or "",
-                            "product_tracking": product.tracking or "",
-                            "dias_vencimiento": product.expiration_time or "",
-                            "other_barcodes": [{"barcode": b.name} for b in getattr(product, "barcode_ids", [])],
-                            "product_packing": [
-                                {
-                                    "barcode": p.barcode,
-                                    "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
-                                    "id_move": move_line.id,
-                                    "batch_id": picking.id,
-                                }
-                                for p in getattr(product, "packaging_ids", [])
-                            ],
-                            "quantity": quantity_ordered,
-                            "quantity_to_transfer": quantity_ordered,
-                            "quantity_done": move_line.quantity,
-                            "cantidad_faltante": quantity_ordered,
-                            "unidades": (move_line.product_uom_id.name if move_line.product_uom_id else "UND"),
-                            "location_dest_id": [
-                                move_line.location_dest_id.id,
-                                move_line.location_dest_id.display_name,
-                            ],  # ✅
-                            "location_dest_name": move_line.location_dest_id.display_name or "",
-                            "barcode_location_dest": move_line.location_dest_id.barcode or "",
-                            "location_id": [
-                                move_line.location_id.id,
-                                move_line.location_id.display_name,
-                            ],  # ✅
-                            "location_name": move_line.location_id.display_name or "",
-                            "barcode_location": move_line.location_id.barcode or "",
-                            "weight": product.weight or 0,
-                            "rimoval_priority": location.priority_picking_desplay,
-                            "zona_entrega": picking.delivery_zone_id.display_name,
-                            "other_barcode": array_all_barcode,
-                            "product_packing": array_packing,
-                            "pedido": picking.name,
-                            "pedido_id": picking.id,
-                            "origin": picking.origin or "",
-                            "lote_id": move_line.lot_id.id or 0,
-                            "lote": move_line.lot_id.name or "",
-                            "quantity_separate": move_line.quantity,
-                            "is_done_item": move_line.is_done_item,
-                            "date_transaction": move_line.date_transaction or "",
-                            "observation": move_line.new_observation or "",
-                            "time_separate": format_time_from_seconds(move_line.time),
-                            "time": move_line.time or 0,
-                            "user_operator_id": (move_line.user_operator_id.id if move_line.user_operator_id else 0),
-                            "expire_date": move_line.lot_id.expiration_date or "",
-                            "is_separate": 1,
-                        }
+                        catalog.add(product)
+                        linea_info = enviadas_filter.build(
+                            {
+                                "id": move_line.id,
+                                "id_move": move_line.id,
+                                "id_transferencia": picking.id,
+                                "batch_id": picking.id,  # ✅
+                                "id_product": product.id,
+                                "product_id": lambda: [product.id, product.display_name],  # ✅
+                                "product_name": product.display_name,
+                                "product_code": lambda: product.default_code or "",
+                                "barcode": lambda: product.barcode or "",
+                                "product_tracking": lambda: product.tracking or "",
+                                "dias_vencimiento": lambda: product.expiration_time or "",
+                                "other_barcodes": lambda: [{"barcode": b.name} for b in product_fragment(product)["barcodes"]],
+                                "product_packing": lambda: [
+                                    {
+                                        "barcode": p.barcode,
+                                        "cantidad": p.qty,
+                                        "id_product": p.product_id,
+                                        "id_move": move_line.id,
+                                        "batch_id": picking.id,
+                                    }
+                                    for p in product_fragment(product)["packagings"]
+                                ],
+                                "quantity": quantity_ordered,
+                                "quantity_to_transfer": quantity_ordered,
+                                "quantity_done": move_line.quantity,
+                                "cantidad_faltante": quantity_ordered,
+                                "unidades": (lambda: move_line.product_uom_id.name if move_line.product_uom_id else "UND"),
+                                "location_dest_id": lambda: [
+                                    move_line.location_dest_id.id,
+                                    move_line.location_dest_id.display_name,
+                                ],  # ✅
+                                "location_dest_name": lambda: move_line.location_dest_id.display_name or "",
+                                "barcode_location_dest": lambda: move_line.location_dest_id.barcode or "",
+                                "location_id": lambda: [
+                                    move_line.location_id.id,
+                                    move_line.location_id.display_name,
+                                ],  # ✅
+                                "location_name": lambda: move_line.location_id.display_name or "",
+                                "barcode_location": lambda: move_line.location_id.barcode or "",
+                                "weight": lambda: product.weight or 0,
+                                "rimoval_priority": location.priority_picking_desplay,
+                                "zona_entrega": lambda: picking.delivery_zone_id.display_name,
+                                "other_barcode": array_all_barcode,
+                                "product_packing": array_packing,
+                                "pedido": picking.name,
+                                "pedido_id": picking.id,
+                                "origin": lambda: picking.origin or "",
+                                "lote_id": lambda: move_line.lot_id.id or 0,
+                                "lote": lambda: move_line.lot_id.name or "",
+                                "quantity_separate": move_line.quantity,
+                                "is_done_item": move_line.is_done_item,
+                                "date_transaction": lambda: move_line.date_transaction or "",
+                                "observation": lambda: move_line.new_observation or "",
+                                "time_separate": lambda: format_time_from_seconds(move_line.time),
+                                "time": lambda: move_line.time or 0,
+                                "user_operator_id": (lambda: move_line.user_operator_id.id if move_line.user_operator_id else 0),
+                                "expire_date": lambda: move_line.lot_id.expiration_date or "",
+                                "is_separate": 1,
+                            }
+                        )
 
                         # if move_line.lot_id:
                         #     linea_info.update({"lot_id": [move_line.lot_id.id, move_line.lot_id.name]})
@@ -1200,7 +1179,7 @@ class TransaccionTransferenciasController(http.Controller):
                     if transferencia_info["lineas_transferencia"]:
                         array_transferencias.append(transferencia_info)
 
-            return {"code": 200, "result": array_transferencias}
+            return {"code": 200, "result": fields_filter.prune(array_transferencias, PICK_V2_CONTAINERS), **catalog.meta(), **sync.meta(item["id"] for item in array_transferencias)}
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
@@ -1213,24 +1192,7 @@ class TransaccionTransferenciasController(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -1375,11 +1337,11 @@ class TransaccionTransferenciasController(http.Controller):
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                     if p.barcode  # Esta condición asegura que el campo 'barcode' tenga un valor.
                                 ],
                                 "quantity": quantity_done,
@@ -1416,11 +1378,11 @@ class TransaccionTransferenciasController(http.Controller):
                                     {
                                         "barcode": pack.barcode,
                                         "cantidad": pack.qty,
-                                        "id_product": pack.product_id.id,
+                                        "id_product": pack.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ],
                                 "maneja_temperatura": (product.temperature_control if hasattr(product, "temperature_control") else False),
@@ -1473,11 +1435,11 @@ class TransaccionTransferenciasController(http.Controller):
                                 {
                                     "barcode": p.barcode,
                                     "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
+                                    "id_product": p.product_id,
                                     "id_move": move_line.id,
                                     "batch_id": picking.id,
                                 }
-                                for p in getattr(product, "packaging_ids", [])
+                                for p in product_fragment(product)["packagings"]
                             ],
                             "quantity_ordered": quantity_ordered,
                             "quantity_to_transfer": quantity_ordered,
@@ -1608,275 +1570,265 @@ class TransaccionTransferenciasController(http.Controller):
                 "msg": f"Error inesperado: {str(err)}",
             }
 
+    def _prepare_pack_v2(self, kwargs):
+        """
+        Valida usuario, PDA y parámetros de las transferencias pack/v2
+
+        Returns:
+            Tupla (error, sync, allowed_warehouses); error es el diccionario a
+            devolver, o None si la petición es válida
+        """
+        user = request.env.user
+
+        if not user:
+            return {"code": 400, "msg": "Usuario no encontrado"}, None, None
+
+        device_id = kwargs.get("device_id") or request.params.get("device_id")
+
+        validation_error = validate_pda(device_id)
+        if validation_error:
+            return validation_error, None, None
+
+        sync = parse_sync_params(kwargs)
+        if isinstance(sync, dict):
+            return sync, None, None
+
+        allowed_warehouses = obtener_almacenes_usuario(user)
+        if isinstance(allowed_warehouses, dict) and "code" in allowed_warehouses:
+            return allowed_warehouses, None, None
+
+        return None, sync, allowed_warehouses
+
     @http.route("/api/transferencias/pack/v2", auth="user", type="json", methods=["GET"])
     def get_transferencias_pack_v2(self, **kwargs):
         try:
-            user = request.env.user
+            error, sync, allowed_warehouses = self._prepare_pack_v2(kwargs)
+            if error:
+                return error
 
-            if not user:
-                return {"code": 400, "msg": "Usuario no encontrado"}
-
-            device_id = kwargs.get("device_id") or request.params.get("device_id")
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            base_url = request.httprequest.host_url.rstrip("/")
 
-            validation_error = validate_pda(device_id)
-            if validation_error:
-                return validation_error
+            array_transferencias = list(
+                self._iter_transferencias_pack_v2(request.env, allowed_warehouses, sync, fields_filter, catalog, base_url)
+            )
 
-            array_transferencias = []
+            return {"code": 200, "result": array_transferencias, **catalog.meta(), **sync.meta(item["id"] for item in array_transferencias)}
 
-            base_url = request.httprequest.host_url.rstrip("/")
+        except AccessError as e:
+            return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except Exception as err:
+            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
-            allowed_warehouses = obtener_almacenes_usuario(user)
-            if isinstance(allowed_warehouses, dict) and "code" in allowed_warehouses:
-                return allowed_warehouses
+    ## GET Transferencias pack v2 en streaming (NDJSON, una transferencia por línea)
+    @http.route("/api/transferencias/pack/v2/stream", auth="user", type="http", methods=["GET"], csrf=False)
+    def get_transferencias_pack_v2_stream(self, **kwargs):
+        try:
+            error, sync, allowed_warehouses = self._prepare_pack_v2(kwargs)
+            if error:
+                return request.make_json_response(error)
 
-            for warehouse in allowed_warehouses:
-                # Obtener el campo `delivery_steps` del almacén
-                delivery_steps = warehouse.delivery_steps
-                if not delivery_steps:
-                    continue  # Saltar si no hay información sobre `delivery_steps`
+            fields_filter = FieldSelector.from_kwargs(kwargs)
+            catalog = ProductCatalog.from_kwargs(kwargs)
+            base_url = request.httprequest.host_url.rstrip("/")
 
-                # Determinar el `sequence_code` basado en los pasos de entrega
-                if delivery_steps == "ship_only":
-                    # 1 paso: Entregar bienes directamente
-                    sequence_code = "OUT"
-                elif delivery_steps == "pick_ship":
-                    # 2 pasos: Enviar bienes a ubicación de salida y entregar
-                    sequence_code = "OUT"
-                elif delivery_steps == "pick_pack_ship":
-                    # 3 pasos: Empaquetar, transferir bienes a ubicación de salida, y enviar
-                    sequence_code = "PACK"
-                else:
-                    continue  # Si no hay una coincidencia válida, saltar este almacén
+            return ndjson_response(
+                lambda env: self._iter_transferencias_pack_v2(env, allowed_warehouses, sync, fields_filter, catalog, base_url),
+                trailer=lambda emitted_ids: {**catalog.meta(), **sync.meta(emitted_ids)},
+            )
 
-                transferencias_pendientes = (
-                    request.env["stock.picking"]
-                    .sudo()
-                    .search(
-                        [
-                            ("state", "in", ["assigned", "confirmed"]),
-                            # ("picking_type_code", "=", "internal"),
-                            ("picking_type_id.warehouse_id", "=", warehouse.id),
-                            ("picking_type_id.sequence_code", "in", [sequence_code]),
-                            ("responsable_id", "in", [user.id, False]),
-                            ("batch_id", "=", False),
-                        ]
-                    )
-                )
+        except Exception as err:
+            return request.make_json_response({"code": 400, "msg": f"Error inesperado: {str(err)}"})
+
+    def _iter_transferencias_pack_v2(self, env, allowed_warehouses, sync, fields_filter, catalog, base_url):
+        """Genera una a una las transferencias de pack/v2, ya filtradas por fields"""
+        user = env.user
+        productos_filter = fields_filter.child("lista_productos", exclude=catalog.line_keys)
+        paquetes_filter = fields_filter.child("lista_paquetes")
+        packing_filter = paquetes_filter.child("lista_productos_in_packing", exclude=catalog.line_keys)
+
+        for warehouse in allowed_warehouses.with_env(env):
+            # Obtener el campo `delivery_steps` del almacén
+            delivery_steps = warehouse.delivery_steps
+            if not delivery_steps:
+                continue  # Saltar si no hay información sobre `delivery_steps`
+
+            # Determinar el `sequence_code` basado en los pasos de entrega
+            if delivery_steps == "ship_only":
+                # 1 paso: Entregar bienes directamente
+                sequence_code = "OUT"
+            elif delivery_steps == "pick_ship":
+                # 2 pasos: Enviar bienes a ubicación de salida y entregar
+                sequence_code = "OUT"
+            elif delivery_steps == "pick_pack_ship":
+                # 3 pasos: Empaquetar, transferir bienes a ubicación de salida, y enviar
+                sequence_code = "PACK"
+            else:
+                continue  # Si no hay una coincidencia válida, saltar este almacén
+
+            transferencias_pendientes = sync.search(
+                warehouse.id,
+                env["stock.picking"].sudo(),
+                [
+                    ("state", "in", ["assigned", "confirmed"]),
+                    # ("picking_type_code", "=", "internal"),
+                    ("picking_type_id.warehouse_id", "=", warehouse.id),
+                    ("picking_type_id.sequence_code", "in", [sequence_code]),
+                    ("responsable_id", "in", [user.id, False]),
+                    ("batch_id", "=", False),
+                ],
+                lines_field="move_line_ids",
+                volatile_fields=("state", "responsable_id", "batch_id"),
+            )
 
-                for picking in transferencias_pendientes:
-                    movimientos_operaciones = picking.move_line_ids
-                    movimientos_enviados = picking.move_line_ids
+            for picking in iter_records(transferencias_pendientes):
+                movimientos_operaciones = picking.move_line_ids
+                movimientos_enviados = picking.move_line_ids
 
-                    if not movimientos_operaciones:
-                        continue
+                if not movimientos_operaciones:
+                    continue
 
-                    # Obtener si se maneja Crear orden parcial
-                    create_backorder = picking.picking_type_id.create_backorder if hasattr(picking.picking_type_id, "create_backorder") else False
+                # Obtener si se maneja Crear orden parcial
+                create_backorder = picking.picking_type_id.create_backorder if hasattr(picking.picking_type_id, "create_backorder") else False
 
-                    transferencia_info = {
+                transferencia_info = fields_filter.build(
+                    {
                         "batch_id": picking.id,
                         "id": picking.id,
                         "name": picking.name,
                         "fecha_creacion": picking.create_date,
-                        "location_id": picking.location_id.id,
-                        "location_name": picking.location_id.display_name,
-                        "location_barcode": picking.location_id.barcode or "",
-                        "location_dest_id": picking.location_dest_id.id,
-                        "location_dest_name": picking.location_dest_id.display_name,
-                        "location_dest_barcode": picking.location_dest_id.barcode or "",
-                        "proveedor": picking.partner_id.name or "",
+                        "location_id": lambda: picking.location_id.id,
+                        "location_name": lambda: picking.location_id.display_name,
+                        "location_barcode": lambda: picking.location_id.barcode or "",
+                        "location_dest_id": lambda: picking.location_dest_id.id,
+                        "location_dest_name": lambda: picking.location_dest_id.display_name,
+                        "location_dest_barcode": lambda: picking.location_dest_id.barcode or "",
+                        "proveedor": lambda: picking.partner_id.name or "",
                         "numero_transferencia": picking.name,
                         "peso_total": 0,
                         "numero_lineas": 0,
-                        "numero_items": sum(move.product_uom_qty for move in picking.move_ids),
+                        "numero_items": lambda: sum(move.product_uom_qty for move in picking.move_ids),
                         "state": picking.state,
                         "create_backorder": create_backorder,
-                        "referencia": picking.origin or "",
-                        "contacto": picking.partner_id or 0,
-                        "contacto_name": picking.partner_id.name or "",
-                        "cantidad_productos": len(picking.move_line_ids.filtered(lambda ml: not ml.is_done_item)),
-                        "cantidad_productos_total": len(picking.move_line_ids),
+                        "referencia": lambda: picking.origin or "",
+                        "contacto": lambda: picking.partner_id or 0,
+                        "contacto_name": lambda: picking.partner_id.name or "",
+                        "cantidad_productos": lambda: len(picking.move_line_ids.filtered(lambda ml: not ml.is_done_item)),
+                        "cantidad_productos_total": lambda: len(picking.move_line_ids),
                         "priority": picking.priority,
                         "warehouse_id": warehouse.id,
                         "warehouse_name": warehouse.name,
-                        "responsable_id": picking.responsable_id.id or 0,
-                        "responsable": picking.responsable_id.name or "",
-                        "picking_type": picking.picking_type_id.name,
-                        "start_time_transfer": picking.start_time_transfer or "",
-                        "end_time_transfer": picking.end_time_transfer or "",
-                        "backorder_id": picking.backorder_id.id or 0,
-                        "backorder_name": picking.backorder_id.name or "",
+                        "responsable_id": lambda: picking.responsable_id.id or 0,
+                        "responsable": lambda: picking.responsable_id.name or "",
+                        "picking_type": lambda: picking.picking_type_id.name,
+                        "start_time_transfer": lambda: picking.start_time_transfer or "",
+                        "end_time_transfer": lambda: picking.end_time_transfer or "",
+                        "backorder_id": lambda: picking.backorder_id.id or 0,
+                        "backorder_name": lambda: picking.backorder_id.name or "",
                         "show_check_availability": picking.show_check_availability,
-                        "order_tms": picking.order_tms if hasattr(picking, "order_tms") else "",
-                        "zona_entrega_tms": (picking.delivery_zone_tms if hasattr(picking, "delivery_zone_tms") else ""),
-                        "zona_entrega": picking.delivery_zone_id.display_name or "",
-                        "numero_paquetes": len(picking.move_line_ids.mapped("result_package_id")),
+                        "order_tms": lambda: picking.order_tms if hasattr(picking, "order_tms") else "",
+                        "zona_entrega_tms": (lambda: picking.delivery_zone_tms if hasattr(picking, "delivery_zone_tms") else ""),
+                        "zona_entrega": lambda: picking.delivery_zone_id.display_name or "",
+                        "numero_paquetes": lambda: len(picking.move_line_ids.mapped("result_package_id")),
                         "lista_productos": [],
                         # "lista_productos_enviadas": [],
                         "lista_paquetes": [],
-                    }
+                    },
+                    PACK_V2_CONTAINERS,
+                )
 
-                    for move in movimientos_operaciones:
-                        product = move.product_id
-                        quantity_done = move.quantity or 0
-                        quantity_ordered = move.move_id.product_uom_qty or 0
+                for move in movimientos_operaciones:
+                    product = move.product_id
+                    quantity_done = move.quantity or 0
+                    quantity_ordered = move.move_id.product_uom_qty or 0
 
-                        cantidad_faltante = quantity_ordered - quantity_done
+                    cantidad_faltante = quantity_ordered - quantity_done
 
-                        cantidad_faltante = quantity_ordered - cantidad_faltante
+                    cantidad_faltante = quantity_ordered - cantidad_faltante
 
-                        if quantity_done == 0:
-                            continue
+                    if quantity_done == 0:
+                        continue
 
-                        if not move.is_done_item:
-                            linea_info = {
-                                "id": move.move_id.id if move.move_id else 0,
+                    if not move.is_done_item:
+                        catalog.add(product)
+                        linea_info = productos_filter.build(
+                            {
+                                "id": lambda: move.move_id.id if move.move_id else 0,
                                 "id_move": move.id,
                                 "pedido_id": picking.id,
                                 "batch_id": picking.id,
                                 "picking_id": picking.id,  # ✅
                                 "id_transferencia": picking.id,
-                                "product_id": [product.id, product.display_name],  # ✅
-                                "id_product": product.id or 0,
+                                "product_id": lambda: [product.id, product.display_name],  # ✅
+                                "id_product": lambda: product.id or 0,
                                 "product_name": product.display_name,
-                                "product_code": product.default_code or "",
-                                "barcode": product.barcode or "",
-                                "tracking": product.tracking or "",
-                                "dias_vencimiento": product.expiration_time or "",
-                                "product_packing": [
+                                "product_code": lambda: product.default_code or "",
+                                "barcode": lambda: product.barcode or "",
+                                "tracking": lambda: product.tracking or "",
+                                "dias_vencimiento": lambda: product.expiration_time or "",
+                                "product_packing": lambda: [
                                     {
                                         "barcode": p.barcode,
                                         "cantidad": p.qty,
-                                        "id_product": p.product_id.id,
+                                        "id_product": p.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for p in getattr(product, "packaging_ids", [])
+                                    for p in product_fragment(product)["packagings"]
                                 ],
                                 "quantity": quantity_done,
                                 "quantity_ordered": quantity_ordered,
                                 "quantity_to_transfer": quantity_ordered,
                                 # "quantity_done": quantity_done,
                                 "cantidad_faltante": cantidad_faltante,
-                                "uom": (move.move_id.product_uom.name if move.move_id and move.move_id.product_uom else "UND"),
-                                "location_dest_id": [
+                                "uom": (lambda: move.move_id.product_uom.name if move.move_id and move.move_id.product_uom else "UND"),
+                                "location_dest_id": lambda: [
                                     move.location_dest_id.id,
                                     move.location_dest_id.display_name,
                                 ],
                                 # "location_dest_name": move.location_dest_id.display_name or "",
-                                "barcode_location_dest": move.location_dest_id.barcode or "",
-                                "location_id": [
+                                "barcode_location_dest": lambda: move.location_dest_id.barcode or "",
+                                "location_id": lambda: [
                                     move.location_id.id,
                                     move.location_id.display_name,
                                 ],
-                                "rimoval_priority": move.location_id.priority_picking_desplay,
+                                "rimoval_priority": lambda: move.location_id.priority_picking_desplay,
                                 # "location_name": move.location_id.display_name or "",
-                                "barcode_location": move.location_id.barcode or "",
-                                "weight": product.weight or 0,
-                                "unidades": product.uom_id.name if product.uom_id else "UND",
+                                "barcode_location": lambda: move.location_id.barcode or "",
+                                "weight": lambda: product.weight or 0,
+                                "unidades": lambda: product.uom_id.name if product.uom_id else "UND",
                                 # "is_done_item": False,
                                 # "date_transaction": "",
                                 # "observation": "",
                                 # "time": 0,
                                 # "user_operator_id": 0,
-                                "lot_id": [move.lot_id.id, move.lot_id.name] if move.lot_id else [],
-                                "lote_id": move.lot_id.id or 0,
-                                "expire_date": move.lot_id.expiration_date or "",
-                                "other_barcode": get_barcodes(product, move.id, picking.id),
-                                "product_packing": [
+                                "lot_id": lambda: [move.lot_id.id, move.lot_id.name] if move.lot_id else [],
+                                "lote_id": lambda: move.lot_id.id or 0,
+                                "expire_date": lambda: move.lot_id.expiration_date or "",
+                                "other_barcode": lambda: get_barcodes(product, move.id, picking.id),
+                                "product_packing": lambda: [
                                     {
                                         "barcode": pack.barcode,
                                         "cantidad": pack.qty,
-                                        "id_product": pack.product_id.id,
+                                        "id_product": pack.product_id,
                                         "id_move": move.id,
                                         "batch_id": picking.id,
                                     }
-                                    for pack in product.packaging_ids
+                                    for pack in product_fragment(product)["packagings"]
                                     if pack.barcode
                                 ],
-                                "maneja_temperatura": (product.temperature_control if hasattr(product, "temperature_control") else False),
-                                "temperatura": (move.temperature if hasattr(move, "temperature") else 0),
+                                "maneja_temperatura": (lambda: product.temperature_control if hasattr(product, "temperature_control") else False),
+                                "temperatura": (lambda: move.temperature if hasattr(move, "temperature") else 0),
                             }
+                        )
 
-                            # if move.lot_id:
-                            #     linea_info.update(
-                            #         {
-                            #             "lot_id": move.lot_id.id,
-                            #             "lot_name": move.lot_id.name,
-                            #             "fecha_vencimiento": move.lot_id.expiration_date or "",
-                            #         }
-                            #     )
-                            # else:
-                            #     linea_info.update(
-                            #         {
-                            #             "lot_id": 0,
-                            #             "lot_name": "",
-                            #             "fecha_vencimiento": "",
-                            #         }
-                            #     )
-
-                            transferencia_info["lista_productos"].append(linea_info)
-
-                    for move_line in movimientos_enviados:
-                        if not move_line.is_done_item:
-                            continue
-
-                        product = move_line.product_id
-                        quantity_ordered = move_line.move_id.product_uom_qty or 0
-
-                        quantity_done = move_line.quantity or 0
-
-                        cantidad_faltante = quantity_ordered - quantity_done
-
-                        linea_info = {
-                            "id": move_line.id,
-                            "id_move": move_line.id,
-                            "id_transferencia": picking.id,
-                            "product_id": [product.id, product.display_name],  # ✅
-                            "id_product": product.id or 0,
-                            "product_name": product.display_name,
-                            "product_code": product.default_code or "",
-                            "product_barcode": product.barcode or "",
-                            "product_tracking": product.tracking or "",
-                            "dias_vencimiento": product.expiration_time or "",
-                            "other_barcodes": [{"barcode": b.name} for b in getattr(product, "barcode_ids", [])],
-                            "product_packing": [
-                                {
-                                    "barcode": p.barcode,
-                                    "cantidad": p.qty,
-                                    "id_product": p.product_id.id,
-                                    "id_move": move_line.id,
-                                    "batch_id": picking.id,
-                                }
-                                for p in getattr(product, "packaging_ids", [])
-                            ],
-                            "quantity_ordered": quantity_ordered,
-                            "quantity_to_transfer": quantity_ordered,
-                            "quantity_done": move_line.quantity,
-                            "cantidad_faltante": quantity_ordered,
-                            "uom": (move_line.product_uom_id.name if move_line.product_uom_id else "UND"),
-                            "location_dest_id": move_line.location_dest_id.id or 0,
-                            "location_dest_name": move_line.location_dest_id.display_name or "",
-                            "location_dest_barcode": move_line.location_dest_id.barcode or "",
-                            "location_id": move_line.location_id.id or 0,
-                            "location_name": move_line.location_id.display_name or "",
-                            "location_barcode": move_line.location_id.barcode or "",
-                            "weight": product.weight or 0,
-                            "is_done_item": move_line.is_done_item,
-                            "date_transaction": move_line.date_transaction or "",
-                            "observation": move_line.new_observation or "",
-                            "time": move_line.time or 0,
-                            "user_operator_id": (move_line.user_operator_id.id if move_line.user_operator_id else 0),
-                            "lot_id": ([move_line.lot_id.id, move_line.lot_id.name] if move_line.lot_id else []),
-                        }
-
-                        # if move_line.lot_id:
-                        #     linea_info.update(
-                        #         {
-                        #             "lot_id": move_line.lot_id.id,
-                        #             "lot_name": move_line.lot_id.name,
-                        #             "fecha_vencimiento": move_line.lot_id.expiration_date or "",
+                        # if move.lot_id:
+                        #     linea_info.update(
+                        #         {
+                        #             "lot_id": move.lot_id.id,
+                        #             "lot_name": move.lot_id.name,
+                        #             "fecha_vencimiento": move.lot_id.expiration_date or "",
                         #         }
                         #     )
                         # else:
@@ -1888,20 +1840,93 @@ class TransaccionTransferenciasController(http.Controller):
                         #         }
                         #     )
 
-                        # transferencia_info["lista_productos_enviadas"].append(linea_info)
+                        transferencia_info["lista_productos"].append(linea_info)
 
-                    # Obtener los paquetes de la transferencia
-                    move_lines_in_picking = picking.move_line_ids.filtered(lambda ml: ml.package_id or ml.result_package_id)
-                    unique_packages = move_lines_in_picking.mapped("package_id") + move_lines_in_picking.mapped("result_package_id")
+                for move_line in movimientos_enviados:
+                    if not move_line.is_done_item:
+                        continue
 
-                    for pack in unique_packages:
-                        move_lines_in_package = move_lines_in_picking.filtered(
-                            lambda ml: (ml.package_id == pack or ml.result_package_id == pack) and ml.is_done_item
-                        )
+                    product = move_line.product_id
+                    quantity_ordered = move_line.move_id.product_uom_qty or 0
 
-                        cantidad_productos = len(move_lines_in_package)
+                    quantity_done = move_line.quantity or 0
 
-                        package = {
+                    cantidad_faltante = quantity_ordered - quantity_done
+
+                    linea_info = {
+                        "id": move_line.id,
+                        "id_move": move_line.id,
+                        "id_transferencia": picking.id,
+                        "product_id": [product.id, product.display_name],  # ✅
+                        "id_product": product.id or 0,
+                        "product_name": product.display_name,
+                        "product_code": product.default_code or "",
+                        "product_barcode": product.barcode or "",
+                        "product_tracking": product.tracking or "",
+                        "dias_vencimiento": product.expiration_time or "",
+                        "other_barcodes": [{"barcode": b.name} for b in product_fragment(product)["barcodes"]],
+                        "product_packing": [
+                            {
+                                "barcode": p.barcode,
+                                "cantidad": p.qty,
+                                "id_product": p.product_id,
+                                "id_move": move_line.id,
+                                "batch_id": picking.id,
+                            }
+                            for p in product_fragment(product)["packagings"]
+                        ],
+                        "quantity_ordered": quantity_ordered,
+                        "quantity_to_transfer": quantity_ordered,
+                        "quantity_done": move_line.quantity,
+                        "cantidad_faltante": quantity_ordered,
+                        "uom": (move_line.product_uom_id.name if move_line.product_uom_id else "UND"),
+                        "location_dest_id": move_line.location_dest_id.id or 0,
+                        "location_dest_name": move_line.location_dest_id.display_name or "",
+                        "location_dest_barcode": move_line.location_dest_id.barcode or "",
+                        "location_id": move_line.location_id.id or 0,
+                        "location_name": move_line.location_id.display_name or "",
+                        "location_barcode": move_line.location_id.barcode or "",
+                        "weight": product.weight or 0,
+                        "is_done_item": move_line.is_done_item,
+                        "date_transaction": move_line.date_transaction or "",
+                        "observation": move_line.new_observation or "",
+                        "time": move_line.time or 0,
+                        "user_operator_id": (move_line.user_operator_id.id if move_line.user_operator_id else 0),
+                        "lot_id": ([move_line.lot_id.id, move_line.lot_id.name] if move_line.lot_id else []),
+                    }
+
+                    # if move_line.lot_id:
+                    #     linea_info.update(
+                    #         {
+                    #             "lot_id": move_line.lot_id.id,
+                    #             "lot_name": move_line.lot_id.name,
+                    #             "fecha_vencimiento": move_line.lot_id.expiration_date or "",
+                    #         }
+                    #     )
+                    # else:
+                    #     linea_info.update(
+                    #         {
+                    #             "lot_id": 0,
+                    #             "lot_name": "",
+                    #             "fecha_vencimiento": "",
+                    #         }
+                    #     )
+
+                    # transferencia_info["lista_productos_enviadas"].append(linea_info)
+
+                # Obtener los paquetes de la transferencia
+                move_lines_in_picking = picking.move_line_ids.filtered(lambda ml: ml.package_id or ml.result_package_id)
+                unique_packages = move_lines_in_picking.mapped("package_id") + move_lines_in_picking.mapped("result_package_id")
+
+                for pack in unique_packages:
+                    move_lines_in_package = move_lines_in_picking.filtered(
+                        lambda ml: (ml.package_id == pack or ml.result_package_id == pack) and ml.is_done_item
+                    )
+
+                    cantidad_productos = len(move_lines_in_package)
+
+                    package = paquetes_filter.build(
+                        {
                             "name": pack.name,
                             "id": pack.id,
                             "batch_id": picking.id,  # Usaré picking.id en lugar de batch.id ya que no veo una variable batch definida
@@ -1910,63 +1935,62 @@ class TransaccionTransferenciasController(http.Controller):
                             "lista_productos_in_packing": [],
                             "is_sticker": pack.is_sticker,
                             "is_certificate": pack.is_certificate,
-                            "fecha_creacion": (pack.create_date.strftime("%Y-%m-%d") if pack.create_date else ""),
-                            "fecha_actualizacion": (pack.write_date.strftime("%Y-%m-%d") if pack.write_date else ""),
-                            "consecutivo": (getattr(move_lines_in_package[0], "faber_box_number", "") if move_lines_in_package else ""),
-                        }
-                        transferencia_info["lista_paquetes"].append(package)  # Cambié pedido a transferencia_info para que coincida con tu estructura
+                            "fecha_creacion": (lambda: pack.create_date.strftime("%Y-%m-%d") if pack.create_date else ""),
+                            "fecha_actualizacion": (lambda: pack.write_date.strftime("%Y-%m-%d") if pack.write_date else ""),
+                            "consecutivo": (lambda: getattr(move_lines_in_package[0], "faber_box_number", "") if move_lines_in_package else ""),
+                        },
+                        PACK_V2_CONTAINERS["lista_paquetes"],
+                    )
+                    transferencia_info["lista_paquetes"].append(package)  # Cambié pedido a transferencia_info para que coincida con tu estructura
 
-                        for move_line in move_lines_in_package:
-                            product = move_line.product_id
-                            lot = move_line.lot_id
+                    for move_line in move_lines_in_package:
+                        product = move_line.product_id
+                        lot = move_line.lot_id
 
-                            product_in_packing = {
+                        catalog.add(product)
+                        product_in_packing = packing_filter.build(
+                            {
                                 "id_move": move_line.id,
                                 "pedido_id": picking.id,
                                 "batch_id": picking.id,  # Usaré picking.id en lugar de batch.id
                                 "package_name": pack.name,
                                 "quantity_separate": move_line.quantity,
-                                "id_product": product.id if product else 0,
-                                "product_id": [product.id, product.display_name],
+                                "id_product": lambda: product.id if product else 0,
+                                "product_id": lambda: [product.id, product.display_name],
                                 "name_packing": pack.name,
                                 "cantidad_enviada": move_line.quantity,
-                                "unidades": product.uom_id.name if product.uom_id else "UND",
-                                "peso": product.weight if product else 0,
-                                "lote_id": [lot.id, lot.name if lot else ""] if lot else [],
-                                "observation": move_line.new_observation or "",
-                                "weight": product.weight if product else 0,
+                                "unidades": lambda: product.uom_id.name if product.uom_id else "UND",
+                                "peso": lambda: product.weight if product else 0,
+                                "lote_id": lambda: [lot.id, lot.name if lot else ""] if lot else [],
+                                "observation": lambda: move_line.new_observation or "",
+                                "weight": lambda: product.weight if product else 0,
                                 "is_sticker": pack.is_sticker,
                                 "is_certificate": pack.is_certificate,
                                 "id_package": pack.id,
                                 "quantity": move_line.quantity,
-                                "tracking": product.tracking if product else "",
-                                "maneja_temperatura": (product.temperature_control if hasattr(product, "temperature_control") else False),
-                                "temperatura": (move_line.temperature if hasattr(move_line, "temperature") else 0),
+                                "tracking": lambda: product.tracking if product else "",
+                                "maneja_temperatura": (lambda: product.temperature_control if hasattr(product, "temperature_control") else False),
+                                "temperatura": (lambda: move_line.temperature if hasattr(move_line, "temperature") else 0),
                                 "image": (
-                                    f"{base_url}/api/view_imagen_linea_recepcion/{move_line.id}" if getattr(move_line, "imagen", False) else ""
+                                    lambda: f"{base_url}/api/view_imagen_linea_recepcion/{move_line.id}" if getattr(move_line, "imagen", False) else ""
                                 ),
                                 "image_novedad": (
-                                    f"{base_url}/api/view_imagen_observation/{move_line.id}"
+                                    lambda: f"{base_url}/api/view_imagen_observation/{move_line.id}"
                                     if getattr(move_line, "imagen_observation", False)
                                     else ""
                                 ),
-                                "time_separate": move_line.time if move_line.time else 0,
-                                "package_consecutivo": (move_line.faber_box_number if hasattr(move_line, "faber_box_number") else ""),
+                                "time_separate": lambda: move_line.time if move_line.time else 0,
+                                "package_consecutivo": (lambda: move_line.faber_box_number if hasattr(move_line, "faber_box_number") else ""),
                             }
+                        )
 
-                            package["lista_productos_in_packing"].append(product_in_packing)
-
-                    transferencia_info["numero_lineas"] = len(transferencia_info["lista_productos"])
-                    # transferencia_info["numero_items"] = sum(l["quantity_to_transfer"] for l in transferencia_info["lineas_transferencia"])
+                        package["lista_productos_in_packing"].append(product_in_packing)
 
-                    array_transferencias.append(transferencia_info)
+                transferencia_info["numero_lineas"] = len(transferencia_info["lista_productos"])
+                # transferencia_info["numero_items"] = sum(l["quantity_to_transfer"] for l in transferencia_info["lineas_transferencia"])
 
-            return {"code": 200, "result": array_transferencias}
+                yield fields_filter.prune([transferencia_info], PACK_V2_CONTAINERS)[0]
 
-        except AccessError as e:
-            return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
-        except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
     ## GET Obtener todos los picking por rango de fecha
     @http.route("/api/transferencias/history_picking", auth="user", type="json", methods=["GET"])
@@ -2089,7 +2113,7 @@ class TransaccionTransferenciasController(http.Controller):
                 return {"code": 403, "msg": "Acceso denegado a la transferencia"}
 
             # Obtener configuración de estrategia de picking
-            picking_strategy = request.env["picking.strategy"].sudo().browse(1)
+            picking_strategy = get_settings().picking_strategy
             create_backorder = transferencia.picking_type_id.create_backorder if hasattr(transferencia.picking_type_id, "create_backorder") else False
 
             # Información general de la transferencia
@@ -2151,7 +2175,7 @@ class TransaccionTransferenciasController(http.Controller):
                         "id_move": move_line.move_id.id if move_line.move_id else 0,
                         "id_product": product.id,
                     }
-                    for barcode in getattr(product, "barcode_ids", [])
+                    for barcode in product_fragment(product)["barcodes"]
                     if barcode.name
                 ]
 
@@ -2165,7 +2189,7 @@ class TransaccionTransferenciasController(http.Controller):
                         "product_id": product.id,
                         "id_product": product.id,
                     }
-                    for pack in getattr(product, "packaging_ids", [])
+                    for pack in product_fragment(product)["packagings"]
                     if pack.barcode
                 ]
 
@@ -2192,12 +2216,12 @@ class TransaccionTransferenciasController(http.Controller):
                             {
                                 "barcode": p.barcode,
                                 "cantidad": p.qty,
-                                "id_product": p.product_id.id,
+                                "id_product": p.product_id,
                                 "id_move": move_line.id,
                                 "batch_id": transferencia.id,
-                                "product_id": p.product_id.id,
+                                "product_id": p.product_id,
                             }
-                            for p in getattr(product, "packaging_ids", [])
+                            for p in product_fragment(product)["packagings"]
                         ],
                         "quantity": quantity_done,
                         "quantity_to_transfer": quantity_ordered,
@@ -2255,7 +2279,7 @@ class TransaccionTransferenciasController(http.Controller):
                         "id_move": move_line.move_id.id if move_line.move_id else 0,
                         "id_product": product.id,
                     }
-                    for barcode in getattr(product, "barcode_ids", [])
+                    for barcode in product_fragment(product)["barcodes"]
                     if barcode.name
                 ]
 
@@ -2276,12 +2300,12 @@ class TransaccionTransferenciasController(http.Controller):
                         {
                             "barcode": p.barcode,
                             "cantidad": p.qty,
-                            "id_product": p.product_id.id,
+                            "id_product": p.product_id,
                             "id_move": move_line.id,
                             "batch_id": transferencia.id,
-                            "product_id": p.product_id.id,
+                            "product_id": p.product_id,
                         }
-                        for p in getattr(product, "packaging_ids", [])
+                        for p in product_fragment(product)["packagings"]
                     ],
                     "quantity": quantity_ordered,
                     "quantity_to_transfer": quantity_ordered,
@@ -2543,11 +2567,15 @@ class TransaccionTransferenciasController(http.Controller):
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as err:
             return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
 
     ## POST Enviar cantidad de producto en transferencia - PICK
     @http.route("/api/send_transfer/pick", auth="user", type="json", methods=["POST"], csrf=False)
+    @retry_on_concurrency
+    @idempotent
     def send_transfer_pick(self, **auth):
         try:
             # Usar transacción para garantizar consistencia
@@ -3270,8 +3298,10 @@ class TransaccionTransferenciasController(http.Controller):
 
         except AccessError as e:
             return {"code": 403, "msg": f"Acceso denegado: {str(e)}"}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as err:
-            return {"code": 400, "msg": f"Error inesperado: {str(err)}"}
+            return not_stored({"code": 400, "msg": f"Error inesperado: {str(err)}"})
 
     ## POST Enviar cantidad de producto en transferencia - PACK
     @http.route("/api/send_transfer/pack", auth="user", type="json", methods=["POST"], csrf=False)
@@ -3826,29 +3856,7 @@ class TransaccionTransferenciasController(http.Controller):
             # --- INICIO: Lógica de Validación de Versión ---
             version_app = auth.get("version_app")
 
-            # 1. Llama al método que obtiene la última versión
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                try:
-                    app_parts = list(map(int, version_app.split(".")))
-                    latest_parts = list(map(int, latest_version_str.split(".")))
-                    if app_parts < latest_parts:
-                        update_required = True
-                except (ValueError, TypeError):
-                    # Si la versión no tiene el formato correcto, se asume que requiere actualización
-                    update_required = True
-            else:
-                # Si no se envía la versión, requiere actualización
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -3869,7 +3877,7 @@ class TransaccionTransferenciasController(http.Controller):
             list_items = auth.get("list_items", [])
 
             # LÓGICA MEJORADA PARA UBICACIÓN DESTINO
-            config_returns = request.env["config.returns.general"].sudo().search([], limit=1)
+            config_returns = get_settings().returns
             # Validaciones básicas
             if not id_almacen and config_returns.location_option == "dynamic":
                 return {
@@ -4248,7 +4256,7 @@ class TransaccionTransferenciasController(http.Controller):
             list_items = auth.get("list_items", [])
 
             # LÓGICA MEJORADA PARA UBICACIÓN DESTINO
-            config_returns = request.env["config.returns.general"].sudo().search([], limit=1)
+            config_returns = get_settings().returns
             # Validaciones básicas
             if not id_almacen and config_returns.location_option == "dynamic":
                 return {"code": 400, "msg": "ID de almacén es requerido"}
@@ -4668,15 +4676,20 @@ class TransaccionTransferenciasController(http.Controller):
 
     @http.route("/api/complete_transfer", auth="user", type="json", methods=["POST"], csrf=False)
     def completar_transferencia(self, **auth):
+        if async_requested(auth):
+            return enqueue_validation("complete_transfer", auth.get("id_transferencia", 0), auth)
+        return self._completar_transferencia(request.env, **auth)
+
+    def _completar_transferencia(self, env, **auth):
         try:
-            user = request.env.user
+            user = env.user
             if not user:
                 return {"code": 400, "msg": "Usuario no encontrado"}
 
             id_transferencia = auth.get("id_transferencia", 0)
             crear_backorder = auth.get("crear_backorder", True)
 
-            transferencia = request.env["stock.picking"].sudo().search([("id", "=", id_transferencia)], limit=1)
+            transferencia = env["stock.picking"].sudo().search([("id", "=", id_transferencia)], limit=1)
 
             if not transferencia:
                 return {
@@ -4685,7 +4698,7 @@ class TransaccionTransferenciasController(http.Controller):
                 }
 
             # ✅ NUEVO: Validar stock disponible ANTES de procesar
-            error_stock = self._validar_stock_disponible(transferencia, request.env)
+            error_stock = self._validar_stock_disponible(transferencia, env)
             if error_stock:
                 return {"code": 400, "msg": error_stock}
 
@@ -4718,7 +4731,7 @@ class TransaccionTransferenciasController(http.Controller):
                         "show_transfers": wizard_context.get("default_show_transfers", False),
                     }
 
-                    wizard = request.env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
+                    wizard = env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
 
                     if crear_backorder:
                         wizard_result = wizard.sudo().process()
@@ -4744,7 +4757,7 @@ class TransaccionTransferenciasController(http.Controller):
 
                 elif wizard_model == "stock.immediate.transfer":
                     wizard_context = result.get("context", {})
-                    wizard = request.env[wizard_model].sudo().with_context(**wizard_context).create({"pick_ids": [(4, id_transferencia)]})
+                    wizard = env[wizard_model].sudo().with_context(**wizard_context).create({"pick_ids": [(4, id_transferencia)]})
 
                     wizard.sudo().process()
                     return {
@@ -4761,10 +4774,10 @@ class TransaccionTransferenciasController(http.Controller):
             return {"code": 200, "msg": "Transferencia completada"}
 
         except ValidationError as ve:
-            request.env.cr.rollback()
+            env.cr.rollback()
             return {"code": 400, "msg": str(ve)}
         except Exception as e:
-            request.env.cr.rollback()
+            env.cr.rollback()
             return {"code": 500, "msg": f"Error interno: {str(e)}"}
 
     def _validar_stock_disponible(self, picking, env):
@@ -4857,8 +4870,13 @@ class TransaccionTransferenciasController(http.Controller):
         csrf=False,
     )
     def completar_transferencia_expire(self, **auth):
+        if async_requested(auth):
+            return enqueue_validation("complete_transfer_expire", auth.get("id_transferencia", 0), auth)
+        return self._completar_transferencia_expire(request.env, **auth)
+
+    def _completar_transferencia_expire(self, env, **auth):
         try:
-            user = request.env.user
+            user = env.user
             # ✅ Validar usuario
             if not user:
                 return {"code": 400, "msg": "Usuario no encontrado"}
@@ -4866,7 +4884,7 @@ class TransaccionTransferenciasController(http.Controller):
             id_transferencia = auth.get("id_transferencia", 0)
             crear_backorder = auth.get("crear_backorder", True)
 
-            transferencia = request.env["stock.picking"].sudo().search([("id", "=", id_transferencia)], limit=1)
+            transferencia = env["stock.picking"].sudo().search([("id", "=", id_transferencia)], limit=1)
 
             if not transferencia:
                 return {
@@ -4884,7 +4902,7 @@ class TransaccionTransferenciasController(http.Controller):
                 if not isinstance(result, dict) or not result.get("res_model"):
                     # Si no es un wizard, simplemente devolvemos "Transferencia completada"
                     # Refrescamos el objeto transferencia buscándolo nuevamente
-                    transferencia = request.env["stock.picking"].sudo().search([("id", "=", transferencia_id)], limit=1)
+                    transferencia = env["stock.picking"].sudo().search([("id", "=", transferencia_id)], limit=1)
                     return {
                         "code": 200,
                         "msg": f"Transferencia completada correctamente. Estado: {transferencia.state}",
@@ -4899,7 +4917,7 @@ class TransaccionTransferenciasController(http.Controller):
                         "pick_ids": [(4, transferencia_id)],
                         "show_transfers": wizard_context.get("default_show_transfers", False),
                     }
-                    wizard = request.env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
+                    wizard = env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
 
                     if crear_backorder:
                         next_result = wizard.sudo().process()
@@ -4908,11 +4926,11 @@ class TransaccionTransferenciasController(http.Controller):
                             return procesar_wizard(next_result, transferencia_id, crear_backorder)
 
                         # Refrescamos el objeto transferencia buscándolo nuevamente
-                        transferencia = request.env["stock.picking"].sudo().search([("id", "=", transferencia_id)], limit=1)
+                        transferencia = env["stock.picking"].sudo().search([("id", "=", transferencia_id)], limit=1)
 
                         # Buscamos si se creó un backorder
                         backorder = (
-                            request.env["stock.picking"]
+                            env["stock.picking"]
                             .sudo()
                             .search(
                                 [
@@ -4952,7 +4970,7 @@ class TransaccionTransferenciasController(http.Controller):
                     if not crear_backorder:
                         adjusted_context["skip_backorder"] = True
 
-                    wizard = request.env[wizard_model].sudo().with_context(**adjusted_context).create(wizard_vals)
+                    wizard = env[wizard_model].sudo().with_context(**adjusted_context).create(wizard_vals)
 
                     # Intentamos procesar usando los diferentes métodos posibles
                     process_result = None
@@ -4974,14 +4992,14 @@ class TransaccionTransferenciasController(http.Controller):
 
                     # Verificamos el estado de la transferencia después de confirmar la caducidad
                     # Refrescamos el objeto transferencia buscándolo nuevamente
-                    transferencia = request.env["stock.picking"].sudo().search([("id", "=", transferencia_id)], limit=1)
+                    transferencia = env["stock.picking"].sudo().search([("id", "=", transferencia_id)], limit=1)
 
                     # Buscamos si se creó un backorder
                     backorder = False
                     if crear_backorder:
                         # Buscamos backorders relacionados con esta transferencia
                         backorder = (
-                            request.env["stock.picking"]
+                            env["stock.picking"]
                             .sudo()
                             .search(
                                 [
@@ -5016,7 +5034,7 @@ class TransaccionTransferenciasController(http.Controller):
 
                 # Para asistente de transferencia inmediata
                 elif wizard_model == "stock.immediate.transfer":
-                    wizard = request.env[wizard_model].sudo().with_context(**wizard_context).create({"pick_ids": [(4, transferencia_id)]})
+                    wizard = env[wizard_model].sudo().with_context(**wizard_context).create({"pick_ids": [(4, transferencia_id)]})
                     next_result = wizard.sudo().process()
 
                     # Si process() devuelve otro wizard, lo procesamos
@@ -5140,11 +5158,11 @@ class TransaccionTransferenciasController(http.Controller):
                             {
                                 "barcode": p.barcode,
                                 "cantidad": p.qty,
-                                "id_product": p.product_id.id,
+                                "id_product": p.product_id,
                                 "id_move": move.id,
                                 "batch_id": picking.id,
                             }
-                            for p in getattr(product, "packaging_ids", [])
+                            for p in product_fragment(product)["packagings"]
                         ],
                         "quantity_ordered": quantity_ordered,
                         "quantity_to_transfer": quantity_ordered,
@@ -5208,11 +5226,11 @@ class TransaccionTransferenciasController(http.Controller):
                         {
                             "barcode": p.barcode,
                             "cantidad": p.qty,
-                            "id_product": p.product_id.id,
+                            "id_product": p.product_id,
                             "id_move": move_line.id,
                             "batch_id": picking.id,
                         }
-                        for p in getattr(product, "packaging_ids", [])
+                        for p in product_fragment(product)["packagings"]
                     ],
                     "quantity_ordered": move_line.move_id.product_uom_qty,
                     "quantity_to_transfer": move_line.move_id.product_uom_qty,
@@ -5642,24 +5660,7 @@ class TransaccionTransferenciasController(http.Controller):
             # ---------------------------------------------------------
             version_app = kwargs.get("version_app")
 
-            # Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -5689,30 +5690,43 @@ class TransaccionTransferenciasController(http.Controller):
             # 2. BÚSQUEDA DE OBJETOS (Producto, Packaging, Lote, Paquete)
             # ---------------------------------------------------------
 
+            # Coincidencia exacta (una consulta indexada); las búsquedas
+            # parciales sólo se hacen si el código no existe tal cual
+            exact = resolve_barcode(request.env(su=True), barcode)
+            exact_model = exact._name if exact else None
+
             # A. Buscar PRODUCTO por barcode directo
-            product = (
-                request.env["product.product"]
-                .sudo()
-                .search(
-                    [
-                        "|",
-                        "|",
-                        ("barcode", "ilike", barcode),
-                        ("default_code", "ilike", barcode),
-                        ("barcode_ids.name", "ilike", barcode),
-                    ],
-                    limit=1,
+            if exact_model == "product.product":
+                product = exact
+            elif exact_model in ("product.packaging", "stock.lot"):
+                product = exact.product_id
+            elif exact:
+                # El código es de un paquete o una ubicación
+                product = request.env["product.product"]
+            else:
+                product = (
+                    request.env["product.product"]
+                    .sudo()
+                    .search(
+                        [
+                            "|",
+                            "|",
+                            ("barcode", "ilike", barcode),
+                            ("default_code", "ilike", barcode),
+                            ("barcode_ids.name", "ilike", barcode),
+                        ],
+                        limit=1,
+                    )
                 )
-            )
 
             # B. Buscar PRODUCTO por empaquetado
-            if not product:
+            if not product and not exact:
                 packaging = request.env["product.packaging"].sudo().search([("barcode", "ilike", barcode)], limit=1)
                 if packaging:
                     product = packaging.product_id
 
             # C. Buscar PRODUCTO por lote
-            if not product:
+            if not product and not exact:
                 lot = request.env["stock.lot"].sudo().search([("name", "ilike", barcode)], limit=1)
                 if lot:
                     product = lot.product_id
@@ -5725,18 +5739,23 @@ class TransaccionTransferenciasController(http.Controller):
                 base_barcode = barcode.split("-")[0].strip()
 
                 # Buscar el objeto Paquete
-                pack = (
-                    request.env["stock.quant.package"]
-                    .sudo()
-                    .search(
-                        [
-                            "|",
-                            ("name", "ilike", barcode),
-                            ("name", "ilike", base_barcode),
-                        ],
-                        limit=1,
+                if exact_model == "stock.quant.package":
+                    pack = exact
+                elif exact:
+                    pack = None
+                else:
+                    pack = (
+                        request.env["stock.quant.package"]
+                        .sudo()
+                        .search(
+                            [
+                                "|",
+                                ("name", "ilike", barcode),
+                                ("name", "ilike", base_barcode),
+                            ],
+                            limit=1,
+                        )
                     )
-                )
 
                 if pack:
                     # Obtener almacenes del usuario
@@ -5887,7 +5906,7 @@ class TransaccionTransferenciasController(http.Controller):
                         }
                     )
 
-                paquetes = product.packaging_ids.mapped("barcode")
+                paquetes = [pack.barcode for pack in product_fragment(product)["packagings"]]
 
                 return {
                     "code": 200,
@@ -5914,14 +5933,17 @@ class TransaccionTransferenciasController(http.Controller):
             # ---------------------------------------------------------
             # 5. LÓGICA DE UBICACIÓN
             # ---------------------------------------------------------
-            location = (
-                request.env["stock.location"]
-                .sudo()
-                .search(
-                    [("barcode", "ilike", barcode), ("usage", "ilike", "internal")],
-                    limit=1,
+            if exact_model == "stock.location":
+                location = exact
+            else:
+                location = (
+                    request.env["stock.location"]
+                    .sudo()
+                    .search(
+                        [("barcode", "ilike", barcode), ("usage", "ilike", "internal")],
+                        limit=1,
+                    )
                 )
-            )
 
             if location:
                 quants = request.env["stock.quant"].sudo().search([("location_id", "=", location.id), ("quantity", ">", 0)])
@@ -6206,7 +6228,7 @@ class TransaccionTransferenciasController(http.Controller):
                             }
                         )
 
-                paquetes = product.packaging_ids.mapped("barcode")
+                paquetes = [pack.barcode for pack in product_fragment(product)["packagings"]]
 
                 return {
                     "code": 200,
@@ -6283,24 +6305,7 @@ class TransaccionTransferenciasController(http.Controller):
         try:
             version_app = kwargs.get("version_app")
 
-            # 1. Llama al otro método DENTRO de esta misma clase
-            response_version = self.get_last_version()
-
-            # 2. Extrae la versión de la respuesta de forma segura
-            latest_version_str = "0.0.0"
-            if response_version.get("code") == 200:
-                version_info = response_version.get("result", {})
-                latest_version_str = version_info.get("version", "0.0.0")
-
-            # 3. Compara las versiones
-            update_required = False
-            if version_app:
-                app_parts = list(map(int, version_app.split(".")))
-                latest_parts = list(map(int, latest_version_str.split(".")))
-                if app_parts < latest_parts:
-                    update_required = True
-            else:
-                update_required = True
+            update_required = app_version.update_required(version_app)
 
             user = request.env.user
 
@@ -6394,7 +6399,7 @@ class TransaccionTransferenciasController(http.Controller):
                                 }
                             )
 
-                    paquetes = product.packaging_ids.mapped("barcode")
+                    paquetes = [pack.barcode for pack in product_fragment(product)["packagings"]]
 
                     return {
                         "code": 200,
@@ -6567,7 +6572,7 @@ class TransaccionTransferenciasController(http.Controller):
                                 }
                             )
 
-                    paquetes = product.packaging_ids.mapped("barcode")
+                    paquetes = [pack.barcode for pack in product_fragment(product)["packagings"]]
 
                     return {
                         "code": 200,
@@ -6641,6 +6646,207 @@ class TransaccionTransferenciasController(http.Controller):
         except Exception as e:
             return {"code": 500, "msg": f"Error interno: {str(e)}"}
 
+    ## POST RESOLUCION MASIVA DE CÓDIGOS DE BARRAS
+    @http.route("/api/transferencias/quickinfo/bulk", auth="user", type="json", methods=["POST"], csrf=False)
+    def get_quick_info_bulk(self, **kwargs):
+        """
+        Resuelve muchos códigos de barras en una sola petición (p. ej. una
+        sesión de escaneo sin conexión o el manifiesto de una estiba)
+
+        Sólo coincidencias exactas; para cada producto resuelto se informa
+        su disponible en los almacenes del usuario.
+        """
+        update_required = False
+        try:
+            version_app = kwargs.get("version_app")
+            update_required = app_version.update_required(version_app)
+
+            user = request.env.user
+            if not user:
+                return {
+                    "code": 400,
+                    "update_version": update_required,
+                    "msg": "Usuario no encontrado",
+                }
+
+            device_id = kwargs.get("device_id") or request.params.get("device_id")
+            validation_error = validate_pda(device_id)
+            if validation_error:
+                return validation_error
+
+            barcodes = kwargs.get("barcodes")
+            if isinstance(barcodes, str):
+                barcodes = barcodes.split(",")
+            if not barcodes or not isinstance(barcodes, list):
+                return {
+                    "code": 400,
+                    "update_version": update_required,
+                    "msg": "Debe enviar la lista de códigos de barras (barcodes)",
+                }
+            if len(barcodes) > BULK_BARCODES_LIMIT:
+                return {
+                    "code": 400,
+                    "update_version": update_required,
+                    "msg": f"Se permiten máximo {BULK_BARCODES_LIMIT} códigos por petición",
+                }
+
+            allowed_warehouses = obtener_almacenes_usuario(user)
+            if isinstance(allowed_warehouses, dict) and "code" in allowed_warehouses:
+                return allowed_warehouses
+
+            env = request.env(su=True)
+            matches = resolve_barcodes(env, barcodes)
+
+            # Producto de cada coincidencia (los paquetes y ubicaciones no tienen)
+            product_by_code = {}
+            for code, record in matches.items():
+                if record._name == "product.product":
+                    product_by_code[code] = record
+                elif record._name in ("product.packaging", "stock.lot"):
+                    product_by_code[code] = record.product_id
+
+            # Disponible de todos los productos con una consulta agrupada
+            product_ids = list({product.id for product in product_by_code.values() if product})
+            disponible = {}
+            if product_ids:
+                quant_groups = env["stock.quant"]._read_group(
+                    [
+                        ("product_id", "in", product_ids),
+                        ("location_id.usage", "=", "internal"),
+                        ("location_id.warehouse_id", "in", allowed_warehouses.ids),
+                    ],
+                    groupby=["product_id"],
+                    aggregates=["quantity:sum", "reserved_quantity:sum"],
+                )
+                for product, quantity, reserved in quant_groups:
+                    disponible[product.id] = (quantity, reserved)
+
+            resultados = []
+            for barcode in barcodes:
+                code = normalize_barcode(barcode)
+                record = matches.get(code)
+                if not record:
+                    resultados.append({"barcode": barcode, "found": False})
+                    continue
+
+                resultado = {
+                    "barcode": barcode,
+                    "found": True,
+                    "type": BARCODE_TYPES[record._name],
+                    "id": record.id,
+                }
+
+                product = product_by_code.get(code)
+                if product:
+                    quantity, reserved = disponible.get(product.id, (0.0, 0.0))
+                    resultado.update(
+                        {
+                            "product_id": product.id,
+                            "producto": product.display_name,
+                            "referencia": product.default_code or "",
+                            "codigo_barras": product.barcode or "",
+                            "unidad_medida": product.uom_id.name or "",
+                            "cantidad": quantity,
+                            "cantidad_mano": quantity - reserved,
+                        }
+                    )
+
+                if record._name == "product.packaging":
+                    resultado["cantidad_empaque"] = record.qty
+                elif record._name == "stock.lot":
+                    resultado["lote"] = record.name
+                    resultado["fecha_caducidad"] = getattr(record, "expiration_date", False) or ""
+                elif record._name == "stock.quant.package":
+                    resultado["nombre"] = record.name
+                elif record._name == "stock.location":
+                    resultado["nombre"] = record.complete_name or record.name
+                    resultado["id_almacen"] = record.warehouse_id.id or 0
+                    resultado["nombre_almacen"] = record.warehouse_id.name or ""
+
+                resultados.append(resultado)
+
+            return {
+                "code": 200,
+                "update_version": update_required,
+                "total": len(resultados),
+                "encontrados": sum(1 for resultado in resultados if resultado["found"]),
+                "result": resultados,
+            }
+
+        except Exception as e:
+            return {
+                "code": 500,
+                "update_version": update_required,
+                "msg": f"Error interno: {str(e)}",
+            }
+
+    ## GET BUSQUEDA APROXIMADA DE CÓDIGOS DE BARRAS
+    @http.route("/api/transferencias/quickinfo/search", auth="user", type="json", methods=["GET"])
+    def search_quick_info(self, **kwargs):
+        """
+        Búsqueda parcial o aproximada para etiquetas dañadas: retorna los
+        mejores candidatos (exactos primero, luego por similitud)
+        """
+        update_required = False
+        try:
+            version_app = kwargs.get("version_app")
+            update_required = app_version.update_required(version_app)
+
+            device_id = kwargs.get("device_id") or request.params.get("device_id")
+            validation_error = validate_pda(device_id)
+            if validation_error:
+                return validation_error
+
+            query = normalize_barcode(kwargs.get("query") or kwargs.get("barcode"))
+            if len(query) < FUZZY_MIN_LENGTH:
+                return {
+                    "code": 400,
+                    "update_version": update_required,
+                    "msg": f"El texto de búsqueda debe tener al menos {FUZZY_MIN_LENGTH} caracteres",
+                }
+
+            try:
+                limit = min(int(kwargs.get("limit") or FUZZY_DEFAULT_LIMIT), FUZZY_MAX_LIMIT)
+                if limit <= 0:
+                    raise ValueError(limit)
+            except (TypeError, ValueError):
+                return {
+                    "code": 400,
+                    "update_version": update_required,
+                    "msg": "El parámetro limit debe ser un entero positivo",
+                }
+
+            env = request.env(su=True)
+            candidatos = []
+            for match in search_barcodes(env, query, limit):
+                record = env[match["model"]].browse(match["res_id"])
+                candidato = {
+                    "type": BARCODE_TYPES[match["model"]],
+                    "id": record.id,
+                    "codigo": match["code"],
+                    "exacto": match["exact"],
+                    "similitud": match["score"],
+                    "nombre": record.display_name,
+                }
+                if match["model"] in ("product.packaging", "stock.lot"):
+                    candidato["product_id"] = record.product_id.id
+                    candidato["producto"] = record.product_id.display_name or ""
+                candidatos.append(candidato)
+
+            return {
+                "code": 200,
+                "update_version": update_required,
+                "query": query,
+                "result": candidatos,
+            }
+
+        except Exception as e:
+            return {
+                "code": 500,
+                "update_version": update_required,
+                "msg": f"Error interno: {str(e)}",
+            }
+
     ## POST CREAR TRANSFERENCIA DESDE INFORMACION RAPIDA
     @http.route("/api/crear_transferencia", auth="user", type="json", methods=["POST"], csrf=False)
     def crear_transferencia(self, **auth):
@@ -8314,8 +8520,13 @@ class TransaccionTransferenciasController(http.Controller):
         csrf=False,
     )
     def completar_transferencia_v2(self, **auth):
+        if async_requested(auth):
+            return enqueue_validation("complete_transfer_v2", auth.get("id_transferencia", 0), auth)
+        return self._completar_transferencia_v2(request.env, **auth)
+
+    def _completar_transferencia_v2(self, env, **auth):
         try:
-            user = request.env.user
+            user = env.user
             if not user:
                 return {"code": 400, "msg": "Usuario no encontrado"}
 
@@ -8323,7 +8534,7 @@ class TransaccionTransferenciasController(http.Controller):
             crear_backorder = auth.get("crear_backorder", True)
             force_validate = auth.get("force_validate", False)  # 🆕 Parámetro opcional
 
-            transferencia = request.env["stock.picking"].sudo().search([("id", "=", id_transferencia)], limit=1)
+            transferencia = env["stock.picking"].sudo().search([("id", "=", id_transferencia)], limit=1)
 
             if not transferencia:
                 return {
@@ -8350,7 +8561,7 @@ class TransaccionTransferenciasController(http.Controller):
 
                 # 🔍 VALIDACIÓN 1: Detectar reservas negativas existentes
                 quants_origen = (
-                    request.env["stock.quant"]
+                    env["stock.quant"]
                     .sudo()
                     .search(
                         [
@@ -8556,7 +8767,7 @@ class TransaccionTransferenciasController(http.Controller):
                         "pick_ids": [(4, id_transferencia)],
                         "show_transfers": wizard_context.get("default_show_transfers", False),
                     }
-                    wizard = request.env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
+                    wizard = env[wizard_model].sudo().with_context(**wizard_context).create(wizard_vals)
 
                     if crear_backorder:
                         wizard_result = wizard.sudo().process()
@@ -8584,7 +8795,7 @@ class TransaccionTransferenciasController(http.Controller):
 
                 elif wizard_model == "stock.immediate.transfer":
                     wizard_context = result.get("context", {})
-                    wizard = request.env[wizard_model].sudo().with_context(**wizard_context).create({"pick_ids": [(4, id_transferencia)]})
+                    wizard = env[wizard_model].sudo().with_context(**wizard_context).create({"pick_ids": [(4, id_transferencia)]})
                     wizard.sudo().process()
                     return {
                         "code": 200,
@@ -8617,6 +8828,27 @@ class TransaccionTransferenciasController(http.Controller):
                 "tipo_error": type(e).__name__,
             }
 
+    ## GET Estado de una validación en segundo plano
+    @http.route("/api/validation_jobs/<int:job_id>", auth="user", type="json", methods=["GET"])
+    def get_validation_job(self, job_id, **kwargs):
+        try:
+            user = request.env.user
+            job = request.env["onpoint.validation.job"].sudo().browse(job_id).exists()
+            if not job or (job.user_id != user and not user.has_group("base.group_system")):
+                return {"code": 404, "msg": f"Trabajo de validación no encontrado con ID {job_id}"}
+
+            return {"code": 200, "result": job_status(job)}
+
+        except Exception as e:
+            return {"code": 500, "msg": f"Error interno: {str(e)}"}
+
+
+register_job_handler("complete_transfer", TransaccionTransferenciasController, "_completar_transferencia")
+register_job_handler("complete_transfer_expire", TransaccionTransferenciasController, "_completar_transferencia_expire")
+register_job_handler("complete_transfer_v2", TransaccionTransferenciasController, "_completar_transferencia_v2")
+register_journal_operation("send_transfer", TransaccionTransferenciasController, "send_transfer", "stock.picking", "id_transferencia")
+register_journal_operation("send_transfer_pick", TransaccionTransferenciasController, "send_transfer_pick", "stock.picking", "id_transferencia")
+
 
 ## FUNCIONES AUXILIARES
 def procesar_fecha_naive(fecha_transaccion, zona_horaria_cliente):
@@ -8664,26 +8896,3 @@ def format_time_from_seconds(time_value):
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
     except:
         return "00:00:00"
-
-
-def validate_pda(device_id):
-    """
-    Solo valida que la PDA existe y está autorizada
-    Returns: dict con error si hay problema, None si todo está OK
-    """
-    if not device_id:
-        return {
-            "code": 400,
-            "msg": "Device ID no proporcionado, por favor actualizar a la ultima version de la app",
-        }
-
-    pda = request.env["pda.logs"].sudo().search([("device_id", "=", device_id)])
-
-    if not pda:
-        return {"code": 404, "msg": "PDA no encontrado"}
-
-    if pda.is_authorized == "no":
-        return {"code": 403, "msg": "PDA no autorizado"}
-
-    # Si llegamos aquí, todo está bien
-    return None
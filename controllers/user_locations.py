@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# user_locations.py - Ubicaciones permitidas por usuario WMS según sus zonas
+
+import threading
+import time
+from collections import OrderedDict
+
+# Las entradas se invalidan solas cuando cambia el registro appwms.users_wms o
+# alguna de sus zonas (sus write_date forman parte de la validación); el TTL
+# acota los cambios que no pasan por esos registros.
+USER_LOCATIONS_TTL = 300
+USER_LOCATIONS_MAX_SIZE = 1024
+
+_lock = threading.Lock()
+# (dbname, user_wms.id) -> (huella, zone_ids, location_ids, timestamp)
+_user_locations = OrderedDict()
+
+
+def get_user_zone_locations(user_wms):
+    """
+    Retorna las zonas y ubicaciones asignadas a un usuario WMS
+
+    Args:
+        user_wms: Registro appwms.users_wms (puede estar vacío)
+
+    Returns:
+        Tupla (zone_ids, location_ids) con una tupla de ids de zonas y un
+        frozenset de ids de stock.location
+    """
+    if not user_wms:
+        return (), frozenset()
+
+    key = (user_wms.env.cr.dbname, user_wms.id)
+    zones = user_wms.zone_ids.sudo()
+    zone_ids = tuple(zones.ids)
+    # Editar las ubicaciones de una zona cambia su write_date
+    stamp = (user_wms.write_date, zone_ids, max(zones.mapped("write_date"), default=None))
+    with _lock:
+        entry = _user_locations.get(key)
+        if entry is not None and entry[0] == stamp and time.monotonic() - entry[3] < USER_LOCATIONS_TTL:
+            _user_locations.move_to_end(key)
+            return entry[1], entry[2]
+
+    location_ids = frozenset(loc_id for zone in zones.read(["location_ids"]) for loc_id in zone["location_ids"])
+
+    with _lock:
+        _user_locations[key] = (stamp, zone_ids, location_ids, time.monotonic())
+        _user_locations.move_to_end(key)
+        while len(_user_locations) > USER_LOCATIONS_MAX_SIZE:
+            _user_locations.popitem(last=False)
+
+    return zone_ids, location_ids
@@ -1,6 +1,158 @@
 # -*- coding: utf-8 -*-
 # utils.py - Funciones auxiliares reutilizables
 
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from itertools import islice
+
+# Fragmentos serializados de productos por worker. Cada fragmento se valida
+# con el write_date del producto y de su plantilla (leídos con el prefetch,
+# sin consultar las relaciones); editar códigos de barras o empaques desde el
+# formulario del producto los cambia. Los empaques editados por separado
+# invalidan la caché (models/product_packaging.py) y el TTL acota el resto
+# (códigos adicionales, unidad, categoría).
+PRODUCT_CACHE_TTL = 300
+PRODUCT_CACHE_MAX_SIZE = 5000
+# Productos que se serializan juntos en una carga en lote (como el prefetch del ORM)
+PRODUCT_PREFETCH_SIZE = 1000
+
+_product_lock = threading.Lock()
+# (dbname, product_id, lang) -> (huella, fragment, timestamp)
+_product_cache = OrderedDict()
+
+# Códigos de barras y empaques del fragmento, con los mismos atributos que los
+# registros que reemplazan (product_id es el id)
+BarcodeFragment = namedtuple("BarcodeFragment", ["name"])
+PackagingFragment = namedtuple("PackagingFragment", ["id", "name", "barcode", "qty", "product_id"])
+
+EMPTY_FRAGMENT = {
+    "id": 0,
+    "display_name": "",
+    "default_code": "",
+    "barcode": "",
+    "tracking": "",
+    "expiration_time": "",
+    "weight": 0,
+    "uom_name": "UND",
+    "categ_id": 0,
+    "categ_name": "",
+    "temperature_control": False,
+    "barcodes": (),
+    "packagings": (),
+}
+
+
+def _product_key(product):
+    return (product.env.cr.dbname, product.id, product.env.lang)
+
+
+def _product_stamp(product):
+    return (product.write_date, product.product_tmpl_id.write_date)
+
+
+def invalidate_product_cache(env, product_ids):
+    """
+    Descarta los fragmentos de los productos indicados (en todos los idiomas)
+
+    Se repite tras el commit para que una petición concurrente no deje en
+    caché el fragmento previo a la modificación.
+    """
+    dbname = env.cr.dbname
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    def _invalidate():
+        with _product_lock:
+            for key in [key for key in _product_cache if key[0] == dbname and key[1] in product_ids]:
+                del _product_cache[key]
+
+    _invalidate()
+    env.cr.postcommit.add(_invalidate)
+
+
+def _cache_get_product(product):
+    key = _product_key(product)
+    stamp = _product_stamp(product)
+    with _product_lock:
+        entry = _product_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] != stamp or time.monotonic() - entry[2] >= PRODUCT_CACHE_TTL:
+            del _product_cache[key]
+            return None
+        _product_cache.move_to_end(key)
+        return entry[1]
+
+
+def _serialize_fragment(product):
+    return {
+        "id": product.id,
+        "display_name": product.display_name,
+        "default_code": product.default_code or "",
+        "barcode": product.barcode or "",
+        "tracking": product.tracking or "",
+        "expiration_time": product.expiration_time if hasattr(product, "expiration_time") else "",
+        "weight": product.weight or 0,
+        "uom_name": product.uom_id.name if product.uom_id else "UND",
+        "categ_id": product.categ_id.id or 0,
+        "categ_name": product.categ_id.name or "",
+        "temperature_control": getattr(product, "temperature_control", False),
+        "barcodes": tuple(BarcodeFragment(b.name) for b in getattr(product, "barcode_ids", [])),
+        "packagings": tuple(
+            PackagingFragment(p.id, p.name, p.barcode, p.qty, p.product_id.id) for p in getattr(product, "packaging_ids", [])
+        ),
+    }
+
+
+def prefetch_products(products):
+    """
+    Serializa en lote los productos que no están en la caché del worker
+
+    Las relaciones (códigos de barras, empaques, unidad, categoría) se leen
+    con una consulta por relación para todo el recordset, en lugar de una
+    carga diferida por producto.
+    """
+    missing = products.browse([product.id for product in products if _cache_get_product(product) is None])
+    if not missing:
+        return
+
+    for field_name in ("barcode_ids", "packaging_ids"):
+        if field_name in missing._fields:
+            missing.mapped(field_name).mapped("display_name")
+    missing.mapped("uom_id.name")
+    missing.mapped("categ_id.name")
+
+    now = time.monotonic()
+    fragments = [(_product_key(product), _product_stamp(product), _serialize_fragment(product)) for product in missing]
+    with _product_lock:
+        for key, stamp, fragment in fragments:
+            _product_cache[key] = (stamp, fragment, now)
+            _product_cache.move_to_end(key)
+        while len(_product_cache) > PRODUCT_CACHE_MAX_SIZE:
+            _product_cache.popitem(last=False)
+
+
+def product_fragment(product):
+    """
+    Datos serializados de un producto.product (desde la caché del worker)
+
+    Ante un fallo se serializan junto con él los productos de su mismo
+    recordset, que normalmente son los de las demás líneas de la respuesta.
+    Un producto vacío retorna EMPTY_FRAGMENT. El resultado es compartido:
+    no debe modificarse.
+    """
+    if not product:
+        return EMPTY_FRAGMENT
+    fragment = _cache_get_product(product)
+    if fragment is None:
+        others = (pid for pid in product._prefetch_ids if pid != product.id)
+        batch_ids = [product.id] + list(islice(others, PRODUCT_PREFETCH_SIZE - 1))
+        prefetch_products(product.browse(batch_ids))
+        fragment = _cache_get_product(product) or _serialize_fragment(product)
+    return fragment
+
 
 def get_barcodes(product, move_id=0, batch_id=0):
     """
@@ -16,15 +168,15 @@ def get_barcodes(product, move_id=0, batch_id=0):
     """
     return [
         {
-            "barcode": b.name,
+            "barcode": barcode.name,
             "cantidad": 1,
             "id_product": product.id,
             "id_move": move_id,
             "batch_id": batch_id,
             "product_id": product.id,
         }
-        for b in getattr(product, "barcode_ids", [])
-        if b.name
+        for barcode in product_fragment(product)["barcodes"]
+        if barcode.name
     ]
 
 
@@ -42,15 +194,15 @@ def get_packagings(product, move_id=0, batch_id=0):
     """
     return [
         {
-            "barcode": p.barcode,
-            "cantidad": p.qty,
-            "id_product": p.product_id.id,
+            "barcode": pack.barcode,
+            "cantidad": pack.qty,
+            "id_product": pack.product_id,
             "id_move": move_id,
             "batch_id": batch_id,
-            "product_id": p.product_id.id,
+            "product_id": pack.product_id,
         }
-        for p in getattr(product, "packaging_ids", [])
-        if p.barcode
+        for pack in product_fragment(product)["packagings"]
+        if pack.barcode
     ]
 
 
@@ -66,3 +218,170 @@ def format_time_from_seconds(time_value):
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
     except:
         return "00:00:00"
+
+
+class FieldSelector:
+    """
+    Selección de claves de un serializador (parámetros fields / include)
+
+    fields="id,name,lineas_transferencia.product_id" limita el documento a
+    esas claves; las claves con punto aplican a las listas anidadas y una
+    lista pedida sin sub-claves se entrega completa. Los valores que se
+    pasan como callables sólo se calculan si la clave fue pedida, así las
+    relaciones de las claves omitidas no se recorren. Sin parámetros se
+    serializa todo, igual que antes.
+    """
+
+    ALWAYS = ("id",)
+
+    def __init__(self, paths=None, exclude=()):
+        self.paths = None if paths is None else set(paths)
+        self.excluded = set(exclude)
+        self._children = {}
+
+    @classmethod
+    def from_kwargs(cls, kwargs):
+        paths = []
+        for param in ("fields", "include"):
+            value = kwargs.get(param)
+            if not value:
+                continue
+            if isinstance(value, str):
+                value = value.split(",")
+            paths += [str(path).strip() for path in value if path and str(path).strip()]
+        return cls(paths or None)
+
+    @property
+    def active(self):
+        return self.paths is not None or bool(self.excluded) or any(c.active for c in self._children.values())
+
+    def wants(self, key):
+        if key in self.ALWAYS:
+            return True
+        if key in self.excluded:
+            return False
+        if self.paths is None:
+            return True
+        return any(path == key or path.startswith(key + ".") for path in self.paths)
+
+    def child(self, key, exclude=()):
+        """
+        Selector para los elementos de la lista anidada en key
+
+        exclude agrega claves que nunca se entregan en esa lista (p. ej. los
+        datos de producto de una respuesta normalizada).
+        """
+        if key not in self._children:
+            sub_paths = None
+            if self.paths is not None:
+                sub_paths = [path[len(key) + 1 :] for path in self.paths if path.startswith(key + ".")] or None
+            self._children[key] = FieldSelector(sub_paths)
+        self._children[key].excluded.update(exclude)
+        return self._children[key]
+
+    def build(self, spec, containers=None):
+        """
+        Construye el diccionario evaluando sólo las claves pedidas
+
+        Las listas anidadas (containers) se conservan mientras se arma la
+        respuesta porque el código las llena después; prune() las retira.
+        """
+        containers = containers or {}
+        return {
+            key: value() if callable(value) else value
+            for key, value in spec.items()
+            if key in containers or self.wants(key)
+        }
+
+    def prune(self, records, containers=None):
+        """Quita de los documentos ya armados las claves no pedidas"""
+        if not self.active:
+            return records
+        containers = containers or {}
+        for record in records:
+            for key in list(record):
+                if not self.wants(key):
+                    del record[key]
+                elif key in containers:
+                    self.child(key).prune(record[key], containers[key])
+        return records
+
+
+class ProductCatalog:
+    """
+    Diccionario de productos de una respuesta normalizada (normalized=1)
+
+    En modo normalizado las líneas no repiten los datos del producto: siguen
+    referenciándolo por su id (product_id / id_product) y cada producto se
+    entrega una sola vez en el mapa "products" de la respuesta, con sus
+    códigos de barras y empaques. Sin el parámetro la respuesta no cambia.
+    """
+
+    # Claves de línea que pasan al mapa de productos
+    LINE_KEYS = frozenset(
+        {
+            "product_name",
+            "product_code",
+            "product_barcode",
+            "barcode",
+            "product_tracking",
+            "tracking",
+            "dias_vencimiento",
+            "weight",
+            "peso",
+            "maneja_temperatura",
+            "other_barcodes",
+            "other_barcode",
+            "product_packing",
+        }
+    )
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._model = None
+        self._product_ids = set()
+
+    @classmethod
+    def from_kwargs(cls, kwargs):
+        return cls(str(kwargs.get("normalized", "")).lower() in ("1", "true", "yes"))
+
+    @property
+    def line_keys(self):
+        """Claves a excluir de las líneas (ninguna si no está activo)"""
+        return self.LINE_KEYS if self.enabled else frozenset()
+
+    def add(self, product):
+        """Registra el producto de una línea"""
+        if not self.enabled or getattr(product, "_name", None) != "product.product":
+            return
+        if self._model is None:
+            self._model = product.browse()
+        self._product_ids.update(product.ids)
+
+    def meta(self):
+        """Mapa de productos a incluir en la respuesta ({} si no está activo)"""
+        if not self.enabled:
+            return {}
+        if self._model is None:
+            return {"products": {}}
+        # Un solo browse: barcode_ids, packaging_ids y uom_id se leen para todos a la vez
+        products = self._model.browse(sorted(self._product_ids))
+        return {"products": {str(product.id): serialize_product(product) for product in products}}
+
+
+def serialize_product(product):
+    """Datos de un producto.product compartidos por las líneas que lo referencian"""
+    fragment = product_fragment(product)
+    return {
+        "id": fragment["id"],
+        "product_name": fragment["display_name"],
+        "product_code": fragment["default_code"],
+        "product_barcode": fragment["barcode"],
+        "product_tracking": fragment["tracking"],
+        "dias_vencimiento": fragment["expiration_time"],
+        "weight": fragment["weight"],
+        "uom": fragment["uom_name"],
+        "maneja_temperatura": fragment["temperature_control"],
+        "other_barcodes": get_barcodes(product),
+        "product_packing": get_packagings(product),
+    }
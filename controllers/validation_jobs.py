@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# validation_jobs.py - Validación de transferencias en segundo plano (cola de trabajos)
+
+from odoo.http import request
+from odoo.tools import str2bool
+
+# Parámetro del sistema: encolar siempre, aunque el cliente no envíe async
+PARAM_ASYNC_DEFAULT = "api_onpoint.async_validation"
+
+# Parámetros de control que no se guardan en el trabajo
+CONTROL_PARAMS = ("async", "device_id", "version_app")
+
+# job_type -> callable(env, **params) que retorna el diccionario de respuesta
+_handlers = {}
+
+
+def register_job_handler(job_type, controller_class, method_name):
+    """
+    Registra el método de un controlador que ejecuta un tipo de trabajo
+
+    El método recibe el entorno (del usuario que encoló el trabajo) y los
+    mismos parámetros que el endpoint, y retorna la misma respuesta.
+    """
+    _handlers[job_type] = lambda env, **params: getattr(controller_class(), method_name)(env, **params)
+
+
+def get_job_handler(job_type):
+    return _handlers.get(job_type)
+
+
+def async_requested(params):
+    """Si la validación se debe encolar (parámetro async o configuración del sistema)"""
+    if "async" in params:
+        return str2bool(str(params.get("async")), False)
+    default = request.env["ir.config_parameter"].sudo().get_param(PARAM_ASYNC_DEFAULT, "False")
+    return str2bool(default, False)
+
+
+def enqueue_validation(job_type, picking_id, params):
+    """
+    Encola la validación y responde de inmediato con el id del trabajo
+
+    El resultado (la misma respuesta del endpoint síncrono) se consulta en
+    /api/validation_jobs/<id>.
+    """
+    job = request.env["onpoint.validation.job"].enqueue(
+        job_type,
+        picking_id,
+        {key: value for key, value in params.items() if key not in CONTROL_PARAMS},
+    )
+    return {
+        "code": 202,
+        "msg": "Validación encolada",
+        "job_id": job.id,
+        "state": job.state,
+        "status_url": f"/api/validation_jobs/{job.id}",
+    }
+
+
+def job_status(job):
+    """Estado de un trabajo en el formato de la API"""
+    return {
+        "job_id": job.id,
+        "job_type": job.job_type,
+        "picking_id": job.picking_id.id or 0,
+        "state": job.state,
+        "fecha_creacion": job.create_date,
+        "fecha_inicio": job.date_started or "",
+        "fecha_fin": job.date_done or "",
+        "result": job.result or None,
+    }
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+from . import validation_job
+from . import idempotency_key
+from . import db_indexes
+from . import pda_heartbeat
+from . import ir_http
+from . import product_packaging
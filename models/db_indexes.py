@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+from ..controllers.db_indexes import ensure_indexes
+
+
+class DbIndexes(models.AbstractModel):
+    _name = "onpoint.db.indexes"
+    _description = "Índices de base de datos de la API OnPoint"
+
+    def init(self):
+        # Se ejecuta al instalar y en cada actualización del módulo
+        ensure_indexes(self.env)
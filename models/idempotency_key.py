@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class IdempotencyKey(models.Model):
+    _name = "onpoint.idempotency.key"
+    _description = "Respuestas registradas por Idempotency-Key (API OnPoint)"
+    _log_access = False
+
+    key = fields.Char(required=True)
+    user_id = fields.Many2one("res.users", required=True, ondelete="cascade")
+    route = fields.Char(required=True)
+    request_hash = fields.Char(required=True)
+    response = fields.Json()
+    expires_at = fields.Datetime(required=True, index=True)
+
+    _sql_constraints = [
+        ("key_user_route_uniq", "unique(key, user_id, route)", "La clave de idempotencia ya existe para este usuario y ruta"),
+    ]
+
+    @api.autovacuum
+    def _gc_expired_keys(self):
+        """Elimina las claves vencidas (las reintenta el cliente dentro del plazo)"""
+        self.env.cr.execute("DELETE FROM onpoint_idempotency_key WHERE expires_at < NOW() AT TIME ZONE 'UTC'")
+        _logger.info("Claves de idempotencia vencidas eliminadas: %d", self.env.cr.rowcount)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+from odoo.http import request
+
+from ..controllers.response_compression import COMPRESS_ENVIRON_KEY, compress_endpoint_response, is_compressible_endpoint
+
+
+class IrHttp(models.AbstractModel):
+    _inherit = "ir.http"
+
+    @classmethod
+    def _pre_dispatch(cls, rule, args):
+        super()._pre_dispatch(rule, args)
+        # Sólo las respuestas JSON-RPC de los endpoints de este módulo se comprimen
+        request.httprequest.environ[COMPRESS_ENVIRON_KEY] = is_compressible_endpoint(rule.endpoint)
+
+    @classmethod
+    def _post_dispatch(cls, response):
+        super()._post_dispatch(response)
+        compress_endpoint_response(request, response)
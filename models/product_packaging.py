@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, models
+
+from ..controllers.utils import invalidate_product_cache
+
+
+class ProductPackaging(models.Model):
+    _inherit = "product.packaging"
+
+    # Los fragmentos de producto en caché incluyen sus empaques (ver controllers/utils.py)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        packagings = super().create(vals_list)
+        invalidate_product_cache(self.env, packagings.product_id.ids)
+        return packagings
+
+    def write(self, vals):
+        product_ids = self.product_id.ids
+        res = super().write(vals)
+        invalidate_product_cache(self.env, product_ids + self.product_id.ids)
+        return res
+
+    def unlink(self):
+        invalidate_product_cache(self.env, self.product_id.ids)
+        return super().unlink()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from odoo import SUPERUSER_ID, api, fields, models
+from odoo.tools.date_utils import json_default
+
+from ..controllers.validation_jobs import get_job_handler
+
+_logger = logging.getLogger(__name__)
+
+# Trabajos que se ejecutan a la vez (cada uno con su propio cursor)
+PARAM_CONCURRENCY = "api_onpoint.validation_jobs_concurrency"
+DEFAULT_CONCURRENCY = 2
+MAX_CONCURRENCY = 8
+
+# Un trabajo "en proceso" más antiguo que esto quedó huérfano (worker reiniciado)
+STALE_AFTER = timedelta(hours=1)
+
+
+class ValidationJob(models.Model):
+    _name = "onpoint.validation.job"
+    _description = "Validación de transferencias en segundo plano (API OnPoint)"
+    _order = "id desc"
+
+    job_type = fields.Char(required=True, index=True)
+    picking_id = fields.Many2one("stock.picking", index=True, ondelete="set null")
+    user_id = fields.Many2one("res.users", required=True, index=True, default=lambda self: self.env.user)
+    params = fields.Json()
+    state = fields.Selection(
+        [
+            ("pending", "Pendiente"),
+            ("running", "En proceso"),
+            ("done", "Terminado"),
+            ("failed", "Fallido"),
+        ],
+        default="pending",
+        required=True,
+        index=True,
+    )
+    result = fields.Json()
+    date_started = fields.Datetime()
+    date_done = fields.Datetime()
+
+    @api.model
+    def enqueue(self, job_type, picking_id, params):
+        job = self.sudo().create(
+            {
+                "job_type": job_type,
+                "picking_id": picking_id or False,
+                "user_id": self.env.user.id,
+                "params": json.loads(json.dumps(params, default=json_default)),
+            }
+        )
+        # Despierta el cron sin esperar a su próximo intervalo
+        self.env["ir.cron"].sudo().search([("model_id.model", "=", self._name)], limit=1)._trigger()
+        return job
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Procesa los trabajos pendientes, varios a la vez según la concurrencia configurada"""
+        self._fail_stale_jobs()
+
+        try:
+            concurrency = int(self.env["ir.config_parameter"].sudo().get_param(PARAM_CONCURRENCY, DEFAULT_CONCURRENCY))
+        except (TypeError, ValueError):
+            concurrency = DEFAULT_CONCURRENCY
+        concurrency = max(1, min(MAX_CONCURRENCY, concurrency))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                job_ids = self._claim_jobs(concurrency)
+                if not job_ids:
+                    break
+                list(executor.map(self._run_job, job_ids))
+
+    def _claim_jobs(self, limit):
+        """Marca como en proceso los siguientes trabajos pendientes (sin bloquear a otros procesadores)"""
+        self.env.cr.execute(
+            """
+            UPDATE onpoint_validation_job
+               SET state = 'running', date_started = now() at time zone 'UTC'
+             WHERE id IN (
+                    SELECT id FROM onpoint_validation_job
+                     WHERE state = 'pending'
+                     ORDER BY id
+                     LIMIT %s
+                     FOR UPDATE SKIP LOCKED
+                   )
+         RETURNING id
+            """,
+            [limit],
+        )
+        job_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.commit()
+        return job_ids
+
+    def _run_job(self, job_id):
+        """Ejecuta un trabajo en su propio cursor, como el usuario que lo encoló"""
+        with self.env.registry.cursor() as cr:
+            job = api.Environment(cr, SUPERUSER_ID, {})[self._name].browse(job_id)
+            user = job.user_id
+            handler = get_job_handler(job.job_type)
+
+            try:
+                if not handler:
+                    raise ValueError(f"Tipo de trabajo no soportado: {job.job_type}")
+                env = api.Environment(cr, user.id, {"lang": user.lang, "tz": user.tz})
+                result = handler(env, **(job.params or {}))
+                state = "done"
+            except Exception as err:
+                _logger.exception("Error procesando el trabajo de validación %s", job_id)
+                cr.rollback()
+                result = {"code": 500, "msg": f"Error interno: {str(err)}"}
+                state = "failed"
+
+            job.write(
+                {
+                    "state": state,
+                    "result": json.loads(json.dumps(result, default=json_default)),
+                    "date_done": fields.Datetime.now(),
+                }
+            )
+            cr.commit()
+
+    @api.model
+    def _fail_stale_jobs(self):
+        stale = self.search([("state", "=", "running"), ("date_started", "<", fields.Datetime.now() - STALE_AFTER)])
+        if stale:
+            stale.write(
+                {
+                    "state": "failed",
+                    "result": {"code": 500, "msg": "El trabajo se interrumpió antes de terminar"},
+                    "date_done": fields.Datetime.now(),
+                }
+            )